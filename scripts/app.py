@@ -1,75 +1,204 @@
-import time
+import functools
+import os
+import threading
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import numpy as np
-from data_processing import consolidate_data
-
-
-# Função para carregamento dos dados e atualizar a barra de progresso
-def load_data_with_progress():
-    st.title("Análise de Acidentes de Trânsito")
-    # Barra de progresso
-    progress_bar = st.progress(0)
-    progress_text = st.empty()
-
-    # Simulação de carregamento de dados
-    progress_text.text("Iniciando o carregamento dos dados...")
-    for i in range(101):
-        time.sleep(0.05)
-        progress_bar.progress(i)
+from binning import densidade_2d, histograma, resumo_boxplot
+from cache import cache_file
+from cube import cobre_filtros, consultar, consultar_linhas, cuboide_momentos
+from data_processing import (
+    assinatura_dados,
+    backend_consultas,
+    cache_path,
+    consolidate_data,
+    obter_cubo,
+    obter_indice_espacial,
+)
+from filter_index import construir_indice, filtrar, mascara_filtrada
+from insights import (
+    arquivo_insights,
+    calcular_insights,
+    consultar_insights,
+    textos_insights,
+)
+from instrumentation import (
+    finalizar_medicao,
+    iniciar_medicao,
+    medicoes_recentes,
+    medir,
+)
+from moments import correlacao_momentos
+from road_index import (
+    construir_indice_rodovias,
+    contar_trecho,
+    trechos_criticos,
+)
+from spatial import (
+    colunas_celula,
+    escolher_resolucao,
+    extensao_pontos,
+    nome_grade,
+    pontos_mapa,
+    resolucoes_grade,
+    zoom_para_extensao,
+)
+from spatial_index import (
+    consultar_raio,
+    consultar_retangulo,
+    distancia_km,
+    vizinhos_mais_proximos,
+)
+from section_cache import estatisticas_cache, memoizar, novo_cache
+from sql_backend import conectar, consultar_sql
+from timeseries import (
+    agregar_periodo,
+    comparacao_anual,
+    janelas_media_movel,
+    media_movel,
+    periodos,
+    serie_diaria,
+)
+
+# Painel de desempenho (oculto): exibido com PRF_PAINEL_DESEMPENHO=1 ou ao abrir
+# o app com ?desempenho=1
+painel_desempenho = os.environ.get("PRF_PAINEL_DESEMPENHO") == "1"
+
+
+# Memória compartilhada entre reruns e sessões com o último resultado da
+# consolidação. Não usa st.cache_data diretamente porque a barra de progresso é
+# atualizada durante o carregamento, e elementos criados fora de uma função em
+# cache não podem ser reexecutados por ela.
+@st.cache_resource
+def memoria_compartilhada():
+    return {"lock": threading.Lock(), "assinatura": None, "resultado": None}
+
+
+# Função para consolidar os dados apenas quando a assinatura dos arquivos de
+# entrada muda; as demais chamadas (de qualquer sessão) reutilizam o resultado.
+# O DataFrame retornado é compartilhado e não deve ser alterado.
+def carregar_dados(assinatura, progress_callback=None):
+    memoria = memoria_compartilhada()
+    with memoria["lock"]:
+        if memoria["assinatura"] != assinatura:
+            resultado = consolidate_data(progress_callback=progress_callback)
+            # Não manter o erro em memória
+            if resultado[0] is None:
+                return resultado
+            memoria["assinatura"] = assinatura
+            memoria["resultado"] = resultado
+        return memoria["resultado"]
+
+
+# Função para carregar o cubo de agregados usado pelos gráficos. Fica em
+# st.cache_resource, como os índices, para não copiar o cubo a cada rerun; as
+# consultas apenas leem os cuboides, que não devem ser alterados.
+@st.cache_resource(show_spinner=False)
+def carregar_cubo(assinatura, _data):
+    return obter_cubo(_data)
+
+
+# Conexão DuckDB com o dataset consolidado (backend SQL), recriada quando os
+# dados de origem mudam
+@st.cache_resource(show_spinner=False)
+def conexao_sql(assinatura):
+    return conectar(os.path.join(cache_path, cache_file))
+
+
+# Função para consultar as medidas agregadas (acidentes, ids distintos e mortos)
+# no backend configurado em data_processing.backend_consultas. Quando o cuboide
+# não guarda alguma dimensão dos filtros ativos, as medidas são agregadas a
+# partir das linhas selecionadas pelo índice dos filtros.
+def consultar_dados(cubo, nome, filtros, dimensoes=()):
+    if backend_consultas == "duckdb":
+        return consultar_sql(
+            conexao_sql(assinatura_dados()),
+            filtros,
+            dimensoes,
+            momentos=nome == cuboide_momentos,
+        )
+    if not cobre_filtros(nome, filtros):
+        data = carregar_dados(assinatura_dados())[0]
+        indice = carregar_indice(assinatura_dados(), data)
+        return consultar_linhas(filtrar(data, indice, filtros), nome, dimensoes)
+    return consultar(cubo, nome, filtros, dimensoes)
 
-        # Atualiza o texto com a porcentagem
-        progress_text.text(f"Carregando dados... {i}%")
-    data, null_info_before, null_info_after = consolidate_data()
 
-    if data is None:
-        st.error("Erro ao carregar os dados consolidados.")
-    else:
-        st.success("Dados carregados com sucesso.")
-        progress_bar.progress(100)
+# Função para construir o índice dos filtros; como o cubo, só é recalculado
+# quando os dados de origem mudam. Fica em st.cache_resource porque é apenas
+# lido, evitando copiar os arrays do índice a cada rerun.
+@st.cache_resource(show_spinner=False)
+def carregar_indice(assinatura, _data):
+    return construir_indice(_data)
 
-    return data
 
+# Função para carregar o índice espacial das consultas por raio, vizinhos mais
+# próximos e retângulo (gravado junto ao cache consolidado)
+@st.cache_resource(show_spinner=False)
+def carregar_indice_espacial(assinatura, _data):
+    return obter_indice_espacial(_data)
 
-# Carregar os dados
-data = load_data_with_progress()
 
-if data is not None:
-    # Total de acidentes sem filtro aplicado
-    all_total_acidentes = len(data)
+# Função para construir o índice de trechos de rodovia (br, km)
+@st.cache_resource(show_spinner=False)
+def carregar_indice_rodovias(assinatura, _data):
+    return construir_indice_rodovias(_data)
 
-    # Ordenar labels dos meses no filtro
-    meses_ordenados = sorted(
-        data[["mes", "nome_mes"]].drop_duplicates().values, key=lambda x: x[0]
-    )
-    meses_ordenados = [mes[1] for mes in meses_ordenados]
 
-    # Definição dos filtros
-    ano_filtro = st.selectbox(
-        "Escolha o ano", ["Todos"] + sorted(data["ano"].unique()))
-    mes_filtro = st.selectbox("Escolha o mês", ["Todos"] + meses_ordenados)
-    uf_filtro = st.selectbox(
-        "Escolha a UF", ["Todos"] + sorted(data["uf"].unique()))
-    tipo_acidente_filtro = st.selectbox(
-        "Escolha o tipo de acidente", ["Todos"] +
-        sorted(data["tipo_acidente"].unique())
-    )
+# Cache dos resultados das seções (dados e figuras), compartilhado entre as
+# sessões e limitado em memória (PRF_LIMITE_CACHE_SECOES_MB)
+@st.cache_resource
+def cache_secoes():
+    return novo_cache()
 
-    # Filtra os dados com base nas escolhas
-    if ano_filtro != "Todos":
-        data = data[data["ano"] == ano_filtro]
 
-    if mes_filtro != "Todos":
-        data = data[data["nome_mes"] == mes_filtro]
+# Função para obter o resultado de uma seção, calculado apenas na primeira vez
+# para cada combinação de dados, filtros e opções da própria seção. O resultado
+# é compartilhado e não deve ser alterado.
+def resultado_secao(nome, filtros, opcoes, calcular):
+    chave = (nome, assinatura_dados(), *filtros.values(), *opcoes)
+    return memoizar(cache_secoes(), chave, calcular)
 
-    if uf_filtro != "Todos":
-        data = data[data["uf"] == uf_filtro]
 
-    if tipo_acidente_filtro != "Todos":
-        data = data[data["tipo_acidente"] == tipo_acidente_filtro]
-
-    # Graficos e visualizações
+# Função para obter os textos dos insights dos filtros escolhidos: consultados no
+# arquivo pré-calculado (python insights.py) quando ele é da versão atual dos
+# dados; senão, calculados a partir das agregações e guardados no cache das seções
+def textos_filtros(cubo, filtros, total_brasil):
+    with medir("insights", grupo="app"):
+        caminho = arquivo_insights(cache_path)
+        if caminho is not None:
+            insight = consultar_insights(caminho, filtros)
+        else:
+            insight = resultado_secao(
+                "insights",
+                filtros,
+                (),
+                lambda: calcular_insights(
+                    functools.partial(consultar_dados, cubo), filtros
+                ),
+            )
+        return textos_insights(insight, filtros, total_brasil)
+
+
+# Decorador das seções do app: cada seção é um fragmento (uma interação com os
+# widgets da seção reexecuta apenas a seção) e tem o tempo medido
+def secao_app(nome):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def executar(*args, **kwargs):
+            with medir(nome, grupo="app"):
+                return funcao(*args, **kwargs)
+
+        return st.fragment(executar)
+
+    return decorador
+
+
+# Graficos e visualizações
+@secao_app("visualizacoes")
+def secao_visualizacoes(dados_completos, indice, filtros):
     st.subheader("Visualizações")
     visual_option = st.selectbox(
         "Escolha uma visualização",
@@ -81,26 +210,46 @@ if data is not None:
             "Histograma",
         ],
     )
+    colunas_numericas = dados_completos.select_dtypes(include="number").columns
 
+    # Linhas filtradas de uma coluna, lidas apenas quando o resultado da seção
+    # ainda não está em cache
+    def coluna_filtrada(coluna):
+        return filtrar(dados_completos, indice, filtros)[coluna]
+
+    # Os gráficos recebem apenas os dados já reduzidos no servidor (faixas,
+    # células da densidade 2D e estatísticas do boxplot), de tamanho
+    # independente do número de acidentes filtrados
     if visual_option == "Distribuição":
-        progress_bar = st.progress(0)
         column = st.selectbox(
             "Escolha uma coluna numérica",
-            data.select_dtypes(include=["int", "float"]).columns,
+            colunas_numericas,
         )
         st.write(f"Distribuição de densidade da coluna {column}")
-        fig = px.histogram(data, x=column, histnorm="density", nbins=30)
-        fig.update_layout(title=f"Densidade de {column}")
+        faixas = resultado_secao(
+            "densidade",
+            filtros,
+            (column,),
+            lambda: histograma(coluna_filtrada(column), densidade=True),
+        )
+        fig = px.bar(
+            faixas,
+            x="centro",
+            y="densidade",
+            hover_data={"inicio": True, "fim": True, "contagem": True},
+            labels={"centro": column, "densidade": "densidade"},
+        )
+        fig.update_layout(title=f"Densidade de {column}", bargap=0)
         st.plotly_chart(fig)
 
     elif visual_option == "Gráfico de Dispersão":
         col1 = st.selectbox(
             "Escolha a primeira coluna numérica",
-            data.select_dtypes(include=["int", "float"]).columns,
+            colunas_numericas,
         )
         col2 = st.selectbox(
             "Escolha a segunda coluna numérica",
-            data.select_dtypes(include=["int", "float"]).columns,
+            colunas_numericas,
         )
 
         # Verifica se as colunas selecionadas são diferentes
@@ -108,491 +257,988 @@ if data is not None:
             st.error("As colunas selecionadas devem ser diferentes!")
         else:
             st.write(f"Gráfico de Dispersão entre {col1} e {col2}")
-            fig = px.scatter(data, x=col1, y=col2)
+            # Cada ponto é uma célula da densidade 2D, com tamanho e cor pelo
+            # número de acidentes
+            celulas = resultado_secao(
+                "densidade_2d",
+                filtros,
+                (col1, col2),
+                lambda: densidade_2d(coluna_filtrada(col1), coluna_filtrada(col2)),
+            )
+            fig = px.scatter(
+                celulas,
+                x=col1,
+                y=col2,
+                size="contagem",
+                color="contagem",
+                color_continuous_scale="Viridis",
+                labels={"contagem": "Número de Acidentes"},
+            )
             st.plotly_chart(fig)
 
     elif visual_option == "Boxplot":
         column = st.selectbox(
             "Escolha uma coluna numérica para o Boxplot",
-            data.select_dtypes(include=["int", "float"]).columns,
+            colunas_numericas,
         )
         st.write(f"Boxplot da coluna {column}")
-        fig = px.box(data, y=column)
-        st.plotly_chart(fig)
+        resumo = resultado_secao(
+            "boxplot",
+            filtros,
+            (column,),
+            lambda: resumo_boxplot(coluna_filtrada(column)),
+        )
+        if resumo is None:
+            st.write("Sem valores para o boxplot.")
+        else:
+            fig = go.Figure(
+                go.Box(
+                    x=[column],
+                    q1=[resumo["q1"]],
+                    median=[resumo["mediana"]],
+                    q3=[resumo["q3"]],
+                    lowerfence=[resumo["limite_inferior"]],
+                    upperfence=[resumo["limite_superior"]],
+                    mean=[resumo["media"]],
+                    name=column,
+                    boxpoints=False,
+                )
+            )
+            fig.add_trace(
+                go.Scatter(
+                    x=[column] * len(resumo["outliers"]),
+                    y=resumo["outliers"],
+                    mode="markers",
+                    name="outliers",
+                    marker=dict(size=4),
+                )
+            )
+            fig.update_layout(showlegend=False)
+            st.plotly_chart(fig)
+            if resumo["total_outliers"] > len(resumo["outliers"]):
+                st.write(
+                    f"Exibindo {len(resumo['outliers'])} de "
+                    f"{resumo['total_outliers']} outliers."
+                )
 
     elif visual_option == "Histograma":
         column = st.selectbox(
             "Escolha uma coluna numérica para o Histograma",
-            data.select_dtypes(include=["int", "float"]).columns,
+            colunas_numericas,
         )
         st.write(f"Histograma da coluna {column}")
-        fig = px.histogram(data, x=column, nbins=30)
+        faixas = resultado_secao(
+            "histograma",
+            filtros,
+            (column,),
+            lambda: histograma(coluna_filtrada(column)),
+        )
+        fig = px.bar(
+            faixas,
+            x="centro",
+            y="contagem",
+            hover_data={"inicio": True, "fim": True},
+            labels={"centro": column, "contagem": "count"},
+        )
+        fig.update_layout(bargap=0)
         st.plotly_chart(fig)
 
-    # Gráfico de barras Top 5 Causas mais comuns
-    top_5_causas = data["causa_acidente"].value_counts().nlargest(5)
-    top_5_causas = top_5_causas.sort_values(ascending=True)
-    top_5_causas = top_5_causas.reset_index()
-    top_5_causas.columns = ["Causa do Acidente", "Número de Acidentes"]
 
+# Gráfico de barras Top 5 Causas mais comuns
+@secao_app("top_causas")
+def secao_top_causas(cubo, filtros, textos):
     st.subheader("Top 5 Causas Mais Comuns dos Acidentes")
 
-    fig_causas = px.bar(
-        top_5_causas,
-        x="Número de Acidentes",
-        y="Causa do Acidente",
-        labels={
-            "Número de Acidentes": "Número de Acidentes",
-            "Causa do Acidente": "Causa do Acidente",
-        },
-        color="Número de Acidentes",
-        text="Número de Acidentes",
-        color_continuous_scale="Blues",
-        hover_data={"Número de Acidentes": True, "Causa do Acidente": True},
-    )
+    def calcular():
+        top_5_causas = (
+            consultar_dados(cubo, "causa_acidente", filtros, ["causa_acidente"])
+            .set_index("causa_acidente")["acidentes"]
+            .nlargest(5)
+        )
+        top_5_causas = top_5_causas.sort_values(ascending=True)
+        top_5_causas = top_5_causas.reset_index()
+        top_5_causas.columns = ["Causa do Acidente", "Número de Acidentes"]
+
+        fig_causas = px.bar(
+            top_5_causas,
+            x="Número de Acidentes",
+            y="Causa do Acidente",
+            labels={
+                "Número de Acidentes": "Número de Acidentes",
+                "Causa do Acidente": "Causa do Acidente",
+            },
+            color="Número de Acidentes",
+            text="Número de Acidentes",
+            color_continuous_scale="Blues",
+            hover_data={"Número de Acidentes": True, "Causa do Acidente": True},
+        )
 
-    fig_causas.update_layout(
-        xaxis_visible=False,
-        xaxis_showticklabels=False,
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        font=dict(family="Arial", size=12, color="white"),
-        yaxis=dict(
-            title="",
-        ),
-        coloraxis_showscale=False,
-    )
+        fig_causas.update_layout(
+            xaxis_visible=False,
+            xaxis_showticklabels=False,
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            font=dict(family="Arial", size=12, color="white"),
+            yaxis=dict(
+                title="",
+            ),
+            coloraxis_showscale=False,
+        )
+        return top_5_causas, fig_causas
+
+    _, fig_causas = resultado_secao("top_causas", filtros, (), calcular)
 
     st.plotly_chart(fig_causas)
 
     # Insights
-    total_acidentes = len(data)
-    causa_mais_comum = top_5_causas.iloc[4]
-    causa_mais_comum_nome = causa_mais_comum["Causa do Acidente"]
-    causa_mais_comum_acidentes = causa_mais_comum["Número de Acidentes"]
-    causa_mais_comum_percentual = (
-        causa_mais_comum_acidentes / total_acidentes) * 100
-
-    st.write(
-        f"A causa mais comum de acidente é **{causa_mais_comum_nome}**, com um total de **{
-            causa_mais_comum_acidentes}** acidentes, "
-        f"representando **{causa_mais_comum_percentual:.1f}%** do total de acidentes."
-    )
+    if "top_causas" in textos:
+        st.write(textos["top_causas"])
 
-    # Top 5 Tipos mais comuns
-    top_5_tipos = data["tipo_acidente"].value_counts().nlargest(5)
-    top_5_tipos = top_5_tipos.sort_values(ascending=True)
-    top_5_tipos = top_5_tipos.reset_index()
-    top_5_tipos.columns = ["Tipo do Acidente", "Número de Acidentes"]
 
+# Top 5 Tipos mais comuns
+@secao_app("top_tipos")
+def secao_top_tipos(cubo, filtros, textos):
     st.subheader("Top 5 Tipos Mais Comuns de Acidentes")
 
-    fig_tipos = px.bar(
-        top_5_tipos,
-        x="Número de Acidentes",
-        y="Tipo do Acidente",
-        labels={
-            "Número de Acidentes": "Número de Acidentes",
-            "Tipo do Acidente": "Tipo de Acidente",
-        },
-        color="Número de Acidentes",
-        text="Número de Acidentes",
-        color_continuous_scale="Greens",
-        hover_data={"Número de Acidentes": True, "Tipo do Acidente": True},
-    )
+    def calcular():
+        top_5_tipos = (
+            consultar_dados(cubo, "total", filtros, ["tipo_acidente"])
+            .set_index("tipo_acidente")["acidentes"]
+            .nlargest(5)
+        )
+        top_5_tipos = top_5_tipos.sort_values(ascending=True)
+        top_5_tipos = top_5_tipos.reset_index()
+        top_5_tipos.columns = ["Tipo do Acidente", "Número de Acidentes"]
+
+        fig_tipos = px.bar(
+            top_5_tipos,
+            x="Número de Acidentes",
+            y="Tipo do Acidente",
+            labels={
+                "Número de Acidentes": "Número de Acidentes",
+                "Tipo do Acidente": "Tipo de Acidente",
+            },
+            color="Número de Acidentes",
+            text="Número de Acidentes",
+            color_continuous_scale="Greens",
+            hover_data={"Número de Acidentes": True, "Tipo do Acidente": True},
+        )
 
-    fig_tipos.update_layout(
-        xaxis_visible=False,
-        xaxis_showticklabels=False,
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        font=dict(family="Arial", size=12, color="white"),
-        yaxis=dict(
-            title="",
-        ),
-        coloraxis_showscale=False,
-    )
+        fig_tipos.update_layout(
+            xaxis_visible=False,
+            xaxis_showticklabels=False,
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            font=dict(family="Arial", size=12, color="white"),
+            yaxis=dict(
+                title="",
+            ),
+            coloraxis_showscale=False,
+        )
+        return top_5_tipos, fig_tipos
+
+    _, fig_tipos = resultado_secao("top_tipos", filtros, (), calcular)
 
     st.plotly_chart(fig_tipos)
 
     # Insights
-    tipo_mais_comum = top_5_tipos.iloc[4]
-    tipo_mais_comum_nome = tipo_mais_comum["Tipo do Acidente"]
-    tipo_mais_comum_acidentes = tipo_mais_comum["Número de Acidentes"]
-    tipo_mais_comum_percentual = (
-        tipo_mais_comum_acidentes / total_acidentes) * 100
-
-    st.write(
-        f"O tipo mais comum de acidente é **{tipo_mais_comum_nome}**, com um total de **{
-            tipo_mais_comum_acidentes}** acidentes, "
-        f"representando **{tipo_mais_comum_percentual:.1f}%** do total de acidentes."
-    )
+    if "top_tipos" in textos:
+        st.write(textos["top_tipos"])
 
-    # Gráfico de dispersão entre número de vítimas e condições meteorológicas
+
+# Gráfico de dispersão entre número de vítimas e condições meteorológicas
+@secao_app("condicao_meteorologica")
+def secao_condicao_meteorologica(cubo, filtros, textos):
     st.subheader("Relação entre Número de Vítimas e Condições Meteorológicas")
 
-    acidentes_com_mortos = (
-        data.groupby("condicao_metereologica")["mortos"].sum().reset_index()
-    )
+    def calcular():
+        acidentes_com_mortos = consultar_dados(
+            cubo, "condicao_metereologica", filtros, ["condicao_metereologica"]
+        )[["condicao_metereologica", "mortos"]]
+
+        fig = px.scatter(
+            acidentes_com_mortos,
+            x="condicao_metereologica",
+            y="mortos",
+            color="condicao_metereologica",
+            labels={
+                "condicao_metereologica": "Condição Meteorológica",
+                "mortos": "Número de Vítimas",
+            },
+        )
 
-    fig = px.scatter(
-        acidentes_com_mortos,
-        x="condicao_metereologica",
-        y="mortos",
-        color="condicao_metereologica",
-        labels={
-            "condicao_metereologica": "Condição Meteorológica",
-            "mortos": "Número de Vítimas",
-        },
-    )
+        fig.update_layout(
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+        )
+        return acidentes_com_mortos, fig
 
-    fig.update_layout(
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-    )
+    _, fig = resultado_secao("condicao_meteorologica", filtros, (), calcular)
 
     st.plotly_chart(fig)
 
     # Insights
-    total_mortos = data["mortos"].sum()
-    maior_valor = acidentes_com_mortos["mortos"].max()
-    condicao_com_maior_ocorrencia = acidentes_com_mortos.loc[
-        acidentes_com_mortos["mortos"] == maior_valor, "condicao_metereologica"
-    ].iloc[0]
-    condicao_percentual = (maior_valor / total_mortos) * 100
-
-    st.write(
-        f"A condição meteorológica com mais registros de vítimas fatais é **{
-            condicao_com_maior_ocorrencia}**, com um total de **{maior_valor}** vítimas, "
-        f"representando **{condicao_percentual:.1f}%** do total de vítimas fatais."
+    if "condicao_meteorologica" in textos:
+        st.write(textos["condicao_meteorologica"])
+
+
+# Pontos do mapa por município, no centroide real dos acidentes (usados pelo
+# mapa e como ponto de partida das consultas espaciais)
+def pontos_municipios(cubo, filtros):
+    return resultado_secao(
+        "pontos_municipios",
+        filtros,
+        (),
+        lambda: pontos_mapa(
+            consultar_dados(cubo, "municipio", filtros, ["uf", "municipio"])
+        ).rename(columns={"acidentes": "quantidade_acidentes"}),
     )
 
-    # Mapa interativo
-    st.subheader("Ditribuição Geográfica dos Acidentes")
 
-    data["latitude"] = data["latitude"].str.replace(",", ".").astype(float)
-    data["longitude"] = data["longitude"].str.replace(",", ".").astype(float)
-    data["latitude"] = data["latitude"].round().astype(int)
-    data["longitude"] = data["longitude"].round().astype(int)
+# Mapa interativo
+@secao_app("mapa")
+def secao_mapa(cubo, filtros, textos):
+    st.subheader("Ditribuição Geográfica dos Acidentes")
 
-    group = (
-        data.groupby(["municipio", "latitude", "longitude"])["id"]
-        .size()
-        .reset_index(name="quantidade_acidentes")
+    # Pontos do mapa agregados no servidor: por município (no centroide real
+    # dos acidentes) ou por células de uma grade com resolução escolhida pela
+    # área coberta pelos filtros
+    agregacao_mapa = st.radio(
+        "Agregação do mapa", ["Municípios", "Grade"], horizontal=True
     )
 
-    # Arredondamento latitude e longitude
-    acidentes_por_municipio = (
-        group.groupby("municipio")
-        .agg(
-            {
-                "latitude": "mean",
-                "longitude": "mean",
-                "quantidade_acidentes": "sum",
-            }
-        )
-        .reset_index()
-    )
+    acidentes_por_municipio = pontos_municipios(cubo, filtros)
 
-    fig = px.scatter_mapbox(
-        acidentes_por_municipio,
-        lat="latitude",
-        lon="longitude",
-        hover_name="municipio",
-        hover_data={
-            "quantidade_acidentes": True,
-            "latitude": False,
-            "longitude": False,
-        },
-        size="quantidade_acidentes",
-        color="quantidade_acidentes",
-        color_continuous_scale="Inferno",
-        template="plotly",
-    )
-    fig.update_layout(
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        mapbox_style="carto-positron",
-        mapbox_center={
-            "lat": acidentes_por_municipio["latitude"].mean(),
-            "lon": acidentes_por_municipio["longitude"].mean(),
-        },
-        coloraxis_showscale=False,
-        mapbox_zoom=3,
-        height=500,
-    )
+    # Células da grade em uma resolução
+    def celulas(resolucao):
+        return pontos_mapa(
+            consultar_dados(
+                cubo, nome_grade(resolucao), filtros, colunas_celula(resolucao)
+            )
+        )
 
-    st.plotly_chart(fig)
+    def calcular():
+        if agregacao_mapa == "Grade":
+            # A grade mais grossa define a área coberta e, com ela, a resolução
+            resolucao = max(resolucoes_grade)
+            pontos = celulas(resolucao)
+            resolucao = escolher_resolucao(extensao_pontos(pontos))
+            if resolucao != max(resolucoes_grade):
+                pontos = celulas(resolucao)
+            pontos = pontos.rename(columns={"acidentes": "quantidade_acidentes"})
+            pontos["municipio"] = f"Célula de {resolucao}°"
+        else:
+            pontos = acidentes_por_municipio
+
+        fig = px.scatter_mapbox(
+            pontos,
+            lat="latitude",
+            lon="longitude",
+            hover_name="municipio",
+            hover_data={
+                "quantidade_acidentes": True,
+                "latitude": False,
+                "longitude": False,
+            },
+            size="quantidade_acidentes",
+            color="quantidade_acidentes",
+            color_continuous_scale="Inferno",
+            template="plotly",
+        )
+        fig.update_layout(
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            mapbox_style="carto-positron",
+            mapbox_center={
+                "lat": (pontos["latitude"].min() + pontos["latitude"].max()) / 2,
+                "lon": (pontos["longitude"].min() + pontos["longitude"].max()) / 2,
+            },
+            coloraxis_showscale=False,
+            mapbox_zoom=zoom_para_extensao(extensao_pontos(pontos)),
+            height=500,
+        )
+        return fig
+
+    st.plotly_chart(resultado_secao("mapa", filtros, (agregacao_mapa,), calcular))
 
     # Insights
-    acidentes_por_municipio_sorted = acidentes_por_municipio.sort_values(
-        by="quantidade_acidentes", ascending=False
+    if "mapa" in textos:
+        st.write(textos["mapa"])
+
+
+# CONSULTAS ESPACIAIS
+# Acidentes em torno de um ponto (raio ou mais próximos) ou dentro de um
+# retângulo, respeitando os filtros escolhidos
+@secao_app("consultas_espaciais")
+def secao_consultas_espaciais(dados_completos, indice, cubo, filtros):
+    with st.expander("Consultas espaciais"):
+        indice_espacial = carregar_indice_espacial(assinatura_dados(), dados_completos)
+        tipo_consulta = st.selectbox(
+            "Tipo de consulta", ["Raio", "Mais próximos", "Retângulo"]
+        )
+
+        # O ponto de referência começa no centro dos acidentes filtrados
+        pontos = pontos_municipios(cubo, filtros)
+        col_lat, col_lon = st.columns(2)
+        latitude_ref = col_lat.number_input(
+            "Latitude",
+            min_value=-90.0,
+            max_value=90.0,
+            value=(
+                float(round(pontos["latitude"].mean(), 4)) if len(pontos) else -15.7939
+            ),
+            format="%.4f",
+        )
+        longitude_ref = col_lon.number_input(
+            "Longitude",
+            min_value=-180.0,
+            max_value=180.0,
+            value=(
+                float(round(pontos["longitude"].mean(), 4)) if len(pontos) else -47.8828
+            ),
+            format="%.4f",
+        )
+        somente_fatais = st.checkbox("Somente acidentes com mortos")
+
+        # Máscara com as linhas que passam nos filtros (None se não há filtro)
+        mascara = mascara_filtrada(indice, filtros)
+        if somente_fatais:
+            fatais = (dados_completos["mortos"] > 0).to_numpy()
+            mascara = fatais if mascara is None else mascara & fatais
+
+        if tipo_consulta == "Raio":
+            raio_km = st.number_input(
+                "Raio (km)", min_value=0.1, max_value=1000.0, value=10.0
+            )
+            posicoes, distancias = consultar_raio(
+                indice_espacial, latitude_ref, longitude_ref, raio_km, mascara
+            )
+        elif tipo_consulta == "Mais próximos":
+            k = st.number_input(
+                "Número de acidentes", min_value=1, max_value=10000, value=50
+            )
+            posicoes, distancias = vizinhos_mais_proximos(
+                indice_espacial, latitude_ref, longitude_ref, int(k), mascara
+            )
+        else:
+            meia_largura = st.number_input(
+                "Meia largura do retângulo (graus)",
+                min_value=0.01,
+                max_value=20.0,
+                value=0.5,
+            )
+            posicoes = consultar_retangulo(
+                indice_espacial,
+                latitude_ref - meia_largura,
+                latitude_ref + meia_largura,
+                longitude_ref - meia_largura,
+                longitude_ref + meia_largura,
+                mascara,
+            )
+            distancias = None
+
+        resultado = dados_completos.iloc[posicoes][
+            [
+                "id",
+                "data_inversa",
+                "municipio",
+                "uf",
+                "tipo_acidente",
+                "mortos",
+                "latitude",
+                "longitude",
+            ]
+        ]
+        if distancias is None:
+            distancias = distancia_km(
+                latitude_ref,
+                longitude_ref,
+                resultado["latitude"].to_numpy(),
+                resultado["longitude"].to_numpy(),
+            )
+        resultado = resultado.assign(distancia_km=np.round(distancias, 2))
+
+        st.write(f"**{len(resultado)}** acidentes encontrados.")
+        if len(resultado):
+            fig = px.scatter_mapbox(
+                resultado,
+                lat="latitude",
+                lon="longitude",
+                hover_name="municipio",
+                hover_data={
+                    "data_inversa": True,
+                    "mortos": True,
+                    "distancia_km": True,
+                },
+                color="mortos",
+                color_continuous_scale="Inferno",
+            )
+            fig.update_layout(
+                paper_bgcolor="#26292e",
+                mapbox_style="carto-positron",
+                mapbox_center={"lat": latitude_ref, "lon": longitude_ref},
+                mapbox_zoom=zoom_para_extensao(extensao_pontos(resultado)),
+                coloraxis_showscale=False,
+                height=450,
+            )
+            st.plotly_chart(fig)
+            st.dataframe(resultado.head(1000))
+
+
+# TRECHOS CRÍTICOS DAS RODOVIAS
+@secao_app("trechos_criticos")
+def secao_trechos_criticos(dados_completos, indice, filtros):
+    st.subheader("Trechos Críticos das Rodovias")
+
+    indice_rodovias = carregar_indice_rodovias(assinatura_dados(), dados_completos)
+    mascara_rodovias = mascara_filtrada(indice, filtros)
+
+    col_br, col_extensao, col_medida = st.columns(3)
+    br_filtro = col_br.selectbox("Rodovia (BR)", ["Todas"] + indice_rodovias["brs"])
+    extensao_km = col_extensao.number_input(
+        "Extensão do trecho (km)", min_value=1, max_value=200, value=10
+    )
+    medida_trechos = col_medida.selectbox("Classificar por", ["Mortos", "Acidentes"])
+
+    def calcular():
+        trechos = trechos_criticos(
+            indice_rodovias,
+            extensao_km=extensao_km,
+            quantidade=20,
+            br=None if br_filtro == "Todas" else br_filtro,
+            medida=medida_trechos.lower(),
+            mascara=mascara_rodovias,
+        )
+        if trechos.empty:
+            return trechos, None
+
+        trechos["trecho"] = (
+            "BR-"
+            + trechos["br"].astype(str)
+            + " km "
+            + trechos["km_inicial"].astype(str)
+            + "–"
+            + trechos["km_final"].astype(str)
+        )
+        grafico_trechos = trechos.sort_values(
+            medida_trechos.lower(), ascending=True
+        )
+
+        fig = px.bar(
+            grafico_trechos,
+            x=medida_trechos.lower(),
+            y="trecho",
+            orientation="h",
+            labels={
+                "mortos": "Número de Vítimas",
+                "acidentes": "Número de Acidentes",
+                "trecho": "",
+            },
+            text=medida_trechos.lower(),
+            color=medida_trechos.lower(),
+            color_continuous_scale="Reds",
+            hover_data={"acidentes": True, "mortos": True},
+        )
+        fig.update_layout(
+            xaxis_visible=False,
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            font=dict(family="Arial", size=12, color="white"),
+            coloraxis_showscale=False,
+            height=600,
+        )
+        return trechos, fig
+
+    trechos, fig = resultado_secao(
+        "trechos_criticos", filtros, (br_filtro, extensao_km, medida_trechos), calcular
     )
 
-    if uf_filtro == "Todos":
+    if trechos.empty:
         st.write(
-            f"A cidade com mais registros de acidentes é **{acidentes_por_municipio_sorted.iloc[0]["municipio"]}**, com um total de **{
-                acidentes_por_municipio_sorted.iloc[0]["quantidade_acidentes"]}** acidentes, "
-            f"representando **{(acidentes_por_municipio_sorted.iloc[0]["quantidade_acidentes"] /
-                                total_acidentes) * 100:.1f}%** do total de acidentes no Brasil."
+            "Nenhum acidente com rodovia e km registrados para os filtros escolhidos."
         )
     else:
+        st.plotly_chart(fig)
+
+        # Insights
+        pior_trecho = trechos.iloc[0]
+        st.write(
+            f"O trecho mais crítico é **{pior_trecho['trecho']}**, com "
+            f"**{pior_trecho['acidentes']}** acidentes e **{pior_trecho['mortos']}** "
+            "vítimas fatais."
+        )
+
+    # Contagem em um trecho qualquer de uma rodovia
+    with st.expander("Contar acidentes em um trecho"):
+        col_br_trecho, col_km_inicial, col_km_final = st.columns(3)
+        br_trecho = col_br_trecho.selectbox(
+            "BR", indice_rodovias["brs"], key="br_trecho"
+        )
+        km_inicial = col_km_inicial.number_input(
+            "km inicial", min_value=0.0, value=0.0, step=1.0
+        )
+        km_final = col_km_final.number_input(
+            "km final", min_value=0.0, value=100.0, step=1.0
+        )
+        contagem = contar_trecho(
+            indice_rodovias, br_trecho, km_inicial, km_final, mascara_rodovias
+        )
         st.write(
-            f"A cidade com mais registros de acidentes é **{acidentes_por_municipio_sorted.iloc[0]["municipio"]}**, com um total de **{
-                acidentes_por_municipio_sorted.iloc[0]["quantidade_acidentes"]}** acidentes, "
-            f"representando **{(acidentes_por_municipio_sorted.iloc[0]["quantidade_acidentes"] /
-                                total_acidentes) * 100:.1f}%** do total de acidentes no estado de **{uf_filtro}**."
+            f"Entre o km **{km_inicial:g}** e o km **{km_final:g}** da **BR-{br_trecho}** "
+            f"foram registrados **{contagem['acidentes']}** acidentes e "
+            f"**{contagem['mortos']}** vítimas fatais."
         )
 
-    # MAPA DE CALOR
+
+# MAPA DE CALOR
+@secao_app("mapa_de_calor")
+def secao_mapa_de_calor(cubo, filtros):
     st.subheader("Relação entre dia da semana e período do dia")
 
-    # Garantir que os dias da semana sigam a ordem correta
-    dias_da_semana_ordem = [
-        "Monday",
-        "Tuesday",
-        "Wednesday",
-        "Thursday",
-        "Friday",
-        "Saturday",
-        "Sunday",
-    ]
-    data["dia_semana"] = pd.Categorical(
-        data["dia_semana"], categories=dias_da_semana_ordem, ordered=True
-    )
+    def calcular():
+        # Ordem dos dias da semana e dos períodos do dia
+        dias_da_semana_ordem = [
+            "Monday",
+            "Tuesday",
+            "Wednesday",
+            "Thursday",
+            "Friday",
+            "Saturday",
+            "Sunday",
+        ]
+        periodos_dia_ordem = ["Madrugada", "Manhã", "Tarde", "Noite"]
 
-    # Garantir que os períodos do dia sigam a ordem correta
-    periodos_dia_ordem = ["Madrugada", "Manhã", "Tarde", "Noite"]
-    data["periodo_dia"] = pd.Categorical(
-        data["periodo_dia"], categories=periodos_dia_ordem, ordered=True
-    )
+        # Agrupando por dia da semana e período do dia, contando IDs únicos
+        heatmap_data = consultar_dados(
+            cubo, "dia_periodo", filtros, ["dia_semana", "periodo_dia"]
+        )
+        heatmap_data = (
+            heatmap_data.pivot(
+                index="periodo_dia", columns="dia_semana", values="ids_distintos"
+            )
+            .reindex(index=periodos_dia_ordem, columns=dias_da_semana_ordem)
+            .fillna(0)
+        )
 
-    # Agrupando por dia da semana e período do dia, contando IDs únicos
-    heatmap_data = (
-        data.groupby(["dia_semana", "periodo_dia"])["id"]
-        .nunique()
-        .reset_index(name="contagem_ids")
-    )
+        # Criando o gráfico de calor interativo
+        fig = px.imshow(
+            heatmap_data,
+            labels={
+                "x": "Dia da Semana",
+                "y": "Período do Dia",
+                "color": "Número de acidentes",
+            },
+            color_continuous_scale="YlGnBu",
+        )
 
-    # Criando o gráfico de calor interativo
-    fig = px.imshow(
-        heatmap_data.pivot(
-            index="periodo_dia", columns="dia_semana", values="contagem_ids"
-        ),
-        labels={
-            "x": "Dia da Semana",
-            "y": "Período do Dia",
-            "color": "Número de acidentes",
-        },
-        color_continuous_scale="YlGnBu",
-    )
+        # Personalizando o layout do gráfico
+        fig.update_layout(
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            font=dict(family="Arial", size=12, color="white"),
+            xaxis=dict(
+                title="Dia da Semana",
+                tickfont=dict(family="Arial", size=10, color="white"),
+            ),
+            yaxis=dict(
+                title="Período do Dia",
+                tickfont=dict(family="Arial", size=10, color="white"),
+            ),
+            coloraxis_colorbar=dict(
+                title="Número de Acidentes",
+                tickfont=dict(family="Arial", size=10, color="white"),
+            ),
+        )
+        return fig
 
-    # Personalizando o layout do gráfico
-    fig.update_layout(
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        font=dict(family="Arial", size=12, color="white"),
-        xaxis=dict(
-            title="Dia da Semana",
-            tickfont=dict(family="Arial", size=10, color="white"),
-        ),
-        yaxis=dict(
-            title="Período do Dia",
-            tickfont=dict(family="Arial", size=10, color="white"),
-        ),
-        coloraxis_colorbar=dict(
-            title="Número de Acidentes",
-            tickfont=dict(family="Arial", size=10, color="white"),
-        ),
-    )
+    st.plotly_chart(resultado_secao("mapa_de_calor", filtros, (), calcular))
 
-    st.plotly_chart(fig)
 
-    # GRÁFICO DE COLUNAS
-    # Analisar número de acidentes por UF
+# GRÁFICO DE COLUNAS
+# Analisar número de acidentes por UF
+@secao_app("estados")
+def secao_estados(cubo, filtros, textos):
     st.subheader("Número de Acidentes por Estado")
 
-    acidentes_uf = data.groupby(
-        "uf")["id"].nunique().reset_index(name="acidentes")
-
-    fig = px.bar(
-        acidentes_uf,
-        x="uf",
-        y="acidentes",
-        labels={
-            "uf": "UF",
-            "acidentes": "Número de Acidentes",
-        },
-        text="acidentes",
-    )
+    def calcular():
+        acidentes_uf = consultar_dados(cubo, "total", filtros, ["uf"])[
+            ["uf", "ids_distintos"]]
+        acidentes_uf.columns = ["uf", "acidentes"]
+
+        fig = px.bar(
+            acidentes_uf,
+            x="uf",
+            y="acidentes",
+            labels={
+                "uf": "UF",
+                "acidentes": "Número de Acidentes",
+            },
+            text="acidentes",
+        )
 
-    fig.update_traces(texttemplate="%{text}", textposition="inside")
+        fig.update_traces(texttemplate="%{text}", textposition="inside")
 
-    fig.update_layout(
-        yaxis_visible=False,
-        yaxis_showticklabels=False,
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-    )
+        fig.update_layout(
+            yaxis_visible=False,
+            yaxis_showticklabels=False,
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+        )
+
+        fig.update_traces(marker_color="#1f77b4")
+        return acidentes_uf, fig
 
-    fig.update_traces(marker_color="#1f77b4")
+    _, fig = resultado_secao("estados", filtros, (), calcular)
 
     st.plotly_chart(fig)
 
     # Insights
-    acidentes_uf_sorted = acidentes_uf.sort_values(
-        by="acidentes", ascending=False)
-
-    acidentes_uf_sorted_ascending = acidentes_uf.sort_values(
-        by="acidentes", ascending=True
-    )
+    if "estados" in textos:
+        st.write(textos["estados"])
 
-    if uf_filtro == "Todos":
-        st.write(
-            f"O estado com mais registros de acidentes é **{acidentes_uf_sorted.iloc[0]["uf"]}**, com um total de **{
-                acidentes_uf_sorted.iloc[0]["acidentes"]}** acidentes, "
-            f"representando **{(acidentes_uf_sorted.iloc[0]["acidentes"] / total_acidentes) *
-                               100:.1f}%** do total de acidentes no Brasil, seguido de **{acidentes_uf_sorted.iloc[1]["uf"]}** "
-            f"com **{acidentes_uf_sorted.iloc[1]["acidentes"]}** acidentes. Por outro lado, o estado com menor registro de acidentes é **{
-                acidentes_uf_sorted_ascending.iloc[0]["uf"]}** com **{acidentes_uf_sorted_ascending.iloc[0]["acidentes"]}** acidentes."
-        )
-    else:
-        st.write(
-            f"O estado de **{(uf_filtro)}** registrou um total de **{
-                (acidentes_uf_sorted.iloc[0]["acidentes"])}** acidentes, "
-            f"representando **{(acidentes_uf_sorted.iloc[0]["acidentes"] /
-                                all_total_acidentes) * 100:.1f}%** do total de acidentes no Brasil."
-        )
 
-    # GRÁFICO DE ROSCA
-    # Acidentes em feriados ou não
+# GRÁFICO DE ROSCA
+# Acidentes em feriados ou não
+@secao_app("feriados")
+def secao_feriados(cubo, filtros, textos):
     st.subheader("Número de acidentes em feriados")
 
-    pie_data = data.groupby("feriado")[
-        "id"].nunique().reset_index(name="acidentes")
-
-    fig = px.pie(pie_data, names="feriado", values="acidentes", hole=0.4)
-    fig.update_layout(
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        legend=dict(
-            orientation="v",
-            x=1,
-            y=0.5,
-            xanchor="left",
-            yanchor="middle",
-            font=dict(color="white"),
-        ),
-    )
+    def calcular():
+        pie_data = consultar_dados(cubo, "feriado", filtros, ["feriado"])[
+            ["feriado", "ids_distintos"]]
+        pie_data.columns = ["feriado", "acidentes"]
+        pie_data["feriado"] = pie_data["feriado"].map({True: "Sim", False: "Não"})
+
+        fig = px.pie(pie_data, names="feriado", values="acidentes", hole=0.4)
+        fig.update_layout(
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            legend=dict(
+                orientation="v",
+                x=1,
+                y=0.5,
+                xanchor="left",
+                yanchor="middle",
+                font=dict(color="white"),
+            ),
+        )
+        return pie_data, fig
+
+    _, fig = resultado_secao("feriados", filtros, (), calcular)
 
     st.plotly_chart(fig)
 
     # Insights
-    pie_data_sorted = pie_data.sort_values(by="acidentes", ascending=False)
+    if "feriados" in textos:
+        st.write(textos["feriados"])
 
-    if pie_data_sorted.iloc[0]["feriado"] == "Sim":
-        st.write(
-            f"A maioria dos acidentes (**{(pie_data_sorted.iloc[0]["acidentes"])}** - **{(
-                pie_data_sorted.iloc[0]["acidentes"] / total_acidentes) * 100:.1f}%**) aconteceram em feriados."
-        )
-    else:
-        st.write(
-            f"A maioria dos acidentes (**{(pie_data_sorted.iloc[0]["acidentes"])}** - **{(
-                pie_data_sorted.iloc[0]["acidentes"] / total_acidentes) * 100:.1f}%**) aconteceram quando não era feriado."
-        )
 
-    # GRÁFICO TEMPORAL
+# GRÁFICO TEMPORAL
+@secao_app("serie_temporal")
+def secao_serie_temporal(cubo, filtros):
     st.subheader("Análise de acidentes ao longo do tempo")
 
     # Periodicidade dinâmica
-    # Diário  # Mensal  # Anual
-    period_map = {"Dia": "D", "Mês": "M", "Ano": "Y"}
-
-    if mes_filtro == "Todos":
+    if filtros["nome_mes"] == "Todos":
         idx = 1
     else:
         idx = 0
 
     analise = st.selectbox(
-        "Escolha a periodicidade da análise", ["Dia", "Mês", "Ano"], index=idx
+        "Escolha a periodicidade da análise", list(periodos), index=idx
     )
 
-    selected_period = period_map[analise]
+    # Média móvel sobre a série diária
+    janela = "Nenhuma"
+    if analise == "Dia":
+        janela = st.selectbox(
+            "Média móvel",
+            ["Nenhuma"] + [f"{dias} dias" for dias in janelas_media_movel],
+        )
 
-    df_agrupado = (
-        data.groupby([data["data_inversa"].dt.to_period(selected_period)])[
-            "id"]
-        .nunique()
-        .reset_index(name="quantidade_acidentes")
+    # Série diária pré-agregada (cuboide "dia"), agregada por mês ou ano sob demanda
+    acidentes_por_dia = resultado_secao(
+        "serie_diaria",
+        filtros,
+        (),
+        lambda: serie_diaria(
+            consultar_dados(cubo, "dia", filtros, ["data_inversa"]), filtros=filtros
+        ),
     )
 
-    df_agrupado["data_inversa"] = df_agrupado["data_inversa"].dt.to_timestamp()
-
-    # Criando gráfico de linha interativo
-    fig = px.line(
-        df_agrupado,
-        x="data_inversa",
-        y="quantidade_acidentes",
-        labels={
-            "data_inversa": "Data",
-            "quantidade_acidentes": "Número de Acidentes",
-        },
-    )
+    def calcular():
+        df_agrupado = (
+            agregar_periodo(acidentes_por_dia, periodos[analise])
+            .rename_axis("data_inversa")
+            .reset_index(name="quantidade_acidentes")
+        )
 
-    fig.update_layout(
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        xaxis=dict(
-            title="",
-        ),
-        yaxis=dict(
-            title="",
-        ),
+        # Criando gráfico de linha interativo
+        fig = px.line(
+            df_agrupado,
+            x="data_inversa",
+            y="quantidade_acidentes",
+            labels={
+                "data_inversa": "Data",
+                "quantidade_acidentes": "Número de Acidentes",
+            },
+        )
+
+        fig.update_layout(
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            xaxis=dict(
+                title="",
+            ),
+            yaxis=dict(
+                title="",
+            ),
+        )
+
+        fig.update_traces(line=dict(color="#1f77b4"))
+
+        if janela != "Nenhuma":
+            movel = media_movel(acidentes_por_dia, int(janela.split()[0]))
+            fig.add_scatter(
+                x=movel.index,
+                y=movel.values,
+                mode="lines",
+                name=f"Média móvel ({janela})",
+                line=dict(color="#ff7f0e"),
+            )
+        return fig
+
+    st.plotly_chart(
+        resultado_secao("serie_temporal", filtros, (analise, janela), calcular)
     )
 
-    fig.update_traces(line=dict(color="#1f77b4"))
+    # Comparação entre os anos, mês a mês
+    if st.checkbox("Comparar anos"):
+
+        def calcular_comparacao():
+            tabela_anos, variacao_anos = comparacao_anual(acidentes_por_dia, "M")
+            fig = px.line(
+                tabela_anos.rename(columns=str),
+                labels={"mes": "Mês", "value": "Número de Acidentes", "ano": "Ano"},
+                markers=True,
+            )
+            fig.update_layout(
+                plot_bgcolor="#26292e",
+                paper_bgcolor="#26292e",
+                xaxis=dict(tickmode="linear", dtick=1),
+            )
+            return variacao_anos.round(1), fig
+
+        variacao_anos, fig = resultado_secao(
+            "comparacao_anual", filtros, (), calcular_comparacao
+        )
+        st.plotly_chart(fig)
+
+        if not variacao_anos.empty:
+            st.write("Variação em relação ao ano anterior (%)")
+            st.dataframe(variacao_anos)
 
-    st.plotly_chart(fig)
 
-    # MATRIZ DE CORRELAÇÃO
+# MATRIZ DE CORRELAÇÃO
+@secao_app("correlacao")
+def secao_correlacao(cubo, filtros):
     st.subheader("Matriz de correlação")
 
-    variaveis_numericas = data[
-        [
-            "pessoas",
-            "mortos",
-            "feridos_leves",
-            "feridos_graves",
-            "ilesos",
-            "feridos",
-            "veiculos",
-        ]
-    ]
+    def calcular():
+        # Correlação a partir das estatísticas suficientes pré-agregadas (somas
+        # e somas dos produtos), sem percorrer as linhas filtradas
+        correlacao = correlacao_momentos(
+            consultar_dados(cubo, cuboide_momentos, filtros)
+        )
+        correlacao = np.trunc(correlacao * 1000) / 1000
 
-    correlacao = variaveis_numericas.corr()
-    correlacao = correlacao.applymap(lambda x: int(x * 1000) / 1000)
+        fig = px.imshow(
+            correlacao,
+            text_auto=True,
+            color_continuous_scale="RdBu_r",
+        )
 
-    fig = px.imshow(
-        correlacao,
-        text_auto=True,
-        color_continuous_scale="RdBu_r",
-    )
+        fig.update_layout(
+            plot_bgcolor="#26292e",
+            paper_bgcolor="#26292e",
+            height=650,
+        )
 
-    fig.update_layout(
-        plot_bgcolor="#26292e",
-        paper_bgcolor="#26292e",
-        height=650,
-    )
+        # Cópia: a figura pode compartilhar os valores da matriz
+        correlacao = correlacao.copy()
+        np.fill_diagonal(correlacao.values, np.nan)
 
-    st.plotly_chart(fig)
+        correlacao_melted = correlacao.stack()
 
-    np.fill_diagonal(correlacao.values, np.nan)
+        correlacao_melted = correlacao_melted.sort_values(ascending=False)
 
-    correlacao_melted = correlacao.stack()
+        top_10_correlacoes = correlacao_melted.head(
+            10).reset_index(name="Correlação")
+        return fig, top_10_correlacoes
 
-    correlacao_melted = correlacao_melted.sort_values(ascending=False)
+    fig, top_10_correlacoes = resultado_secao("correlacao", filtros, (), calcular)
 
-    top_10_correlacoes = correlacao_melted.head(
-        10).reset_index(name="Correlação")
+    st.plotly_chart(fig)
 
     st.write(top_10_correlacoes)
+
+
+# Função para carregamento dos dados e atualizar a barra de progresso
+def load_data_with_progress():
+    st.title("Análise de Acidentes de Trânsito")
+    # Barra de progresso
+    progress_bar = st.progress(0)
+    progress_text = st.empty()
+
+    # Atualiza a barra com a etapa real do processamento
+    def atualizar_progresso(etapa, fracao):
+        progress_bar.progress(int(fracao * 100))
+        progress_text.text(f"{etapa}... {int(fracao * 100)}%")
+
+    progress_text.text("Iniciando o carregamento dos dados...")
+    data, null_info_before, null_info_after = carregar_dados(
+        assinatura_dados(), atualizar_progresso
+    )
+
+    if data is None:
+        st.error("Erro ao carregar os dados consolidados.")
+    else:
+        st.success("Dados carregados com sucesso.")
+        progress_bar.progress(100)
+        progress_text.empty()
+
+        # Resumo dos valores nulos tratados na consolidação
+        with st.expander("Qualidade dos dados: valores nulos"):
+            nulos = pd.DataFrame(
+                {
+                    "Antes do tratamento": null_info_before,
+                    "Após o tratamento": null_info_after,
+                }
+            )
+            st.dataframe(nulos[nulos["Antes do tratamento"] > 0])
+
+    return data
+
+
+# Carregar os dados
+data = load_data_with_progress()
+
+if data is not None:
+    # Medição dos filtros e de cada seção do app (tempo, linhas e memória)
+    medicao_filtros = iniciar_medicao("filtros", "app", len(data))
+
+    # Total de acidentes sem filtro aplicado
+    all_total_acidentes = len(data)
+
+    # Índice dos filtros, com as opções de cada filtro já ordenadas
+    indice = carregar_indice(assinatura_dados(), data)
+    opcoes = indice["opcoes"]
+
+    # Definição dos filtros
+    ano_filtro = st.selectbox("Escolha o ano", ["Todos"] + opcoes["ano"])
+    mes_filtro = st.selectbox("Escolha o mês", ["Todos"] + opcoes["nome_mes"])
+    uf_filtro = st.selectbox("Escolha a UF", ["Todos"] + opcoes["uf"])
+    tipo_acidente_filtro = st.selectbox(
+        "Escolha o tipo de acidente", ["Todos"] + opcoes["tipo_acidente"]
+    )
+
+    # Cubo de agregados (backend pandas) e filtros aplicados às consultas
+    cubo = None
+    if backend_consultas == "pandas":
+        cubo = carregar_cubo(assinatura_dados(), data)
+    filtros = {
+        "ano": ano_filtro,
+        "nome_mes": mes_filtro,
+        "uf": uf_filtro,
+        "tipo_acidente": tipo_acidente_filtro,
+    }
+
+    # Totais dos filtros escolhidos
+    totais = resultado_secao(
+        "totais", filtros, (), lambda: consultar_dados(cubo, "total", filtros)
+    )
+    finalizar_medicao(medicao_filtros, int(totais["acidentes"]))
+
+    # Só as seções do grupo escolhido são calculadas. As linhas filtradas não
+    # são materializadas: as seções consultam o cubo, e as que precisam das
+    # linhas (visualizações, consultas espaciais, trechos) usam o índice dos
+    # filtros.
+    grupo_secoes = st.radio(
+        "Seções",
+        [
+            "Visão geral",
+            "Mapa e rodovias",
+            "Padrões",
+            "Evolução temporal",
+            "Correlação",
+        ],
+        horizontal=True,
+    )
+
+    # Textos dos insights, usados nas seções dos três primeiros grupos
+    if grupo_secoes in ["Visão geral", "Mapa e rodovias", "Padrões"]:
+        textos = textos_filtros(cubo, filtros, all_total_acidentes)
+
+    if grupo_secoes == "Visão geral":
+        secao_visualizacoes(data, indice, filtros)
+        secao_top_causas(cubo, filtros, textos)
+        secao_top_tipos(cubo, filtros, textos)
+        secao_condicao_meteorologica(cubo, filtros, textos)
+    elif grupo_secoes == "Mapa e rodovias":
+        secao_mapa(cubo, filtros, textos)
+        secao_consultas_espaciais(data, indice, cubo, filtros)
+        secao_trechos_criticos(data, indice, filtros)
+    elif grupo_secoes == "Padrões":
+        secao_mapa_de_calor(cubo, filtros)
+        secao_estados(cubo, filtros, textos)
+        secao_feriados(cubo, filtros, textos)
+    elif grupo_secoes == "Evolução temporal":
+        secao_serie_temporal(cubo, filtros)
+    else:
+        secao_correlacao(cubo, filtros)
+
+    # PAINEL DE DESEMPENHO
+    # Última medição de cada seção (tempo e pico de memória, com
+    # PRF_MEDIR_MEMORIA=1), uso do cache das seções e últimas etapas do pipeline
+    if painel_desempenho or st.query_params.get("desempenho") == "1":
+        with st.expander("Desempenho", expanded=True):
+            colunas_medicao = [
+                "etapa",
+                "segundos",
+                "linhas_entrada",
+                "linhas_saida",
+                "pico_memoria_mb",
+                "data",
+            ]
+            medicoes_secoes = medicoes_recentes("app").drop_duplicates(
+                "etapa", keep="last"
+            )
+            fig = px.bar(
+                medicoes_secoes,
+                x="segundos",
+                y="etapa",
+                orientation="h",
+                labels={"segundos": "Tempo (s)", "etapa": "Seção"},
+            )
+            fig.update_layout(
+                plot_bgcolor="#26292e",
+                paper_bgcolor="#26292e",
+                yaxis=dict(autorange="reversed"),
+            )
+            st.plotly_chart(fig)
+            st.dataframe(medicoes_secoes[colunas_medicao])
+
+            st.write("Cache das seções")
+            st.dataframe(pd.Series(estatisticas_cache(cache_secoes()), name="valor"))
+
+            medicoes_pipeline = medicoes_recentes("pipeline")
+            if medicoes_pipeline.empty:
+                st.write("Nenhuma etapa do pipeline medida neste processo.")
+            else:
+                st.write("Últimas etapas do pipeline")
+                colunas_pipeline = colunas_medicao + [
+                    coluna
+                    for coluna in ["arquivo", "execucao"]
+                    if coluna in medicoes_pipeline
+                ]
+                st.dataframe(medicoes_pipeline[colunas_pipeline].tail(50))
@@ -0,0 +1,511 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import holidays
+import numpy as np
+import pandas as pd
+
+import data_processing
+from binning import histograma
+from cache import cache_file, calcular_fingerprint, ler_metadados, salvar_cache
+from cube import (
+    cobre_filtros,
+    construir_cubo,
+    consultar,
+    consultar_linhas,
+    cuboide_momentos,
+    cuboides,
+)
+from data_processing import (
+    adicionar_informacoes,
+    arquivos_entrada,
+    colunas_sem_imputacao,
+    concatenar_arquivos,
+    consolidate_data,
+    ler_arquivos_existentes,
+    remover_registros_incoerentes,
+)
+from dataset import ordenar_por_particao
+from dedup import remover_duplicatas
+from filter_index import construir_indice, filtrar, mascara_filtrada
+from imputation import imputar, perfilar_colunas
+from moments import correlacao_momentos
+from road_index import construir_indice_rodovias, trechos_criticos
+from schema import compactar_dataframe
+from shared_dataset import abrir_dataset, publicar_dataset
+from spatial import colunas_celula, nome_grade, pontos_mapa
+from spatial_index import construir_indice_espacial
+from sql_backend import backend_sql_disponivel, conectar, consultar_sql
+from synthetic import gerar_dados_sinteticos
+from timeseries import agregar_periodo, serie_diaria
+
+# Função para gerar um DataFrame com as colunas usadas na engenharia de atributos
+
+
+def gerar_dados_enriquecimento(n_linhas, seed=0):
+    rng = np.random.default_rng(seed)
+    datas = pd.Timestamp("2021-01-01") + pd.to_timedelta(
+        rng.integers(0, 4 * 365, n_linhas), unit="D"
+    )
+    segundos = rng.integers(0, 24 * 3600, n_linhas)
+    horarios = pd.to_datetime(segundos, unit="s").strftime("%H:%M:%S")
+    return pd.DataFrame(
+        {
+            "data_inversa": datas,
+            "horario": horarios,
+            "pessoas": rng.integers(0, 30, n_linhas),
+        }
+    )
+
+
+# Função para medir o melhor tempo (em segundos) de várias execuções
+
+
+def medir(funcao, df, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        copia = df.copy()
+        inicio = time.perf_counter()
+        funcao(copia)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+# Implementação anterior da coluna de feriados (lambda por linha), mantida
+# apenas como referência de comparação
+
+
+def feriado_por_linha(df):
+    feriados = holidays.Brazil(years=df["data_inversa"].dt.year.unique())
+    return df["data_inversa"].map(lambda x: "Sim" if x in feriados else "Não")
+
+
+# Função para medir a vazão da engenharia de atributos (segundos por milhão de linhas)
+
+
+def benchmark_adicionar_informacoes(n_linhas=1_000_000, repeticoes=3):
+    df = gerar_dados_enriquecimento(n_linhas)
+    por_milhao = 1_000_000 / n_linhas
+
+    tempo_total = medir(adicionar_informacoes, df, repeticoes)
+    tempo_feriado = medir(feriado_por_linha, df, 1)
+
+    return {
+        "linhas": n_linhas,
+        "adicionar_informacoes_s_por_milhao": tempo_total * por_milhao,
+        "adicionar_informacoes_linhas_por_s": n_linhas / tempo_total,
+        "feriado_por_linha_s_por_milhao": tempo_feriado * por_milhao,
+    }
+
+
+# Função para executar uma etapa medindo o tempo de parede e o pico de memória
+# alocada (tracemalloc; na leitura paralela, só o processo principal é medido).
+# O tracemalloc deixa as etapas com muitos objetos Python mais lentas; com
+# memoria=False, só o tempo é medido.
+# Retorna o resultado da função e o registro da medição.
+
+
+def medir_etapa(nome, funcao, *args, linhas_entrada=None, memoria=True, **kwargs):
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    segundos = time.perf_counter() - inicio
+    pico = None
+    if memoria:
+        pico = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+        tracemalloc.stop()
+
+    saida = resultado[0] if isinstance(resultado, tuple) else resultado
+    return resultado, {
+        "etapa": nome,
+        "segundos": round(segundos, 4),
+        "pico_memoria_mb": pico,
+        "linhas_entrada": linhas_entrada,
+        "linhas_saida": len(saida) if isinstance(saida, pd.DataFrame) else None,
+    }
+
+
+# Função para medir cada etapa da consolidação sobre os arquivos de um
+# diretório, na mesma ordem de consolidate_data, e depois a consolidação
+# completa e a carga a partir do cache. Retorna as medições e o DataFrame
+# consolidado.
+
+
+def benchmark_pipeline(diretorio, memoria=True):
+    data_processing.data_path = diretorio
+    data_processing.cache_path = os.path.join(diretorio, "cache")
+    file_paths = arquivos_entrada()
+    fingerprint = calcular_fingerprint(file_paths, data_processing.PIPELINE_VERSION)
+    etapas = []
+
+    def etapa(nome, funcao, *args, linhas_entrada=None):
+        resultado, registro = medir_etapa(
+            nome, funcao, *args, linhas_entrada=linhas_entrada, memoria=memoria
+        )
+        if registro["linhas_saida"] is None:
+            registro["linhas_saida"] = linhas_entrada
+        etapas.append(registro)
+        return resultado
+
+    _, dataframes = etapa(
+        "leitura",
+        ler_arquivos_existentes,
+        [os.path.basename(path) for path in file_paths],
+        diretorio,
+    )
+    linhas_lidas = sum(len(df) for df in dataframes)
+    etapas[-1]["linhas_saida"] = linhas_lidas
+    df = etapa(
+        "concatenacao", concatenar_arquivos, dataframes, linhas_entrada=linhas_lidas
+    )
+    del dataframes
+    df["ano"] = df["data_inversa"].dt.year
+
+    estatisticas = etapa(
+        "perfil_imputacao",
+        perfilar_colunas,
+        df,
+        colunas_sem_imputacao,
+        linhas_entrada=len(df),
+    )
+    null_info_before, null_info_after = etapa(
+        "imputacao",
+        imputar,
+        df,
+        estatisticas,
+        estatisticas["nulos"],
+        linhas_entrada=len(df),
+    )
+    df = etapa("deduplicacao", remover_duplicatas, df, linhas_entrada=len(df))[0]
+    df = etapa("validacao", remover_registros_incoerentes, df, linhas_entrada=len(df))
+    df = etapa("enriquecimento", adicionar_informacoes, df, linhas_entrada=len(df))
+    df = etapa("compactacao", compactar_dataframe, df, linhas_entrada=len(df))[0]
+    df = etapa("ordenacao", ordenar_por_particao, df, linhas_entrada=len(df))
+    etapa(
+        "gravacao",
+        salvar_cache,
+        df,
+        null_info_before,
+        null_info_after,
+        fingerprint,
+        data_processing.cache_path,
+        linhas_entrada=len(df),
+    )
+    chave = ler_metadados(data_processing.cache_path)["chave"]
+    etapa(
+        "publicacao",
+        publicar_dataset,
+        df,
+        data_processing.cache_path,
+        chave,
+        linhas_entrada=len(df),
+    )
+    etapa(
+        "abertura_compartilhada",
+        abrir_dataset,
+        data_processing.cache_path,
+        chave,
+        linhas_entrada=len(df),
+    )
+    etapa("cubo", construir_cubo, df, linhas_entrada=len(df))
+    etapa("indice_filtros", construir_indice, df, linhas_entrada=len(df))
+    etapa("indice_espacial", construir_indice_espacial, df, linhas_entrada=len(df))
+    etapa("indice_rodovias", construir_indice_rodovias, df, linhas_entrada=len(df))
+
+    # Pipeline completo (inclui manifesto, chaves e cubo) e carga do cache
+    etapa("consolidacao_completa", consolidate_data, False, linhas_entrada=linhas_lidas)
+    df = etapa("carga_cache", consolidate_data, True)[0]
+    return etapas, df
+
+
+# Função para montar as combinações de filtros das consultas, do mais amplo ao
+# mais restrito, com os valores mais frequentes dos dados
+
+
+def combinacoes_filtros(df):
+    ano = int(df["ano"].max())
+    uf = df["uf"].value_counts().index[0]
+    do_ano = df[df["ano"] == ano]
+    return {
+        "sem_filtro": {},
+        "ano": {"ano": ano},
+        "ano_uf": {"ano": ano, "uf": uf},
+        "todos": {
+            "ano": ano,
+            "nome_mes": do_ano["nome_mes"].value_counts().index[0],
+            "uf": uf,
+            "tipo_acidente": do_ano["tipo_acidente"].value_counts().index[0],
+        },
+    }
+
+
+# Função para medir as agregações de cada seção do app para várias combinações
+# de filtros, no backend escolhido ("pandas" usa o cubo; "duckdb" consulta o
+# dataset Parquet). Cada consulta é repetida e o menor tempo é registrado.
+
+
+def benchmark_consultas(df, repeticoes=3, backend="pandas", memoria=True):
+    cubo = construir_cubo(df)
+    indice = construir_indice(df)
+    indice_rodovias = construir_indice_rodovias(df)
+    if backend == "duckdb":
+        conexao = conectar(os.path.join(data_processing.cache_path, cache_file))
+
+        def agregado(nome, filtros, dimensoes=()):
+            return consultar_sql(
+                conexao, filtros, dimensoes, momentos=nome == cuboide_momentos
+            )
+
+    else:
+
+        def agregado(nome, filtros, dimensoes=()):
+            if not cobre_filtros(nome, filtros):
+                return consultar_linhas(filtrar(df, indice, filtros), nome, dimensoes)
+            return consultar(cubo, nome, filtros, dimensoes)
+
+    grade = nome_grade(0.1)
+    consultas = {
+        "top_causas": lambda f: agregado("causa_acidente", f, ["causa_acidente"]),
+        "totais": lambda f: agregado("total", f),
+        "top_tipos": lambda f: agregado("total", f, ["tipo_acidente"]),
+        "condicao_meteorologica": lambda f: agregado(
+            "condicao_metereologica", f, ["condicao_metereologica"]
+        ),
+        "mapa_municipios": lambda f: pontos_mapa(
+            agregado("municipio", f, ["uf", "municipio"])
+        ),
+        "mapa_grade": lambda f: pontos_mapa(agregado(grade, f, colunas_celula(0.1))),
+        "mapa_calor": lambda f: agregado(
+            "dia_periodo", f, ["dia_semana", "periodo_dia"]
+        ),
+        "acidentes_por_uf": lambda f: agregado("total", f, ["uf"]),
+        "feriados": lambda f: agregado("feriado", f, ["feriado"]),
+        "serie_mensal": lambda f: agregar_periodo(
+            serie_diaria(agregado("dia", f, ["data_inversa"]), filtros=f), "M"
+        ).to_frame(),
+        "correlacao": lambda f: correlacao_momentos(agregado(cuboide_momentos, f)),
+        "filtro_linhas": lambda f: filtrar(df, indice, f),
+        "histograma": lambda f: histograma(filtrar(df, indice, f)["pessoas"]),
+        "trechos_criticos": lambda f: trechos_criticos(
+            indice_rodovias, mascara=mascara_filtrada(indice, f)
+        ),
+    }
+
+    resultados = []
+    for nome_filtros, filtros in combinacoes_filtros(df).items():
+        for nome, consulta in consultas.items():
+            resultado, registro = medir_etapa(nome, consulta, filtros, memoria=memoria)
+            tempos = [registro["segundos"]]
+            for _ in range(repeticoes - 1):
+                inicio = time.perf_counter()
+                consulta(filtros)
+                tempos.append(time.perf_counter() - inicio)
+            resultados.append(
+                {
+                    "consulta": nome,
+                    "filtros": nome_filtros,
+                    "backend": backend,
+                    "segundos": round(min(tempos), 5),
+                    "pico_memoria_mb": registro["pico_memoria_mb"],
+                    "linhas_resultado": len(resultado),
+                }
+            )
+    return resultados
+
+
+# Função para medir o tamanho do cubo (linhas e memória de cada cuboide) em
+# relação ao DataFrame consolidado de onde ele é agregado
+
+
+def tamanho_cubo(cubo, df):
+    def megabytes(tabela):
+        return round(tabela.memory_usage(deep=True).sum() / 1e6, 2)
+
+    cuboides_medidos = {
+        nome: {"linhas": len(tabela), "mb": megabytes(tabela)}
+        for nome, tabela in cubo.items()
+    }
+    return {
+        "cuboides": cuboides_medidos,
+        "linhas": sum(medida["linhas"] for medida in cuboides_medidos.values()),
+        "mb": round(sum(medida["mb"] for medida in cuboides_medidos.values()), 2),
+        "linhas_consolidadas": len(df),
+        "mb_consolidado": megabytes(df),
+    }
+
+
+# Função para medir o ganho do cubo: para cada cuboide e combinação de filtros,
+# compara a consulta ao cubo com a agregação das linhas filtradas pelo índice
+# (mesmas medidas). Cuboides que não guardam alguma dimensão dos filtros usam as
+# linhas nos dois casos, como no app. Retorna também o tamanho do cubo.
+
+
+def benchmark_cubo(df, repeticoes=3):
+    cubo = construir_cubo(df)
+    indice = construir_indice(df)
+
+    def melhor_tempo(funcao):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+        return min(tempos)
+
+    resultados = []
+    for nome_filtros, filtros in combinacoes_filtros(df).items():
+        for nome in list(cuboides) + [cuboide_momentos]:
+            dimensoes = cuboides.get(nome, [])
+
+            def por_linhas():
+                return consultar_linhas(filtrar(df, indice, filtros), nome, dimensoes)
+
+            def por_cubo():
+                if not cobre_filtros(nome, filtros):
+                    return por_linhas()
+                return consultar(cubo, nome, filtros, dimensoes)
+
+            segundos_cubo = melhor_tempo(por_cubo)
+            segundos_linhas = melhor_tempo(por_linhas)
+            resultados.append(
+                {
+                    "cuboide": nome,
+                    "filtros": nome_filtros,
+                    "linhas_cuboide": len(cubo[nome]),
+                    "usa_cubo": cobre_filtros(nome, filtros),
+                    "segundos_cubo": round(segundos_cubo, 5),
+                    "segundos_linhas": round(segundos_linhas, 5),
+                    "aceleracao": round(segundos_linhas / segundos_cubo, 1),
+                }
+            )
+    return {"tamanho": tamanho_cubo(cubo, df), "consultas": resultados}
+
+
+# Função para descrever o ambiente da execução (para comparar resultados)
+
+
+def ambiente():
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+# Função para executar a suíte completa: gera os dados sintéticos, mede as
+# etapas do pipeline e as consultas do app. Retorna o resultado em um
+# dicionário serializável em JSON.
+
+
+def benchmark_completo(
+    escala=1,
+    anos=(2021, 2022, 2023, 2024),
+    destino=None,
+    repeticoes=3,
+    backend="pandas",
+    seed=0,
+    memoria=True,
+):
+    temporario = destino is None
+    diretorio = tempfile.mkdtemp(prefix="prf_benchmark_") if temporario else destino
+    inicio = time.perf_counter()
+    try:
+        # As mensagens do pipeline vão para stderr; stdout fica só com o JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            arquivos, registro_geracao = medir_etapa(
+                "geracao_dados",
+                gerar_dados_sinteticos,
+                diretorio,
+                anos,
+                escala,
+                seed,
+                memoria=False,
+            )
+            etapas, df = benchmark_pipeline(diretorio, memoria)
+            consultas = benchmark_consultas(df, repeticoes, backend, memoria)
+            cubo = benchmark_cubo(df, repeticoes)
+    finally:
+        if temporario:
+            shutil.rmtree(diretorio, ignore_errors=True)
+
+    return {
+        "parametros": {
+            "escala": escala,
+            "anos": list(anos),
+            "repeticoes": repeticoes,
+            "backend": backend,
+            "seed": seed,
+            "memoria": memoria,
+        },
+        "ambiente": ambiente(),
+        "dados": {
+            "arquivos": [
+                {**arquivo, "path": os.path.basename(arquivo["path"])}
+                for arquivo in arquivos
+            ],
+            "linhas_consolidadas": len(df),
+            "segundos_geracao": registro_geracao["segundos"],
+        },
+        "etapas": etapas,
+        "consultas": consultas,
+        "cubo": cubo,
+        "segundos_total": round(time.perf_counter() - inicio, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do pipeline e do app.")
+    parser.add_argument(
+        "--modo",
+        choices=["enriquecimento", "completo"],
+        default="enriquecimento",
+        help="enriquecimento: micro-benchmark de adicionar_informacoes; "
+        "completo: dados sintéticos, etapas do pipeline e consultas do app",
+    )
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument(
+        "--escala", type=float, default=1, help="Múltiplo de um ano típico da PRF"
+    )
+    parser.add_argument("--anos", type=int, nargs="+", default=[2021, 2022, 2023, 2024])
+    parser.add_argument(
+        "--destino", help="Diretório dos dados sintéticos (padrão: temporário)"
+    )
+    parser.add_argument("--backend", choices=["pandas", "duckdb"], default="pandas")
+    parser.add_argument(
+        "--sem-memoria",
+        action="store_true",
+        help="Não medir o pico de memória (tracemalloc deixa as etapas mais lentas)",
+    )
+    parser.add_argument("--saida", help="Arquivo JSON com o resultado")
+    args = parser.parse_args()
+
+    if args.modo == "completo":
+        if args.backend == "duckdb" and not backend_sql_disponivel():
+            parser.error("O backend duckdb requer o pacote duckdb.")
+        resultado = benchmark_completo(
+            args.escala,
+            args.anos,
+            args.destino,
+            args.repeticoes,
+            args.backend,
+            memoria=not args.sem_memoria,
+        )
+    else:
+        resultado = benchmark_adicionar_informacoes(args.linhas, args.repeticoes)
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
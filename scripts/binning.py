@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+
+# Número padrão de faixas dos histogramas e de cada eixo da densidade 2D
+bins_histograma = 30
+bins_densidade = 50
+
+# Número máximo de outliers enviados ao gráfico de boxplot
+max_outliers = 500
+
+
+# Função para obter os valores não nulos de uma coluna numérica como float64
+
+
+def valores_validos(serie):
+    valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+    return valores[~np.isnan(valores)]
+
+
+# Função para calcular as bordas das faixas. Em colunas inteiras com poucos
+# valores distintos, cada faixa contém exatamente um inteiro (evita faixas
+# vazias alternadas); nas demais, são "bins" faixas de mesma largura.
+
+
+def bordas_faixas(valores, bins, inteiro=False):
+    if len(valores) == 0:
+        return np.array([0.0, 1.0])
+    minimo, maximo = valores.min(), valores.max()
+    if inteiro and maximo - minimo + 1 <= bins:
+        return np.arange(minimo, maximo + 2) - 0.5
+    if minimo == maximo:
+        return np.array([minimo - 0.5, maximo + 0.5])
+    return np.linspace(minimo, maximo, bins + 1)
+
+
+# Função para calcular o histograma de uma coluna no servidor: retorna uma linha
+# por faixa (início, fim, centro e contagem), com a densidade opcional
+
+
+def histograma(serie, bins=bins_histograma, densidade=False):
+    valores = valores_validos(serie)
+    bordas = bordas_faixas(
+        valores, bins, inteiro=pd.api.types.is_integer_dtype(serie.dtype)
+    )
+    contagens, bordas = np.histogram(valores, bins=bordas)
+    faixas = pd.DataFrame(
+        {
+            "inicio": bordas[:-1],
+            "fim": bordas[1:],
+            "centro": (bordas[:-1] + bordas[1:]) / 2,
+            "contagem": contagens,
+        }
+    )
+    if densidade:
+        faixas["densidade"] = contagens / max(len(valores), 1) / np.diff(bordas)
+    return faixas
+
+
+# Função para calcular a densidade 2D de duas colunas (histograma bidimensional).
+# Retorna apenas as células com acidentes, no centro de cada célula.
+
+
+def densidade_2d(serie_x, serie_y, bins=bins_densidade):
+    x = serie_x.to_numpy(dtype="float64", na_value=np.nan)
+    y = serie_y.to_numpy(dtype="float64", na_value=np.nan)
+    validos = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[validos], y[validos]
+
+    bordas_x = bordas_faixas(
+        x, bins, inteiro=pd.api.types.is_integer_dtype(serie_x.dtype)
+    )
+    bordas_y = bordas_faixas(
+        y, bins, inteiro=pd.api.types.is_integer_dtype(serie_y.dtype)
+    )
+    contagens, bordas_x, bordas_y = np.histogram2d(x, y, bins=[bordas_x, bordas_y])
+
+    i, j = np.nonzero(contagens)
+    return pd.DataFrame(
+        {
+            serie_x.name: ((bordas_x[:-1] + bordas_x[1:]) / 2)[i],
+            serie_y.name: ((bordas_y[:-1] + bordas_y[1:]) / 2)[j],
+            "contagem": contagens[i, j].astype("int64"),
+        }
+    )
+
+
+# Função para calcular as estatísticas do boxplot (quartis, limites a 1,5 IQR
+# e uma amostra dos outliers), para desenhar o gráfico sem enviar os dados
+
+
+def resumo_boxplot(serie, limite_outliers=max_outliers, semente=0):
+    valores = valores_validos(serie)
+    if len(valores) == 0:
+        return None
+    q1, mediana, q3 = np.quantile(valores, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+    outliers = valores[(valores < q1 - 1.5 * iqr) | (valores > q3 + 1.5 * iqr)]
+
+    total_outliers = len(outliers)
+    if total_outliers > limite_outliers:
+        # Os extremos sempre aparecem; o restante é amostrado
+        rng = np.random.default_rng(semente)
+        amostra = rng.choice(outliers, limite_outliers - 2, replace=False)
+        outliers = np.concatenate(([outliers.min(), outliers.max()], amostra))
+
+    return {
+        "q1": q1,
+        "mediana": mediana,
+        "q3": q3,
+        "limite_inferior": dentro.min(),
+        "limite_superior": dentro.max(),
+        "media": valores.mean(),
+        "n": len(valores),
+        "outliers": np.sort(outliers),
+        "total_outliers": total_outliers,
+    }
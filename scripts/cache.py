@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import pandas as pd
+from dataset import ler_dataset, salvar_dataset
+from shared_dataset import abrir_dataset, publicar_dataset
+
+# Dataset Parquet particionado por ano e UF (diretórios ano=.../uf=...)
+cache_file = "dados_consolidados"
+meta_file = "dados_consolidados.json"
+
+# Função para obter a assinatura rápida (caminho, tamanho e mtime) dos arquivos
+
+
+def assinatura_arquivos(file_paths):
+    assinatura = []
+    for file_path in sorted(file_paths):
+        stat = os.stat(file_path)
+        assinatura.append(
+            {
+                "path": os.path.abspath(file_path),
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+            }
+        )
+    return assinatura
+
+
+# Função para calcular o hash do conteúdo de um arquivo em blocos
+
+
+def hash_conteudo(file_path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for bloco in iter(lambda: f.read(chunk_size), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+# Função para calcular o fingerprint completo dos arquivos de entrada e da versão do pipeline.
+# "hashes" (caminho -> hash) permite reaproveitar hashes já conhecidos de
+# arquivos que não mudaram (ex.: na carga incremental), e "assinatura" uma
+# assinatura rápida já obtida junto com esses hashes.
+# Deve ser calculado antes da leitura dos arquivos: se um arquivo mudar durante
+# o processamento, o cache fica com o fingerprint antigo e é invalidado na
+# próxima execução, em vez de valer para um conteúdo que não foi lido.
+
+
+def calcular_fingerprint(file_paths, pipeline_version, hashes=None, assinatura=None):
+    arquivos = [
+        dict(arquivo) for arquivo in (assinatura or assinatura_arquivos(file_paths))
+    ]
+    for arquivo in arquivos:
+        arquivo["hash"] = (hashes or {}).get(arquivo["path"]) or hash_conteudo(
+            arquivo["path"]
+        )
+
+    chave = hashlib.blake2b(
+        json.dumps(
+            {
+                "pipeline_version": pipeline_version,
+                "arquivos": [(a["path"], a["size"], a["hash"]) for a in arquivos],
+            },
+            sort_keys=True,
+        ).encode("utf-8"),
+        digest_size=16,
+    ).hexdigest()
+
+    return {"pipeline_version": pipeline_version, "arquivos": arquivos, "chave": chave}
+
+
+# Função para ler os metadados do cache (retorna None se não existirem)
+
+
+def ler_metadados(cache_dir):
+    meta_path = os.path.join(cache_dir, meta_file)
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Metadados do cache inválidos em {meta_path}: {e}")
+        return None
+
+
+# Função para gravar os metadados do cache de forma atômica
+
+
+def gravar_metadados(cache_dir, meta):
+    os.makedirs(cache_dir, exist_ok=True)
+    meta_path = os.path.join(cache_dir, meta_file)
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+# Função para verificar se o cache é válido para os arquivos de entrada atuais.
+# Primeiro compara a assinatura rápida (tamanho e mtime); só calcula o hash do
+# conteúdo quando ela mudou, para que um simples "touch" não invalide o cache.
+
+
+def cache_valido(file_paths, pipeline_version, cache_dir):
+    meta = ler_metadados(cache_dir)
+    if meta is None or meta.get("pipeline_version") != pipeline_version:
+        return False, meta
+    if not os.path.exists(os.path.join(cache_dir, cache_file)):
+        return False, meta
+
+    assinatura = assinatura_arquivos(file_paths)
+    assinatura_cache = [
+        {k: a[k] for k in ("path", "size", "mtime_ns")} for a in meta["arquivos"]
+    ]
+    if assinatura == assinatura_cache:
+        return True, meta
+
+    # Tamanho ou mtime mudaram: confirmar pelo conteúdo
+    fingerprint = calcular_fingerprint(file_paths, pipeline_version)
+    if fingerprint["chave"] != meta.get("chave"):
+        return False, meta
+
+    # Conteúdo idêntico: atualizar a assinatura rápida para as próximas execuções
+    meta["arquivos"] = fingerprint["arquivos"]
+    gravar_metadados(cache_dir, meta)
+    return True, meta
+
+
+# Função para carregar o DataFrame consolidado do cache, opcionalmente apenas
+# algumas partições/linhas (filtros) e colunas. Sem filtros, abre o arquivo
+# Arrow compartilhado (somente leitura, sem cópia), publicando-o a partir do
+# Parquet se ainda não existir para a versão atual dos dados.
+# Retorna (df, null_info_before, null_info_after) ou None se o cache estiver desatualizado.
+
+
+def carregar_cache(file_paths, pipeline_version, cache_dir, filtros=None, colunas=None):
+    valido, meta = cache_valido(file_paths, pipeline_version, cache_dir)
+    if not valido:
+        return None
+
+    df = None
+    if filtros is None and colunas is None:
+        df = abrir_dataset(cache_dir, meta["chave"])
+        if df is None:
+            df = ler_dataset(os.path.join(cache_dir, cache_file))
+            try:
+                publicar_dataset(df, cache_dir, meta["chave"])
+                df = abrir_dataset(cache_dir, meta["chave"])
+            except OSError as e:
+                print(f"Não foi possível publicar o arquivo Arrow compartilhado: {e}")
+    if df is None:
+        df = ler_dataset(os.path.join(cache_dir, cache_file), filtros, colunas)
+    null_info_before = pd.Series(meta.get("null_info_before", {}), dtype="int64")
+    null_info_after = pd.Series(meta.get("null_info_after", {}), dtype="int64")
+    return df, null_info_before, null_info_after
+
+
+# Função para salvar o DataFrame consolidado no cache (Parquet preserva os dtypes).
+# O DataFrame deve estar na ordem das partições (dataset.ordenar_por_particao).
+
+
+def salvar_cache(df, null_info_before, null_info_after, fingerprint, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    output_path = salvar_dataset(df, os.path.join(cache_dir, cache_file))
+    registrar_metadados(
+        len(df), null_info_before, null_info_after, fingerprint, cache_dir
+    )
+    return output_path
+
+
+# Função para gravar os metadados do cache (fingerprint dos arquivos de entrada,
+# calculado antes da leitura, número de linhas e valores nulos) depois que o
+# dataset foi gravado
+
+
+def registrar_metadados(
+    linhas, null_info_before, null_info_after, fingerprint, cache_dir
+):
+    meta = dict(fingerprint)
+    meta["linhas"] = int(linhas)
+    meta["null_info_before"] = {k: int(v) for k, v in null_info_before.items()}
+    meta["null_info_after"] = {k: int(v) for k, v in null_info_after.items()}
+    gravar_metadados(cache_dir, meta)
+    return meta
@@ -0,0 +1,270 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from moments import agregar_momentos, medidas_momentos, variaveis_correlacao
+from schema import nomes_meses
+from spatial import colunas_celula, colunas_espaciais, nome_grade, resolucoes_grade
+
+# Dimensões usadas nos filtros do app ('mes' acompanha 'nome_mes' para ordenação)
+dimensoes_filtro = ["ano", "mes", "nome_mes", "uf", "tipo_acidente"]
+
+# Cuboides pré-agregados: nome -> dimensões dos gráficos (além das de filtro)
+cuboides = {
+    "total": [],
+    "causa_acidente": ["causa_acidente"],
+    "condicao_metereologica": ["condicao_metereologica"],
+    "municipio": ["municipio"],
+    "dia_periodo": ["dia_semana", "periodo_dia"],
+    "feriado": ["feriado"],
+    "dia": ["data_inversa"],
+}
+
+# Grade do mapa em várias resoluções (células de latitude/longitude)
+for resolucao in resolucoes_grade:
+    cuboides[nome_grade(resolucao)] = list(colunas_celula(resolucao))
+
+# Cuboides do mapa, que guardam também as medidas espaciais
+cuboides_espaciais = ["municipio"] + [nome_grade(r) for r in resolucoes_grade]
+
+# Cuboide com as estatísticas suficientes da matriz de correlação
+cuboide_momentos = "momentos"
+
+# Dimensões de filtro dos cuboides que não guardam todas as de dimensoes_filtro.
+# Cruzadas com mês e tipo de acidente, as células da grade e do mapa de calor
+# ficariam quase uma por acidente, e as 41 somas dos momentos ocupariam mais que
+# os próprios dados; com mês ou tipo filtrados, eles são agregados a partir das
+# linhas filtradas (consultar_linhas). O cuboide por dia não precisa de ano e
+# mês, obtidos da própria data (filtros_data). Os cuboides dos insights
+# pré-calculados (insights.py) mantêm todas as dimensões de filtro.
+filtros_cuboides = {
+    **{nome_grade(r): ["ano", "uf"] for r in resolucoes_grade},
+    "dia_periodo": ["ano", "uf"],
+    "dia": ["uf", "tipo_acidente"],
+    cuboide_momentos: ["ano", "uf"],
+}
+
+# Filtros respondidos pela data nos cuboides que têm 'data_inversa'
+filtros_data = ["ano", "mes", "nome_mes"]
+
+# Medidas de cada célula. Após a deduplicação por 'id', cada acidente pertence a
+# uma única célula, então 'ids_distintos' pode ser somado entre células.
+medidas = ["acidentes", "ids_distintos", "mortos"]
+
+# Medidas espaciais: acidentes com coordenada válida e soma das coordenadas,
+# para posicionar cada ponto do mapa no centroide real dos seus acidentes
+medidas_espaciais = ["com_coordenadas", "soma_latitude", "soma_longitude"]
+
+# Subdiretório do cache onde o cubo é gravado
+cubo_dir = "cubo"
+chave_file = "_chave"
+
+# Versão do cubo, gravada junto à chave: incrementar quando os cuboides mudarem,
+# para reconstruir o cubo sem invalidar o cache consolidado
+versao_cubo = "3"
+
+
+# Função para agregar um cuboide a partir do DataFrame consolidado
+
+
+def agregar_cuboide(df, dimensoes, espacial=False):
+    dimensoes = [coluna for coluna in dimensoes if coluna in df.columns]
+    agrupado = df.groupby(dimensoes, observed=True)
+    colunas = {
+        "acidentes": agrupado.size().astype("int32"),
+        "ids_distintos": agrupado["id"].nunique().astype("int32"),
+        "mortos": agrupado["mortos"].sum().astype("int32"),
+    }
+    if espacial:
+        colunas["com_coordenadas"] = agrupado["com_coordenadas"].sum().astype("int32")
+        colunas["soma_latitude"] = agrupado["latitude_valida"].sum()
+        colunas["soma_longitude"] = agrupado["longitude_valida"].sum()
+    return pd.DataFrame(colunas).reset_index()
+
+
+# Função para obter as dimensões de um cuboide (as de filtro e as dos gráficos)
+
+
+def dimensoes_cuboide(nome):
+    return filtros_cuboides.get(nome, dimensoes_filtro) + cuboides.get(nome, [])
+
+
+# Função para construir todos os cuboides do cubo
+
+
+def construir_cubo(df):
+    # Apenas as colunas usadas pelo cubo, mais as colunas espaciais derivadas
+    usadas = dimensoes_filtro + ["id", "mortos", "latitude", "longitude"]
+    for dimensoes in cuboides.values():
+        usadas += [coluna for coluna in dimensoes if coluna not in usadas]
+    usadas += [coluna for coluna in variaveis_correlacao if coluna not in usadas]
+    df = df[[coluna for coluna in usadas if coluna in df.columns]]
+    if "latitude" in df.columns and "longitude" in df.columns:
+        df = pd.concat([df, colunas_espaciais(df)], axis=1)
+
+    cubo = {
+        nome: agregar_cuboide(
+            df,
+            dimensoes_cuboide(nome),
+            espacial=nome in cuboides_espaciais and "com_coordenadas" in df.columns,
+        )
+        for nome in cuboides
+    }
+    cubo[cuboide_momentos] = agregar_momentos(
+        df,
+        [coluna for coluna in dimensoes_cuboide(cuboide_momentos) if coluna in df],
+    )
+    return cubo
+
+
+# Função para obter a máscara de um filtro em um cuboide. Nos cuboides sem a
+# coluna do filtro, ano e mês são obtidos da data com numpy (o acessor .dt é
+# bem mais lento): o ano pelo intervalo de datas e o mês pelos meses desde 1970.
+
+
+def mascara_filtro(tabela, coluna, valor):
+    if coluna in tabela:
+        return (tabela[coluna] == valor).to_numpy()
+    datas = tabela["data_inversa"].to_numpy()
+    if coluna == "ano":
+        inicio = np.datetime64(f"{int(valor)}-01-01")
+        return (datas >= inicio) & (datas < np.datetime64(f"{int(valor) + 1}-01-01"))
+    if coluna == "nome_mes":
+        valor = nomes_meses.index(valor) + 1
+    meses = datas.astype("datetime64[M]").astype("int64")
+    return meses % 12 == int(valor) - 1
+
+
+# Função para concatenar partes de um cuboide. Partes vazias são descartadas, e
+# as colunas categóricas recebem a união das categorias de todas as partes (na
+# ordem em que aparecem), para não virarem 'object' no pd.concat.
+
+
+def concatenar_partes(partes):
+    nao_vazias = [parte for parte in partes if not parte.empty]
+    if len(nao_vazias) <= 1:
+        return (nao_vazias or partes)[0].reset_index(drop=True)
+
+    tipos = {}
+    for coluna, tipo in nao_vazias[0].dtypes.items():
+        if isinstance(tipo, pd.CategoricalDtype):
+            categorias = tipo.categories
+            for parte in nao_vazias[1:]:
+                categorias = categorias.union(
+                    parte[coluna].astype("category").cat.categories, sort=False
+                )
+            tipos[coluna] = pd.CategoricalDtype(categorias, ordered=tipo.ordered)
+    return pd.concat([parte.astype(tipos) for parte in nao_vazias], ignore_index=True)
+
+
+# Função para substituir as células de alguns anos por um cubo construído só com
+# os dados desses anos (ex.: na carga incremental). Como todos os cuboides têm o
+# ano (ou a data), as células dos demais anos continuam válidas.
+
+
+def substituir_anos(cubo, cubo_novo, anos):
+    resultado = {}
+    for nome, tabela in cubo.items():
+        dos_anos = np.zeros(len(tabela), dtype=bool)
+        for ano in anos:
+            dos_anos |= mascara_filtro(tabela, "ano", ano)
+        resultado[nome] = concatenar_partes([tabela[~dos_anos], cubo_novo[nome]])
+    return resultado
+
+
+# Função para consultar um cuboide: aplica os filtros ("Todos" ou None ignoram o
+# filtro) e soma as medidas pelas dimensões pedidas (sem dimensões, retorna os
+# totais como Series). Os filtros obtidos da data são aplicados por último, só
+# às células que restaram dos demais.
+
+
+def consultar(cubo, nome, filtros, dimensoes=()):
+    tabela = cubo[nome]
+    ativos = {
+        coluna: valor
+        for coluna, valor in filtros.items()
+        if valor is not None and valor != "Todos"
+    }
+    for da_data in (False, True):
+        mascara = np.ones(len(tabela), dtype=bool)
+        for coluna, valor in ativos.items():
+            if (coluna not in tabela) == da_data:
+                mascara &= mascara_filtro(tabela, coluna, valor)
+        tabela = tabela[mascara]
+
+    colunas = [
+        coluna
+        for coluna in medidas + medidas_espaciais + medidas_momentos
+        if coluna in tabela
+    ]
+    if not dimensoes:
+        return tabela[colunas].sum()
+    return tabela.groupby(list(dimensoes), observed=True)[colunas].sum().reset_index()
+
+
+# Função para verificar se um cuboide guarda as dimensões de todos os filtros
+# ativos (e pode, portanto, responder à consulta)
+
+
+def cobre_filtros(nome, filtros):
+    dimensoes = dimensoes_cuboide(nome)
+    if "data_inversa" in dimensoes:
+        dimensoes = dimensoes + filtros_data
+    return all(
+        coluna in dimensoes
+        for coluna, valor in filtros.items()
+        if valor is not None and valor != "Todos"
+    )
+
+
+# Função para agregar linhas já filtradas como o cuboide 'nome' e somar as
+# medidas pelas dimensões pedidas (mesmo resultado de consultar)
+
+
+def consultar_linhas(linhas, nome, dimensoes=()):
+    if nome == cuboide_momentos:
+        tabela = agregar_momentos(linhas, dimensoes_cuboide(nome))
+        return consultar({nome: tabela}, nome, {}, dimensoes)
+
+    espacial = nome in cuboides_espaciais
+    if espacial:
+        linhas = pd.concat([linhas, colunas_espaciais(linhas)], axis=1)
+    tabela = agregar_cuboide(linhas, dimensoes_cuboide(nome), espacial=espacial)
+    return consultar({nome: tabela}, nome, {}, dimensoes)
+
+
+# Função para gravar o cubo em Parquet, junto com a chave do cache que o gerou
+
+
+def salvar_cubo(cubo, cache_dir, chave):
+    diretorio = os.path.join(cache_dir, cubo_dir)
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio)
+    for nome, tabela in cubo.items():
+        tabela.to_parquet(os.path.join(diretorio, f"{nome}.parquet"), index=False)
+    with open(os.path.join(diretorio, chave_file), "w", encoding="utf-8") as f:
+        f.write(f"{chave}:{versao_cubo}")
+    return diretorio
+
+
+# Função para carregar o cubo (None se não existir ou for de outra versão do cache)
+
+
+def carregar_cubo(cache_dir, chave):
+    diretorio = os.path.join(cache_dir, cubo_dir)
+    caminho_chave = os.path.join(diretorio, chave_file)
+    if not os.path.exists(caminho_chave):
+        return None
+    with open(caminho_chave, encoding="utf-8") as f:
+        if f.read() != f"{chave}:{versao_cubo}":
+            return None
+
+    cubo = {}
+    for nome in list(cuboides) + [cuboide_momentos]:
+        caminho = os.path.join(diretorio, f"{nome}.parquet")
+        if not os.path.exists(caminho):
+            return None
+        cubo[nome] = pd.read_parquet(caminho)
+    return cubo
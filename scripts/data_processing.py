@@ -1,43 +1,158 @@
 import pandas as pd
+import numpy as np
 import os
+import time
 import holidays
-import locale
+from cache import (
+    assinatura_arquivos,
+    calcular_fingerprint,
+    carregar_cache,
+    ler_metadados,
+    salvar_cache,
+)
+from cube import carregar_cubo, construir_cubo, salvar_cubo
+from dataset import ordenar_por_particao
+from dedup import remover_duplicatas, salvar_chaves_vistas
+from imputation import (
+    colunas_imputaveis,
+    estatisticas_contagens,
+    imputar,
+    perfilar_colunas,
+    salvar_estatisticas,
+    somar_contagens,
+)
+from ingestion import descobrir_arquivos, ler_arquivos
+from instrumentation import (
+    definir_arquivo_log,
+    descartar_medicoes_abertas,
+    finalizar_medicao,
+    imprimir_resumo,
+    iniciar_medicao,
+    log_file,
+)
+from manifest import (
+    chaves_por_arquivo,
+    contagens_por_arquivo,
+    gravar_manifesto,
+    novo_manifesto,
+    nulos_por_arquivo,
+    nulos_restantes,
+    origem_linhas,
+    registrar_arquivos,
+    registrar_processamento,
+    resumo_por_arquivo,
+    salvar_chaves_arquivos,
+    salvar_contagens_arquivos,
+)
+from schema import compactar_dataframe, dias_da_semana_ordem, nomes_meses
+from shared_dataset import abrir_dataset, publicar_dataset
+from spatial_index import (
+    carregar_indice_espacial,
+    construir_indice_espacial,
+    salvar_indice_espacial,
+)
+
+# Diretório dos arquivos anuais (YYYY.csv); pode ser alterado pela variável PRF_DATA_PATH
+data_path = os.environ.get(
+    "PRF_DATA_PATH", "/home/hub/Documents/analise_acidentes_de_transito/data"
+)
+cache_path = os.path.join(data_path, "cache")
+
+# Número de processos usados na leitura dos arquivos (None = um por CPU)
+max_workers = None
+
+# Backend das consultas agregadas do app: "pandas" (cubo em memória) ou "duckdb"
+# (SQL sobre o dataset Parquet; requer o pacote duckdb). Pode ser alterado pela
+# variável PRF_BACKEND_CONSULTAS.
+backend_consultas = os.environ.get("PRF_BACKEND_CONSULTAS", "pandas")
+
+# Versão do pipeline: incrementar sempre que a lógica de consolidação mudar,
+# para invalidar o cache gerado por versões anteriores
+PIPELINE_VERSION = "10"
+
+# Colunas que nunca são imputadas: registros sem 'id' são descartados na
+# validação, e a localização (rodovia, km e coordenadas) fica nula quando não foi
+# informada. A mediana poria esses acidentes em um trecho e em um ponto do mapa
+# que não são os deles; sem coordenadas, eles ficam fora do mapa
+# (spatial.coordenadas_validas) e, sem rodovia ou km, fora dos trechos.
+colunas_sem_imputacao = ["id", "br", "km", "latitude", "longitude"]
+
+# Tabelas fixas usadas na engenharia de atributos
+periodos_dia_ordem = ["Madrugada", "Manhã", "Tarde", "Noite"]
+
+# Período do dia para cada hora (0-23); a posição 24 representa horário inválido
+periodo_por_hora = np.array(
+    [0] * 6 + [1] * 6 + [2] * 6 + [3] * 6 + [-1], dtype="int8"
+)
+
+
+# Função para notificar o progresso de uma etapa (fração entre 0 e 1)
+
+
+def notificar_progresso(progress_callback, etapa, fracao):
+    if progress_callback is not None:
+        progress_callback(etapa, fracao)
+
+
+# Função para listar os caminhos dos arquivos de entrada
+
+
+def arquivos_entrada():
+    if not os.path.exists(data_path):
+        return []
+    return [file_path for _, file_path in descobrir_arquivos(data_path)]
+
+
+# Função para obter uma assinatura leve dos arquivos de entrada (caminho, tamanho
+# e mtime), usada pelo app para invalidar o cache quando os dados mudam
+
+
+def assinatura_dados():
+    return tuple(
+        (a["path"], a["size"], a["mtime_ns"])
+        for a in assinatura_arquivos(arquivos_entrada())
+    )
+
+
+# Função para obter o cubo de agregados gravado com o cache; se não existir (ou
+# for de outra versão dos dados), é construído a partir do DataFrame informado
 
-data_path = "/home/hub/Documents/analise_acidentes_de_transito/data"
-files_2021_2023 = ["2021.csv", "2023.csv"]
-files_2022_2024 = ["2022.csv", "2024.csv"]
 
-# Função para carregar e concatenar arquivos CSV com diferentes codificações
+def obter_cubo(df=None):
+    meta = ler_metadados(cache_path)
+    chave = meta["chave"] if meta else None
+    cubo = carregar_cubo(cache_path, chave) if chave else None
+    if cubo is None and df is not None:
+        cubo = construir_cubo(df)
+        if chave:
+            salvar_cubo(cubo, cache_path, chave)
+    return cubo
 
 
-def load_and_concat_files(file_list, sep, data_path):
-    dataframes = []
+# Função para ler os arquivos CSV existentes; encoding e separador de cada
+# arquivo são detectados automaticamente e os arquivos são lidos em paralelo.
+# Retorna os caminhos lidos e um DataFrame por arquivo (vazio se a leitura falhar).
 
-    # Define um dicionário de codificação para os arquivos específicos
-    encoding_dict = {
-        "2021": "latin1",
-        "2023": "latin1",
-        "2022": "utf-8",
-        "2024": "utf-8",
-    }
 
+def ler_arquivos_existentes(file_list, data_path, progress_callback=None):
+    file_paths = []
     for file in file_list:
         file_path = os.path.join(data_path, file)
         if os.path.exists(file_path):
-            try:
-                # Obtém o encoding com base no nome do arquivo
-                year = file.split(".")[0]
-                encoding = encoding_dict.get(year, "utf-8")
-
-                df = pd.read_csv(
-                    file_path, encoding=encoding, sep=sep, on_bad_lines="skip"
-                )
-                dataframes.append(df)
-            except Exception as e:
-                print(f"Erro ao ler o arquivo {file}: {e}")
+            file_paths.append(file_path)
         else:
             print(f"Arquivo {file} não encontrado em {data_path}.")
 
+    return file_paths, ler_arquivos(
+        file_paths, max_workers=max_workers, progress_callback=progress_callback
+    )
+
+
+# Função para concatenar os DataFrames lidos de cada arquivo
+
+
+def concatenar_arquivos(dataframes):
+    dataframes = [df for df in dataframes if not df.empty]
     return (
         pd.concat(dataframes, axis=0, ignore_index=True)
         if dataframes
@@ -45,48 +160,124 @@ def load_and_concat_files(file_list, sep, data_path):
     )
 
 
+# Função para obter o índice espacial gravado com o cache; se não existir (ou
+# for de outra versão dos dados), é construído a partir do DataFrame informado.
+# As posições do índice se referem às linhas do DataFrame consolidado.
+
+
+def obter_indice_espacial(df):
+    meta = ler_metadados(cache_path)
+    chave = meta["chave"] if meta else None
+    indice = carregar_indice_espacial(cache_path, chave) if chave else None
+    if indice is None or indice["linhas"] != len(df):
+        indice = construir_indice_espacial(df)
+        if chave:
+            salvar_indice_espacial(cache_path, indice, chave)
+    return indice
+
+
+# Função para calcular as estatísticas de imputação a partir das contagens de
+# valores de cada arquivo de origem. Somadas às contagens guardadas de outros
+# arquivos ("outras"), dão as mesmas medianas e modas de uma consolidação
+# completa. Retorna as estatísticas e as contagens de cada arquivo.
+
+
+def estatisticas_arquivos(df, origem, nomes, outras=()):
+    numericas, categoricas = colunas_imputaveis(df, colunas_sem_imputacao)
+    contagens = contagens_por_arquivo(df, origem, nomes, numericas + categoricas)
+    estatisticas = estatisticas_contagens(
+        somar_contagens([*contagens.values(), *outras]), df.isnull().sum(), len(df)
+    )
+    return estatisticas, contagens
+
+
+# Função para carregar e concatenar arquivos CSV
+
+
+def load_and_concat_files(file_list, data_path, progress_callback=None):
+    _, dataframes = ler_arquivos_existentes(file_list, data_path, progress_callback)
+    return concatenar_arquivos(dataframes)
+
+
 # Função para consolidar os dados
 
 
-def consolidate_data():
+def consolidate_data(use_cache=True, progress_callback=None):
+    # Medições das etapas (tempo, linhas e memória), gravadas no log junto ao cache
+    definir_arquivo_log(os.path.join(cache_path, log_file))
+    execucao = time.strftime("%Y%m%dT%H%M%S")
+    medicoes = []
+
+    def etapa(nome, linhas_entrada=None):
+        return iniciar_medicao(nome, linhas_entrada=linhas_entrada, execucao=execucao)
+
+    def concluir_etapa(medicao, linhas_saida=None):
+        medicoes.append(finalizar_medicao(medicao, linhas_saida))
+
     try:
         # Verifica se o diretório existe
         if not os.path.exists(data_path):
             raise FileNotFoundError(f"O diretório {data_path} não foi encontrado.")
 
-        # Verifica se os arquivos existem
-        missing_files = [
-            file
-            for file in files_2021_2023 + files_2022_2024
-            if not os.path.exists(os.path.join(data_path, file))
-        ]
-        if missing_files:
+        # Verifica se existem arquivos anuais (YYYY.csv) no diretório
+        file_paths = arquivos_entrada()
+        if not file_paths:
             raise FileNotFoundError(
-                f"Os arquivos estão faltando: {', '.join(missing_files)}"
+                f"Nenhum arquivo anual (YYYY.csv) encontrado em {data_path}."
             )
 
-        # Carregar e concatenar os dados
-        df_2021_2023 = load_and_concat_files(
-            files_2021_2023, sep=";", data_path=data_path
-        )
-        df_2022_2024 = load_and_concat_files(
-            files_2022_2024, sep=",", data_path=data_path
+        # Usar o cache se os arquivos de entrada e a versão do pipeline não mudaram
+        if use_cache:
+            notificar_progresso(progress_callback, "Verificando cache", 0.0)
+            medicao = etapa("carga_cache")
+            cached = carregar_cache(file_paths, PIPELINE_VERSION, cache_path)
+            concluir_etapa(medicao, None if cached is None else len(cached[0]))
+            if cached is not None:
+                print("Dados consolidados carregados do cache:", cache_path)
+                notificar_progresso(progress_callback, "Dados carregados do cache", 1.0)
+                return cached
+
+        # Carregar e concatenar os dados de todos os anos em paralelo
+        def progresso_leitura(file_path, fracao):
+            ano = os.path.basename(file_path).split(".")[0]
+            notificar_progresso(
+                progress_callback, f"Dados de {ano} lidos", 0.5 * fracao
+            )
+
+        inicio = time.perf_counter()
+        notificar_progresso(progress_callback, "Lendo arquivos anuais", 0.0)
+        medicao = etapa("leitura")
+        # Fingerprint dos arquivos antes da leitura (gravado com o cache)
+        fingerprint = calcular_fingerprint(file_paths, PIPELINE_VERSION)
+        lidos, dataframes = ler_arquivos_existentes(
+            [os.path.basename(path) for path in file_paths],
+            data_path=data_path,
+            progress_callback=progresso_leitura,
         )
 
-        if df_2021_2023.empty and df_2022_2024.empty:
+        # Arquivo de origem de cada linha, para o manifesto da carga incremental
+        nomes = [os.path.basename(path) for path in lidos]
+        origem = origem_linhas(dataframes)
+        linhas_lidas = {nome: len(df) for nome, df in zip(nomes, dataframes)}
+        concluir_etapa(medicao, sum(linhas_lidas.values()))
+        medicao = etapa("concatenacao", sum(linhas_lidas.values()))
+        df_completo = concatenar_arquivos(dataframes)
+        del dataframes
+        concluir_etapa(medicao, len(df_completo))
+
+        if df_completo.empty:
             raise ValueError("Nenhum dado foi carregado. Verifique os arquivos.")
 
-        # Juntar todos os dados
-        df_completo = pd.concat([df_2021_2023, df_2022_2024], axis=0, ignore_index=True)
-
         # Verificar e converter a coluna de data
         if "data_inversa" in df_completo.columns:
             print("Tentando converter 'data_inversa' para datetime...")
 
-            # Datas convertidas para o formato datetime YYYY-MM-DD
-            df_completo["data_inversa"] = pd.to_datetime(
-                df_completo["data_inversa"], errors="coerce"
-            )
+            # Datas convertidas para o formato datetime YYYY-MM-DD (a ingestão
+            # normalmente já entrega a coluna convertida)
+            if not pd.api.types.is_datetime64_any_dtype(df_completo["data_inversa"]):
+                df_completo["data_inversa"] = pd.to_datetime(
+                    df_completo["data_inversa"], errors="coerce"
+                )
 
             # Verificar se há valores nat após conversao
             if df_completo["data_inversa"].isnull().sum() > 0:
@@ -101,186 +292,331 @@ def consolidate_data():
         else:
             print("Coluna 'data_inversa' não encontrada para extrair o ano.")
 
-        # Tratar valores nulos e obter informações sobre nulos
-        null_info_before, null_info_after = tratar_valores_nulos(df_completo)
+        nulos_arquivos = nulos_por_arquivo(df_completo, origem, nomes)
 
-        # Remover duplicatas
-        df_completo = df_completo.drop_duplicates()
-        print(f"Removidas {df_completo.duplicated().sum()} duplicatas.")
+        # Tratar valores nulos e obter informações sobre nulos; as estatísticas
+        # e as contagens de valores de cada arquivo (usadas para recalculá-las
+        # na carga incremental) são guardadas junto ao cache
+        notificar_progresso(progress_callback, "Tratando valores nulos", 0.5)
+        medicao = etapa("imputacao", len(df_completo))
+        estatisticas, contagens_arquivos = estatisticas_arquivos(
+            df_completo, origem, nomes
+        )
+        null_info_before, null_info_after = imputar(
+            df_completo, estatisticas, estatisticas["nulos"]
+        )
+        concluir_etapa(medicao, len(df_completo))
+
+        # Remover duplicatas pelo 'id' do acidente e guardar as chaves vistas
+        # para deduplicar dados novos sem reprocessar os existentes
+        notificar_progresso(progress_callback, "Removendo duplicatas", 0.6)
+        medicao = etapa("deduplicacao", len(df_completo))
+        df_completo, relatorio_dedup, chaves_vistas = remover_duplicatas(df_completo)
+        concluir_etapa(medicao, len(df_completo))
+        print(
+            f"Removidas {relatorio_dedup['removidas']} duplicatas "
+            f"({relatorio_dedup['conflitantes']} com conteúdo conflitante)."
+        )
+
+        chaves_arquivos = chaves_por_arquivo(
+            df_completo["id"], origem[df_completo.index], nomes, chaves_vistas
+        )
 
         # Identificar/remover registros incoerentes
+        notificar_progresso(progress_callback, "Validando registros", 0.7)
         print("Removendo dados incoerentes.")
+        medicao = etapa("validacao", len(df_completo))
         df_completo = remover_registros_incoerentes(df_completo)
+        concluir_etapa(medicao, len(df_completo))
         print("Dados incoerentes removidos.")
 
         # Adicionar informações adicionais - Engenharia de Atributos
+        notificar_progresso(progress_callback, "Adicionando informações", 0.8)
         print("Adicionando informacoes.")
+        medicao = etapa("enriquecimento", len(df_completo))
         df_completo = adicionar_informacoes(df_completo)
+        concluir_etapa(medicao, len(df_completo))
         print("Informacoes adicionadas com sucesso.")
 
-        # Salvar o DataFrame consolidado
-        output_path = os.path.join(data_path, "dados_consolidados.csv")
-        df_completo.to_csv(output_path, index=False, encoding="utf-8")
-        print("Dados consolidados salvos em:", output_path)
+        # Aplicar o esquema compacto (categorias, inteiros pequenos, float32, bool)
+        medicao = etapa("compactacao", len(df_completo))
+        df_completo, relatorio = compactar_dataframe(df_completo)
+        concluir_etapa(medicao, len(df_completo))
+        print(
+            f"Memória: {relatorio['bytes_antes'].sum() / 1e6:.1f} MB -> "
+            f"{relatorio['bytes_depois'].sum() / 1e6:.1f} MB."
+        )
+
+        resumo_arquivos = resumo_por_arquivo(
+            df_completo["ano"], origem[df_completo.index], nomes
+        )
 
+        # Salvar o DataFrame consolidado no cache, particionado por ano e UF
+        notificar_progresso(progress_callback, "Salvando cache", 0.9)
+        medicao = etapa("gravacao", len(df_completo))
+        df_completo = ordenar_por_particao(df_completo)
+        output_path = salvar_cache(
+            df_completo,
+            null_info_before,
+            null_info_after,
+            fingerprint,
+            cache_path,
+        )
+        salvar_chaves_vistas(cache_path, chaves_vistas)
+        salvar_estatisticas(cache_path, estatisticas)
+        concluir_etapa(medicao, len(df_completo))
+
+        # Publicar o DataFrame como arquivo Arrow, aberto sem cópia pelas sessões
+        # do app e por outros processos
+        meta = ler_metadados(cache_path)
+        medicao = etapa("publicacao", len(df_completo))
+        publicar_dataset(df_completo, cache_path, meta["chave"])
+        concluir_etapa(medicao, len(df_completo))
+
+        # Pré-agregar o cubo usado pelos gráficos do app
+        notificar_progresso(progress_callback, "Construindo cubo de agregados", 0.95)
+        medicao = etapa("cubo", len(df_completo))
+        cubo = construir_cubo(df_completo)
+        salvar_cubo(cubo, cache_path, meta["chave"])
+        concluir_etapa(medicao, sum(len(tabela) for tabela in cubo.values()))
+        del cubo
+
+        # Registrar o que foi processado de cada arquivo (carga incremental)
+        manifesto = registrar_arquivos(
+            novo_manifesto(PIPELINE_VERSION),
+            meta["arquivos"],
+            linhas_lidas,
+            nulos_arquivos,
+            nulos_restantes(nulos_arquivos, null_info_after),
+            resumo_arquivos,
+        )
+        registrar_processamento(
+            manifesto,
+            "completo",
+            nomes,
+            df_completo["ano"].unique(),
+            time.perf_counter() - inicio,
+        )
+        gravar_manifesto(cache_path, manifesto)
+        salvar_chaves_arquivos(cache_path, chaves_arquivos)
+        salvar_contagens_arquivos(cache_path, contagens_arquivos)
+        print("Dados consolidados salvos em:", output_path)
+        imprimir_resumo(medicoes)
+        notificar_progresso(progress_callback, "Dados consolidados", 1.0)
+
+        # Retornar a versão mapeada do arquivo publicado, liberando a cópia
+        # privada do processo
+        compartilhado = abrir_dataset(cache_path, meta["chave"])
+        if compartilhado is not None:
+            df_completo = compartilhado
         return df_completo, null_info_before, null_info_after
 
     except Exception as e:
+        descartar_medicoes_abertas()
         print(f"Erro ao consolidar os dados: {e}")
         return None, None, None
 
 
-# Função para tratar valores nulos no DataFrame: numéricos com a mediana e categóricos com a moda
+# Função para carregar apenas parte dos dados consolidados: os filtros (ex.:
+# {"ano": 2023, "uf": ["SP", "RJ"]}) selecionam as partições lidas do disco e
+# "colunas" limita as colunas lidas. Consolida os dados antes, se necessário.
 
 
-def tratar_valores_nulos(df):
-    # Armazenar número de valores nulos antes do tratamento
-    null_info_before = df.isnull().sum()
-
-    # Substitui valores nulos de numéricos pela mediana
-    for coluna in df.select_dtypes(include=["float64", "int64"]).columns:
-        if df[coluna].isnull().sum() > 0:
-            df[coluna] = df[coluna].fillna(df[coluna].median())  # mediana
-            print(
-                f"Valores nulos na coluna {
-                  coluna} foram substituídos pela mediana."
-            )
-
-    # Substitui valores nulos categórias pela moda
-    for coluna in df.select_dtypes(include=["object"]).columns:
-        if df[coluna].isnull().sum() > 0:
-            df[coluna] = df[coluna].fillna(df[coluna].mode()[0])  # moda
-            print(
-                f"Valores nulos na coluna {
-                  coluna} foram substituídos pela moda."
-            )
-
-    # Armazenar número de valores nulos após tratamento
-    null_info_after = df.isnull().sum()
-
-    return null_info_before, null_info_after
+def carregar_consolidado(filtros=None, colunas=None):
+    file_paths = arquivos_entrada()
+    cached = carregar_cache(file_paths, PIPELINE_VERSION, cache_path, filtros, colunas)
+    if cached is None:
+        if consolidate_data()[0] is None:
+            return None
+        cached = carregar_cache(
+            file_paths, PIPELINE_VERSION, cache_path, filtros, colunas
+        )
+    return cached[0]
+
+
+# Função para tratar valores nulos no DataFrame: numéricos com a mediana e categóricos com a moda.
+# Sem estatísticas, perfila o DataFrame em uma única passada; com estatísticas
+# persistidas (ex.: carga incremental), apenas conta os nulos e preenche.
+
+
+def tratar_valores_nulos(df, estatisticas=None, agrupar_por=None):
+    if estatisticas is None:
+        estatisticas = perfilar_colunas(df, colunas_sem_imputacao)
+        nulos = estatisticas["nulos"]
+    else:
+        nulos = df.isnull().sum()
+
+    return imputar(df, estatisticas, nulos, agrupar_por)
+
+
+# Siglas de estado válidas no Brasil
+valid_ufs = [
+    "AC",
+    "AL",
+    "AP",
+    "AM",
+    "BA",
+    "CE",
+    "DF",
+    "ES",
+    "GO",
+    "MA",
+    "MT",
+    "MS",
+    "MG",
+    "PA",
+    "PB",
+    "PR",
+    "PE",
+    "PI",
+    "RJ",
+    "RN",
+    "RS",
+    "RO",
+    "RR",
+    "SC",
+    "SP",
+    "SE",
+    "TO",
+]
+
+# Campos numéricos que não podem ser negativos
+numeric_columns = [
+    "pessoas",
+    "mortos",
+    "feridos_leves",
+    "feridos_graves",
+    "ilesos",
+    "ignorados",
+    "feridos",
+    "veiculos",
+]
+
+# Registro das regras de validação: nome -> (colunas necessárias, função que
+# recebe o DataFrame e devolve a máscara dos registros válidos). Regras cujas
+# colunas não existem no DataFrame são ignoradas.
+regras_validacao = {}
+
+
+# Função para registrar uma regra de validação
+
+
+def registrar_regra(nome, colunas, funcao):
+    regras_validacao[nome] = (colunas, funcao)
+
+
+registrar_regra(
+    "data_inversa_nula", ["data_inversa"], lambda df: df["data_inversa"].notnull()
+)
+registrar_regra("id_nulo", ["id"], lambda df: df["id"].notnull())
+registrar_regra("uf_invalida", ["uf"], lambda df: df["uf"].isin(valid_ufs))
+registrar_regra(
+    "km_invalido", ["km"], lambda df: df["km"].isnull() | (df["km"] >= 0)
+)
+for coluna in numeric_columns:
+    registrar_regra(
+        f"{coluna}_negativo", [coluna], lambda df, coluna=coluna: df[coluna] >= 0
+    )
+registrar_regra(
+    "mortos_maior_que_pessoas",
+    ["mortos", "pessoas"],
+    lambda df: df["mortos"] <= df["pessoas"],
+)
+registrar_regra(
+    "feridos_maior_que_pessoas",
+    ["feridos", "pessoas"],
+    lambda df: df["feridos"] <= df["pessoas"],
+)
+registrar_regra(
+    "feridos_diferente_da_soma",
+    ["feridos", "feridos_leves", "feridos_graves"],
+    lambda df: df["feridos"] == df["feridos_leves"] + df["feridos_graves"],
+)
+
+
+# Função para avaliar todas as regras registradas em uma única máscara.
+# Retorna a máscara dos registros válidos e o número de registros rejeitados
+# por regra (um registro pode ser rejeitado por mais de uma regra).
+
+
+def avaliar_regras(df):
+    mascara = np.ones(len(df), dtype=bool)
+    rejeicoes = {}
+    for nome, (colunas, funcao) in regras_validacao.items():
+        if not all(coluna in df.columns for coluna in colunas):
+            continue
+        # Comparações com valores nulos resultam em False (registro inválido)
+        validos = np.asarray(funcao(df), dtype=bool)
+        rejeicoes[nome] = int(len(df) - validos.sum())
+        mascara &= validos
+    return mascara, pd.Series(rejeicoes, dtype="int64")
 
 
 # Função para remover registros incoerentes
 
 
 def remover_registros_incoerentes(df):
-    if "data_inversa" in df.columns:
-        df = df[df["data_inversa"].notnull()]
-
-    # Remover registros onde o id é nulo
-    if "id" in df.columns:
-        df = df[df["id"].notnull()]
-
-    # Validar 'uf' (deve ser uma sigla de estado válida no Brasil)
-    valid_ufs = [
-        "AC",
-        "AL",
-        "AP",
-        "AM",
-        "BA",
-        "CE",
-        "DF",
-        "ES",
-        "GO",
-        "MA",
-        "MT",
-        "MS",
-        "MG",
-        "PA",
-        "PB",
-        "PR",
-        "PE",
-        "PI",
-        "RJ",
-        "RN",
-        "RS",
-        "RO",
-        "RR",
-        "SC",
-        "SP",
-        "SE",
-        "TO",
-    ]
-    if "uf" in df.columns:
-        df = df[df["uf"].isin(valid_ufs)]
-
-    # Validar 'km' (deve ser maior ou igual a 0)
-    if "km" in df.columns:
-        df["km"] = pd.to_numeric(df["km"], errors="coerce")
-        df = df[df["km"].notna() & (df["km"] >= 0)]
-
-    # Validar campos numéricos (não podem ser negativos)
-    numeric_columns = [
-        "pessoas",
-        "mortos",
-        "feridos_leves",
-        "feridos_graves",
-        "ilesos",
-        "ignorados",
-        "feridos",
-        "veiculos",
-    ]
-    for col in numeric_columns:
-        if col in df.columns:
-            df = df[df[col] >= 0]
-
-    # Verificar consistência entre os campos numéricos
-    if "pessoas" in df.columns and "mortos" in df.columns:
-        df = df[df["mortos"] <= df["pessoas"]]
-
-    if "feridos" in df.columns and "pessoas" in df.columns:
-        df = df[df["feridos"] <= df["pessoas"]]
-
-    # Verificar se 'feridos' é igual à soma de 'feridos_leves' e 'feridos_graves'
-    if (
-        "feridos" in df.columns
-        and "feridos_leves" in df.columns
-        and "feridos_graves" in df.columns
-    ):
-        df = df[df["feridos"] == df["feridos_leves"] + df["feridos_graves"]]
+    # Validar 'km' como número (a ingestão normalmente já entrega a coluna numérica)
+    if "km" in df.columns and not pd.api.types.is_numeric_dtype(df["km"]):
+        df = df.assign(km=pd.to_numeric(df["km"], errors="coerce"))
 
-    return df
+    mascara, rejeicoes = avaliar_regras(df)
+    for nome, quantidade in rejeicoes[rejeicoes > 0].items():
+        print(f"Regra {nome}: {quantidade} registros rejeitados.")
+    print(f"Total de registros incoerentes removidos: {len(df) - mascara.sum()}.")
+
+    if mascara.all():
+        return df
+    return df[mascara]
 
 
 # Engenharia de Atributos
 def adicionar_informacoes(df):
-    import numpy as np
-
-    # Garantir que data_inversa está no formato datetime
+    # Garantir que data_inversa está no formato datetime (sem reconverter se a
+    # ingestão já fez a conversão)
     if "data_inversa" in df.columns:
-        df["data_inversa"] = pd.to_datetime(df["data_inversa"], errors="coerce")
-
-        # Configurar o locale apenas uma vez
-        locale.setlocale(locale.LC_TIME, "pt_BR.UTF-8")
-
-        # Criar novas colunas relacionadas a data
-        df["dia_semana"] = df["data_inversa"].dt.day_name()
-        df["mes"] = df["data_inversa"].dt.month
-        df["nome_mes"] = df["data_inversa"].dt.strftime("%B")
-        df["ano"] = df["data_inversa"].dt.year
+        if not pd.api.types.is_datetime64_any_dtype(df["data_inversa"]):
+            df["data_inversa"] = pd.to_datetime(df["data_inversa"], errors="coerce")
+        datas = df["data_inversa"].dt
+
+        # Criar novas colunas relacionadas a data a partir de tabelas fixas
+        # (independente do locale do sistema)
+        df["dia_semana"] = pd.Categorical.from_codes(
+            datas.dayofweek.fillna(-1).astype("int8"),
+            categories=dias_da_semana_ordem,
+            ordered=True,
+        )
+        df["mes"] = datas.month
+        df["nome_mes"] = pd.Categorical.from_codes(
+            (df["mes"].fillna(0) - 1).astype("int8"),
+            categories=nomes_meses,
+            ordered=True,
+        )
+        df["ano"] = datas.year
 
-        # Criar coluna de feriados
+        # Criar coluna de feriados comparando com as datas dos feriados do período
         anos = df["ano"].dropna().unique()
-        feriados = holidays.Brazil(years=anos)
-        df["feriado"] = df["data_inversa"].map(
-            lambda x: "Sim" if x in feriados else "Não"
-        )
+        feriados = pd.DatetimeIndex(list(holidays.Brazil(years=anos).keys()))
+        df["feriado"] = datas.normalize().isin(feriados)
 
     # Verificar se a coluna 'horario' existe e está no formato correto
     if "horario" in df.columns:
-        # Converter 'horario' para o formato datetime
-        df["hora"] = pd.to_datetime(
-            df["horario"], format="%H:%M:%S", errors="coerce"
+        # Converter 'horario' para o formato datetime. Há no máximo 86400
+        # horários distintos: cada valor único é convertido uma única vez
+        codigos, horarios = pd.factorize(df["horario"])
+        horas_unicas = pd.to_datetime(
+            pd.Series(horarios), format="%H:%M:%S", errors="coerce"
         ).dt.hour
+        hora = pd.Series(
+            np.append(horas_unicas.to_numpy(), np.nan)[codigos], index=df.index
+        )
 
-        # Classificar o horário em categorias
-        bins = [-1, 5, 11, 17, 23]
-        labels = ["Madrugada", "Manhã", "Tarde", "Noite"]
-        df["periodo_dia"] = pd.cut(df["hora"], bins=bins, labels=labels)
-
-        # Remover a coluna auxiliar 'hora'
-        df = df.drop(columns=["hora"])
+        # Classificar o horário em categorias com uma tabela hora -> período
+        df["periodo_dia"] = pd.Categorical.from_codes(
+            periodo_por_hora[hora.fillna(24).astype("int8").to_numpy()],
+            categories=periodos_dia_ordem,
+            ordered=True,
+        )
 
     # Criar categoria para pessoas envolvidas nos acidentes
     if "pessoas" in df.columns:
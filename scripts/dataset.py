@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from schema import schema_consolidado
+
+# Colunas de particionamento do dataset consolidado (diretórios ano=.../uf=...)
+particoes = ["ano", "uf"]
+
+
+# Função para ordenar o DataFrame na mesma ordem em que as partições são lidas,
+# para que os dados recém-consolidados e os lidos do disco sejam idênticos
+
+
+def ordenar_por_particao(df):
+    colunas = [coluna for coluna in particoes if coluna in df.columns]
+    return df.sort_values(colunas, kind="stable").reset_index(drop=True)
+
+
+# Função para obter o esquema Arrow das partições a partir do esquema compacto
+# (os valores das partições ficam nos nomes dos diretórios, não nos arquivos)
+
+
+def esquema_particoes():
+    campos = []
+    for coluna in particoes:
+        tipo = schema_consolidado[coluna]
+        if tipo == "category":
+            campos.append(pa.field(coluna, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            campos.append(pa.field(coluna, pa.from_numpy_dtype(np.dtype(tipo))))
+    return pa.schema(campos)
+
+
+# Função para gravar o DataFrame em um diretório novo, particionado no estilo
+# Hive (diretórios ano=.../uf=...)
+
+
+def gravar_particionado(df, destino):
+    shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(destino)
+    if len(df):
+        ds.write_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            destino,
+            format="parquet",
+            partitioning=ds.partitioning(esquema_particoes(), flavor="hive"),
+            basename_template="parte-{i}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+    return destino
+
+
+# Função para gravar o DataFrame como dataset Parquet particionado no estilo
+# Hive. Grava em um diretório temporário e troca o diretório inteiro ao final,
+# para que leitores nunca vejam um dataset pela metade.
+
+
+def salvar_dataset(df, diretorio):
+    tmp_dir = diretorio + ".tmp"
+    gravar_particionado(df, tmp_dir)
+
+    antigo_dir = diretorio + ".antigo"
+    shutil.rmtree(antigo_dir, ignore_errors=True)
+    if os.path.exists(diretorio):
+        os.replace(diretorio, antigo_dir)
+    os.replace(tmp_dir, diretorio)
+    shutil.rmtree(antigo_dir, ignore_errors=True)
+    return diretorio
+
+
+# Função para substituir apenas as partições de alguns anos do dataset (ex.: na
+# carga incremental). Todos os anos informados são removidos, mesmo os que não
+# têm mais linhas em "df"; os demais anos não são tocados.
+
+
+def substituir_particoes(df, diretorio, anos):
+    tmp_dir = diretorio + ".tmp"
+    gravar_particionado(df, tmp_dir)
+
+    for ano in sorted(anos):
+        particao = f"ano={ano}"
+        # Fora do dataset, para não ser lido como partição durante a troca
+        antigo_dir = f"{diretorio}.{particao}.antigo"
+        if os.path.exists(os.path.join(diretorio, particao)):
+            os.replace(os.path.join(diretorio, particao), antigo_dir)
+        if os.path.exists(os.path.join(tmp_dir, particao)):
+            os.replace(
+                os.path.join(tmp_dir, particao), os.path.join(diretorio, particao)
+            )
+        shutil.rmtree(antigo_dir, ignore_errors=True)
+
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return diretorio
+
+
+# Função para abrir o dataset particionado (sem ler os dados)
+
+
+def abrir_dataset_particionado(diretorio):
+    return ds.dataset(
+        diretorio,
+        format="parquet",
+        partitioning=ds.partitioning(
+            esquema_particoes(), flavor="hive", dictionaries="infer"
+        ),
+    )
+
+
+# Função para montar a expressão de filtro do Arrow. Cada filtro é um valor ou
+# uma lista de valores; "Todos" ou None ignoram o filtro.
+
+
+def expressao_filtros(filtros):
+    expressao = None
+    for coluna, valor in (filtros or {}).items():
+        if valor is None or valor == "Todos":
+            continue
+        if isinstance(valor, (list, tuple, set)):
+            condicao = ds.field(coluna).isin(list(valor))
+        else:
+            condicao = ds.field(coluna) == valor
+        expressao = condicao if expressao is None else expressao & condicao
+    return expressao
+
+
+# Função para ler o dataset particionado. Os filtros nas colunas de partição
+# descartam diretórios inteiros; nas demais colunas, usam as estatísticas dos
+# arquivos Parquet. Só as colunas pedidas são lidas do disco.
+
+
+def ler_dataset(diretorio, filtros=None, colunas=None):
+    dataset = abrir_dataset_particionado(diretorio)
+
+    # Ordem original das colunas (as de partição ficariam no fim), guardada nos
+    # metadados do pandas. Sem eles (ex.: dataset gravado por outra ferramenta),
+    # valem a ordem do esquema e os tipos do Arrow.
+    pandas_meta = (dataset.schema.metadata or {}).get(b"pandas")
+    if pandas_meta is None:
+        ordem = list(dataset.schema.names)
+    else:
+        ordem = [
+            c["name"]
+            for c in json.loads(pandas_meta)["columns"]
+            if c["name"] in dataset.schema.names
+        ]
+    if colunas is not None:
+        ordem = [coluna for coluna in ordem if coluna in colunas]
+
+    tabela = dataset.to_table(columns=ordem, filter=expressao_filtros(filtros))
+    return tabela.to_pandas()
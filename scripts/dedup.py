@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Arquivo com as chaves já vistas (gravado junto ao cache consolidado)
+chaves_file = "chaves_vistas.npz"
+
+
+# Função para normalizar uma coluna antes do hash: numéricos viram float64 para
+# que 1 (int64) e 1.0 (float64) gerem o mesmo hash em arquivos/blocos diferentes
+
+
+def normalizar_para_hash(serie):
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        return serie.astype("float64")
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.astype(object)
+    return serie
+
+
+# Função para calcular o hash (uint64) de cada linha a partir do conteúdo
+
+
+def hash_linhas(df):
+    normalizado = pd.DataFrame(
+        {coluna: normalizar_para_hash(df[coluna]) for coluna in df.columns}
+    )
+    return pd.util.hash_pandas_object(normalizado, index=False).to_numpy()
+
+
+# Função para calcular o hash (uint64) da chave de cada linha
+
+
+def hash_chaves(serie):
+    return pd.util.hash_pandas_object(
+        normalizar_para_hash(serie), index=False
+    ).to_numpy()
+
+
+# Função para criar um conjunto vazio de chaves vistas.
+# As chaves ficam ordenadas, com o hash do conteúdo de cada registro alinhado.
+
+
+def chaves_vazias():
+    return {
+        "chaves": np.empty(0, dtype=np.uint64),
+        "conteudos": np.empty(0, dtype=np.uint64),
+    }
+
+
+# Função para adicionar chaves novas (ainda não vistas) ao conjunto. Só as
+# chaves novas são ordenadas; depois são intercaladas nas já ordenadas, sem
+# reordenar o conjunto inteiro a cada bloco.
+
+
+def adicionar_chaves(vistos, chaves, conteudos):
+    ordem = np.argsort(chaves, kind="stable")
+    chaves, conteudos = chaves[ordem], conteudos[ordem]
+    posicoes = np.searchsorted(vistos["chaves"], chaves, side="right")
+    return {
+        "chaves": np.insert(vistos["chaves"], posicoes, chaves),
+        "conteudos": np.insert(vistos["conteudos"], posicoes, conteudos),
+    }
+
+
+# Função para localizar chaves no conjunto; retorna (encontradas, conteúdo guardado)
+
+
+def buscar_chaves(vistos, chaves):
+    if len(vistos["chaves"]) == 0:
+        return np.zeros(len(chaves), dtype=bool), np.zeros(len(chaves), np.uint64)
+    posicoes = np.searchsorted(vistos["chaves"], chaves)
+    posicoes = np.minimum(posicoes, len(vistos["chaves"]) - 1)
+    encontradas = vistos["chaves"][posicoes] == chaves
+    return encontradas, vistos["conteudos"][posicoes]
+
+
+# Função para remover duplicatas pela chave (por padrão o 'id' do acidente).
+# Um registro é duplicado se a chave já apareceu antes no DataFrame ou no
+# conjunto de chaves vistas (dados já ingeridos). Duplicados com conteúdo
+# diferente do primeiro registro são contados como conflitantes. Registros com
+# chave nula nunca são considerados duplicados.
+# Retorna (DataFrame sem duplicatas, relatório, conjunto de chaves atualizado).
+
+
+def remover_duplicatas(df, chave="id", vistos=None, verificar_conflitos=True):
+    if vistos is None:
+        vistos = chaves_vazias()
+
+    if chave in df.columns:
+        chaves = hash_chaves(df[chave])
+        nulas = df[chave].isnull().to_numpy()
+    else:
+        # Sem coluna de chave: usar o conteúdo completo da linha
+        chaves = hash_linhas(df)
+        nulas = np.zeros(len(df), dtype=bool)
+
+    if verificar_conflitos:
+        conteudos = hash_linhas(df)
+    else:
+        conteudos = np.zeros(len(df), dtype=np.uint64)
+
+    # Duplicatas dentro do próprio DataFrame (mantém a primeira ocorrência)
+    duplicadas = pd.Series(chaves).duplicated().to_numpy() & ~nulas
+    primeiros = pd.Series(conteudos).groupby(chaves).transform("first").to_numpy()
+    conflitos = duplicadas & (conteudos != primeiros)
+
+    # Registros que já existem nos dados ingeridos anteriormente
+    encontradas, conteudos_vistos = buscar_chaves(vistos, chaves)
+    existentes = encontradas & ~nulas & ~duplicadas
+    conflitos |= existentes & (conteudos_vistos != conteudos)
+
+    manter = ~(duplicadas | existentes)
+    novas = manter & ~nulas
+    vistos = adicionar_chaves(vistos, chaves[novas], conteudos[novas])
+
+    relatorio = {
+        "removidas": int((~manter).sum()),
+        "ja_existentes": int(existentes.sum()),
+        "conflitantes": int(conflitos.sum()) if verificar_conflitos else None,
+    }
+
+    if manter.all():
+        return df, relatorio, vistos
+    return df[manter], relatorio, vistos
+
+
+# Função para carregar o conjunto de chaves vistas (vazio se não existir)
+
+
+def carregar_chaves_vistas(diretorio, nome=chaves_file):
+    caminho = os.path.join(diretorio, nome)
+    if not os.path.exists(caminho):
+        return chaves_vazias()
+    with np.load(caminho) as dados:
+        return {"chaves": dados["chaves"], "conteudos": dados["conteudos"]}
+
+
+# Função para gravar o conjunto de chaves vistas
+
+
+def salvar_chaves_vistas(diretorio, vistos, nome=chaves_file):
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, nome)
+    tmp_path = caminho + ".tmp.npz"
+    np.savez(tmp_path, chaves=vistos["chaves"], conteudos=vistos["conteudos"])
+    os.replace(tmp_path, caminho)
+    return caminho
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+# Dimensões indexadas (as mesmas dos filtros do app)
+dimensoes_indice = ["ano", "nome_mes", "uf", "tipo_acidente"]
+
+
+# Função para indexar uma coluna: código de cada linha e, para cada valor, as
+# posições das linhas com esse valor (listas invertidas em formato CSR:
+# "posicoes" ordenadas por valor e "inicios" com o início de cada valor)
+
+
+def indexar_coluna(serie):
+    codigos, valores = pd.factorize(serie, sort=True)
+    tipo = np.int8 if len(valores) < 127 else np.int32
+    codigos = codigos.astype(tipo)
+
+    posicoes = np.argsort(codigos, kind="stable").astype(np.int32)
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+    inicios = np.concatenate([[0], np.cumsum(contagens)]) + (codigos < 0).sum()
+
+    return {
+        "codigos": codigos,
+        "valores": list(valores),
+        "codigo_por_valor": {valor: i for i, valor in enumerate(valores)},
+        "posicoes": posicoes,
+        "inicios": inicios,
+    }
+
+
+# Função para construir o índice de filtros do DataFrame consolidado, com as
+# listas de opções de cada filtro já ordenadas (meses pela ordem do calendário)
+
+
+def construir_indice(df, dimensoes=dimensoes_indice):
+    indice = {
+        "linhas": len(df),
+        "colunas": {
+            coluna: indexar_coluna(df[coluna])
+            for coluna in dimensoes
+            if coluna in df.columns
+        },
+    }
+
+    opcoes = {coluna: col["valores"] for coluna, col in indice["colunas"].items()}
+    if "nome_mes" in indice["colunas"] and "mes" in df.columns:
+        col = indice["colunas"]["nome_mes"]
+        mes = df["mes"].to_numpy()
+        primeiras = col["posicoes"][col["inicios"][:-1]]
+        opcoes["nome_mes"] = [
+            valor for _, valor in sorted(zip(mes[primeiras], col["valores"]))
+        ]
+    indice["opcoes"] = opcoes
+    return indice
+
+
+# Função para obter as posições das linhas que atendem a todos os filtros
+# ("Todos" ou None ignoram o filtro). Parte da lista invertida mais curta e
+# confere as demais dimensões pelos códigos das linhas; retorna None quando
+# nenhum filtro é aplicado.
+
+
+def posicoes_filtradas(indice, filtros):
+    selecionados = []
+    for coluna, valor in filtros.items():
+        if valor is None or valor == "Todos":
+            continue
+        col = indice["colunas"][coluna]
+        codigo = col["codigo_por_valor"].get(valor)
+        if codigo is None:
+            return np.empty(0, dtype=np.int32)
+        selecionados.append((col, codigo))
+
+    if not selecionados:
+        return None
+
+    def tamanho(item):
+        col, codigo = item
+        return col["inicios"][codigo + 1] - col["inicios"][codigo]
+
+    selecionados.sort(key=tamanho)
+    col, codigo = selecionados[0]
+    # As listas invertidas já estão em ordem crescente (argsort estável)
+    posicoes = col["posicoes"][col["inicios"][codigo] : col["inicios"][codigo + 1]]
+    for col, codigo in selecionados[1:]:
+        posicoes = posicoes[col["codigos"][posicoes] == codigo]
+    return posicoes
+
+
+# Função para filtrar o DataFrame com o índice (uma única operação 'take')
+
+
+def filtrar(df, indice, filtros):
+    posicoes = posicoes_filtradas(indice, filtros)
+    if posicoes is None:
+        return df
+    return df.take(posicoes)
+
+
+# Função para obter a máscara booleana (por linha do DataFrame) das linhas que
+# passam nos filtros, usada pelos índices espacial e de rodovias (None se não
+# há filtro)
+
+
+def mascara_filtrada(indice, filtros):
+    posicoes = posicoes_filtradas(indice, filtros)
+    if posicoes is None:
+        return None
+    mascara = np.zeros(indice["linhas"], dtype=bool)
+    mascara[posicoes] = True
+    return mascara
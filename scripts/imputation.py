@@ -0,0 +1,211 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Arquivo com as estatísticas de imputação (gravado junto ao cache consolidado)
+estatisticas_file = "estatisticas_imputacao.json"
+
+
+# Função para calcular a moda de uma coluna com contagem por hash (sem ordenar a
+# coluna inteira). Em caso de empate, retorna o menor valor, como Series.mode.
+
+
+def moda(serie):
+    codigos, unicos = pd.factorize(serie)
+    codigos = codigos[codigos >= 0]
+    if len(codigos) == 0:
+        return None
+    contagens = np.bincount(codigos)
+    empatados = list(unicos[contagens == contagens.max()])
+    try:
+        return min(empatados)
+    except TypeError:
+        return empatados[0]
+
+
+# Função para converter valores numpy em tipos nativos (para gravar em JSON)
+
+
+def valor_nativo(valor):
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+# Função para obter as colunas imputáveis: numéricas (imputadas pela mediana) e
+# de texto (imputadas pela moda)
+
+
+def colunas_imputaveis(df, colunas_ignoradas=()):
+    numericas = [
+        coluna
+        for coluna in df.select_dtypes(include=["float64", "int64"]).columns
+        if coluna not in colunas_ignoradas
+    ]
+    categoricas = [
+        coluna
+        for coluna in df.select_dtypes(include=["object"]).columns
+        if coluna not in colunas_ignoradas
+    ]
+    return numericas, categoricas
+
+
+# Função para perfilar todas as colunas em uma única passada: número de nulos,
+# mediana das colunas numéricas e moda das colunas de texto
+
+
+def perfilar_colunas(df, colunas_ignoradas=()):
+    nulos = df.isnull().sum()
+    numericas, categoricas = colunas_imputaveis(df, colunas_ignoradas)
+
+    medianas = df[numericas].median() if numericas else pd.Series(dtype="float64")
+    modas = {coluna: moda(df[coluna]) for coluna in categoricas}
+
+    return {
+        "linhas": int(len(df)),
+        "nulos": {coluna: int(n) for coluna, n in nulos.items()},
+        "medianas": {
+            coluna: valor_nativo(v) for coluna, v in medianas.items() if pd.notnull(v)
+        },
+        "modas": {
+            coluna: valor_nativo(v) for coluna, v in modas.items() if v is not None
+        },
+    }
+
+
+# Função para somar contagens de valores ({coluna: Series valor -> contagem}) de
+# várias partes dos dados (ex.: de cada arquivo de entrada)
+
+
+def somar_contagens(partes):
+    total = {}
+    for contagens in partes:
+        for coluna, vc in contagens.items():
+            total[coluna] = (
+                total[coluna].add(vc, fill_value=0) if coluna in total else vc
+            )
+    return {coluna: vc.astype("int64") for coluna, vc in total.items()}
+
+
+# Função para calcular a mediana a partir de contagens de valores
+
+
+def mediana_contagens(vc):
+    vc = vc.sort_index()
+    acumulado = vc.cumsum().to_numpy()
+    total = acumulado[-1]
+    baixo = vc.index[np.searchsorted(acumulado, (total + 1) // 2)]
+    alto = vc.index[np.searchsorted(acumulado, total // 2 + 1)]
+    return (baixo + alto) / 2
+
+
+# Função para montar as estatísticas de imputação a partir de contagens de
+# valores (mesmo formato de perfilar_colunas): mediana para numéricos e moda para
+# categóricos (menor valor em caso de empate, como em Series.mode)
+
+
+def estatisticas_contagens(contagens, nulos, linhas):
+    medianas, modas = {}, {}
+    for coluna, vc in contagens.items():
+        if vc.empty:
+            continue
+        if pd.api.types.is_numeric_dtype(vc.index):
+            medianas[coluna] = valor_nativo(mediana_contagens(vc))
+        else:
+            modas[coluna] = min(vc[vc == vc.max()].index)
+    return {
+        "linhas": int(linhas),
+        "nulos": {coluna: int(n) for coluna, n in nulos.items()},
+        "medianas": medianas,
+        "modas": modas,
+    }
+
+
+# Função para obter as colunas cuja mediana ou moda difere entre duas versões
+# das estatísticas de imputação
+
+
+def colunas_alteradas(antes, depois):
+    return sorted(
+        coluna
+        for campo in ("medianas", "modas")
+        for coluna in set(antes[campo]) | set(depois[campo])
+        if antes[campo].get(coluna) != depois[campo].get(coluna)
+    )
+
+
+# Função para calcular valores de preenchimento por grupo (ex.: por 'uf' e 'ano'):
+# mediana do grupo para numéricos e moda do grupo para texto
+
+
+def valores_por_grupo(df, coluna, agrupar_por, numerica):
+    if numerica:
+        return df.groupby(agrupar_por, observed=True)[coluna].transform("median")
+
+    contagens = (
+        df.groupby(agrupar_por + [coluna], observed=True)
+        .size()
+        .reset_index(name="contagem")
+        .sort_values(["contagem", coluna], ascending=[False, True])
+        .drop_duplicates(agrupar_por)
+    )
+    return (
+        df[agrupar_por]
+        .merge(contagens, on=agrupar_por, how="left")[coluna]
+        .set_axis(df.index)
+    )
+
+
+# Função para preencher os valores nulos a partir das estatísticas. "nulos" é a
+# contagem de nulos deste DataFrame (a do perfil, quando ele foi calculado sobre
+# o mesmo DataFrame). Com "agrupar_por", usa primeiro o valor do grupo e depois o
+# valor global. Altera o DataFrame no próprio objeto e retorna os nulos antes e
+# depois do tratamento.
+
+
+def imputar(df, estatisticas, nulos, agrupar_por=None):
+    null_info_before = pd.Series(nulos, dtype="int64").reindex(df.columns, fill_value=0)
+    null_info_after = null_info_before.copy()
+
+    valores = {**estatisticas["medianas"], **estatisticas["modas"]}
+    for coluna in null_info_before[null_info_before > 0].index:
+        if coluna not in valores:
+            continue
+
+        serie = df[coluna]
+        if agrupar_por and coluna not in agrupar_por:
+            numerica = coluna in estatisticas["medianas"]
+            serie = serie.fillna(valores_por_grupo(df, coluna, agrupar_por, numerica))
+        df[coluna] = serie.fillna(valores[coluna])
+
+        null_info_after[coluna] = 0
+        tipo = "mediana" if coluna in estatisticas["medianas"] else "moda"
+        print(f"Valores nulos na coluna {coluna} foram substituídos pela {tipo}.")
+
+    return null_info_before, null_info_after
+
+
+# Função para carregar as estatísticas persistidas (None se não existirem)
+
+
+def carregar_estatisticas(diretorio, nome=estatisticas_file):
+    caminho = os.path.join(diretorio, nome)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Função para gravar as estatísticas de imputação
+
+
+def salvar_estatisticas(diretorio, estatisticas, nome=estatisticas_file):
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, nome)
+    tmp_path = caminho + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(estatisticas, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, caminho)
+    return caminho
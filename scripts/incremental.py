@@ -0,0 +1,435 @@
+import argparse
+import os
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+import data_processing
+from cache import (
+    assinatura_arquivos,
+    cache_file,
+    calcular_fingerprint,
+    hash_conteudo,
+    ler_metadados,
+    registrar_metadados,
+)
+from cube import carregar_cubo, construir_cubo, salvar_cubo, substituir_anos
+from data_processing import (
+    adicionar_informacoes,
+    arquivos_entrada,
+    concatenar_arquivos,
+    consolidate_data,
+    estatisticas_arquivos,
+    ler_arquivos_existentes,
+    notificar_progresso,
+    remover_registros_incoerentes,
+    tratar_valores_nulos,
+)
+from dataset import (
+    abrir_dataset_particionado,
+    ler_dataset,
+    ordenar_por_particao,
+    substituir_particoes,
+)
+from dedup import remover_duplicatas, salvar_chaves_vistas
+from imputation import (
+    carregar_estatisticas,
+    colunas_alteradas,
+    estatisticas_contagens,
+    salvar_estatisticas,
+    somar_contagens,
+)
+from instrumentation import definir_arquivo_log, imprimir_resumo, log_file, medir
+from manifest import (
+    carregar_contagens_arquivos,
+    chaves_por_arquivo,
+    gravar_manifesto,
+    ler_manifesto,
+    nulos_por_arquivo,
+    nulos_restantes,
+    origem_linhas,
+    registrar_arquivos,
+    registrar_processamento,
+    remover_chaves_arquivos,
+    remover_contagens_arquivos,
+    resumo_por_arquivo,
+    salvar_chaves_arquivos,
+    salvar_contagens_arquivos,
+    total_nulos,
+    unir_chaves,
+)
+from schema import compactar_dataframe, schema_consolidado
+
+# Função para comparar os arquivos de entrada com o manifesto. Como no cache, o
+# hash do conteúdo só é calculado quando tamanho ou mtime mudaram.
+# Retorna (caminhos alterados ou novos, nomes removidos, hash de cada caminho,
+# assinatura rápida dos arquivos).
+
+
+def arquivos_alterados(file_paths, manifesto):
+    alterados, hashes = [], {}
+    assinatura = assinatura_arquivos(file_paths)
+    for arquivo in assinatura:
+        entrada = manifesto["arquivos"].get(os.path.basename(arquivo["path"]))
+        if (
+            entrada is not None
+            and entrada["size"] == arquivo["size"]
+            and entrada["mtime_ns"] == arquivo["mtime_ns"]
+        ):
+            hashes[arquivo["path"]] = entrada["hash"]
+            continue
+
+        hashes[arquivo["path"]] = hash_conteudo(arquivo["path"])
+        if entrada is None or entrada["hash"] != hashes[arquivo["path"]]:
+            alterados.append(arquivo["path"])
+        else:
+            # Conteúdo idêntico: só atualizar a assinatura rápida
+            entrada.update(size=arquivo["size"], mtime_ns=arquivo["mtime_ns"])
+
+    nomes_atuais = {os.path.basename(path) for path in file_paths}
+    removidos = [nome for nome in manifesto["arquivos"] if nome not in nomes_atuais]
+    return alterados, removidos, hashes, assinatura
+
+
+# Função para obter os tipos das colunas do dataset já gravado, para que as
+# partições novas sejam gravadas com o mesmo esquema
+
+
+def tipos_existentes(dataset_dir):
+    return (
+        abrir_dataset_particionado(dataset_dir).schema.empty_table().to_pandas().dtypes
+    )
+
+
+# Função para processar apenas alguns arquivos com as mesmas etapas da
+# consolidação completa. As estatísticas de imputação são recalculadas com as
+# contagens de valores destes arquivos e as guardadas dos demais
+# ("contagens_outros"); a deduplicação usa as chaves já vistas nos demais.
+# "etapa" mede cada etapa (contexto criado em atualizar_incremental).
+
+
+def processar_arquivos(file_paths, contagens_outros, vistos, tipos, etapa):
+    with etapa("leitura") as medicao:
+        lidos, dataframes = ler_arquivos_existentes(
+            [os.path.basename(path) for path in file_paths],
+            data_processing.data_path,
+        )
+        nomes = [os.path.basename(path) for path in lidos]
+        origem = origem_linhas(dataframes)
+        linhas_lidas = {nome: len(df) for nome, df in zip(nomes, dataframes)}
+        df = concatenar_arquivos(dataframes)
+        del dataframes
+        medicao["linhas_saida"] = len(df)
+    if df.empty:
+        raise ValueError("Nenhum dado foi carregado dos arquivos alterados.")
+
+    df["ano"] = df["data_inversa"].dt.year
+    nulos_arquivos = nulos_por_arquivo(df, origem, nomes)
+    with etapa("imputacao", len(df)) as medicao:
+        estatisticas, contagens = estatisticas_arquivos(
+            df, origem, nomes, contagens_outros
+        )
+        _, null_info_after = tratar_valores_nulos(df, estatisticas)
+        medicao["linhas_saida"] = len(df)
+
+    with etapa("deduplicacao", len(df)) as medicao:
+        df, relatorio_dedup, vistos = remover_duplicatas(df, vistos=vistos)
+        medicao["linhas_saida"] = len(df)
+    print(
+        f"Removidas {relatorio_dedup['removidas']} duplicatas "
+        f"({relatorio_dedup['ja_existentes']} já existentes em outros arquivos, "
+        f"{relatorio_dedup['conflitantes']} com conteúdo conflitante)."
+    )
+    chaves = chaves_por_arquivo(df["id"], origem[df.index], nomes, vistos)
+
+    with etapa("validacao", len(df)) as medicao:
+        df = remover_registros_incoerentes(df)
+        medicao["linhas_saida"] = len(df)
+    with etapa("enriquecimento", len(df)) as medicao:
+        df = adicionar_informacoes(df)
+        medicao["linhas_saida"] = len(df)
+    with etapa("compactacao", len(df)) as medicao:
+        df = compactar_dataframe(
+            df,
+            tipos={
+                coluna: str(tipo)
+                for coluna, tipo in tipos.items()
+                if schema_consolidado.get(coluna, "").startswith("int")
+            },
+        )[0]
+        medicao["linhas_saida"] = len(df)
+
+    return {
+        "df": df,
+        "linhas_lidas": linhas_lidas,
+        "nulos_antes": nulos_arquivos,
+        "nulos_depois": nulos_restantes(nulos_arquivos, null_info_after),
+        "resumo": resumo_por_arquivo(df["ano"], origem[df.index], nomes),
+        "chaves": chaves,
+        "contagens": contagens,
+        "estatisticas": estatisticas,
+    }
+
+
+# Função para montar o resultado de um processamento sem arquivos: nenhuma
+# linha, com os tipos do dataset gravado e as estatísticas de imputação dos
+# demais arquivos
+
+
+def processamento_vazio(tipos, contagens_outros):
+    return {
+        "df": pd.DataFrame(
+            {coluna: pd.Series(dtype=tipo) for coluna, tipo in tipos.items()}
+        ),
+        "linhas_lidas": {},
+        "nulos_antes": {},
+        "nulos_depois": {},
+        "resumo": {},
+        "chaves": {},
+        "contagens": {},
+        "estatisticas": estatisticas_contagens(
+            somar_contagens(contagens_outros), {}, 0
+        ),
+    }
+
+
+# Função para verificar se as colunas processadas têm os tipos do dataset
+# gravado (categorias podem ter valores diferentes entre partições)
+
+
+def esquema_compativel(df, tipos):
+    for coluna, tipo in tipos.items():
+        if coluna not in df.columns:
+            return False
+        if isinstance(tipo, pd.CategoricalDtype) and isinstance(
+            df[coluna].dtype, pd.CategoricalDtype
+        ):
+            continue
+        if df[coluna].dtype != tipo:
+            return False
+    return True
+
+
+# Função para executar a consolidação completa (sem cache) e retornar o registro
+# do processamento gravado no manifesto
+
+
+def consolidacao_completa(progress_callback=None):
+    if (
+        consolidate_data(use_cache=False, progress_callback=progress_callback)[0]
+        is None
+    ):
+        raise RuntimeError("Erro ao consolidar os dados.")
+    return ler_manifesto(data_processing.cache_path)["processamentos"][-1]
+
+
+# Função para criar o contexto que mede as etapas de uma carga incremental, com
+# os mesmos nomes de etapa da consolidação completa e no mesmo log. Os registros
+# são acumulados em "medicoes" para o resumo impresso ao final.
+
+
+def medidor_etapas(execucao, medicoes):
+    @contextmanager
+    def etapa(nome, linhas_entrada=None):
+        with medir(
+            nome, linhas_entrada=linhas_entrada, execucao=execucao, modo="incremental"
+        ) as registro:
+            yield registro
+        medicoes.append(registro)
+
+    return etapa
+
+
+# Função para atualizar o cache consolidado reprocessando apenas os arquivos de
+# entrada que mudaram desde a última execução (ex.: o arquivo do ano corrente,
+# republicado mensalmente pela PRF). Substitui somente as partições (anos) e as
+# células do cubo afetadas e registra o processamento no manifesto. Sem cache
+# ou manifesto válidos, faz a consolidação completa.
+# Retorna o registro do processamento (None se nada mudou).
+
+
+def atualizar_incremental(progress_callback=None):
+    inicio = time.perf_counter()
+    cache_path = data_processing.cache_path
+    definir_arquivo_log(os.path.join(cache_path, log_file))
+    medicoes = []
+    etapa = medidor_etapas(time.strftime("%Y%m%dT%H%M%S"), medicoes)
+    dataset_dir = os.path.join(cache_path, cache_file)
+    file_paths = arquivos_entrada()
+
+    manifesto = ler_manifesto(cache_path)
+    estatisticas = carregar_estatisticas(cache_path)
+    meta = ler_metadados(cache_path)
+    if (
+        manifesto is None
+        or estatisticas is None
+        or meta is None
+        or manifesto["pipeline_version"] != data_processing.PIPELINE_VERSION
+        or not os.path.exists(dataset_dir)
+    ):
+        print("Cache sem manifesto válido: executando a consolidação completa.")
+        return consolidacao_completa(progress_callback)
+
+    notificar_progresso(progress_callback, "Verificando arquivos alterados", 0.0)
+    alterados, removidos, hashes, assinatura = arquivos_alterados(file_paths, manifesto)
+    if not alterados and not removidos:
+        print("Nenhum arquivo de entrada mudou desde a última execução.")
+        gravar_manifesto(cache_path, manifesto)
+        return None
+
+    # Fingerprint dos arquivos como estavam antes da leitura
+    fingerprint = calcular_fingerprint(
+        file_paths, data_processing.PIPELINE_VERSION, hashes, assinatura
+    )
+
+    # Anos afetados: os que os arquivos alterados/removidos ocupavam antes e os
+    # que ocupam agora. Outros arquivos com linhas nesses anos também precisam
+    # ser reprocessados, já que as partições são substituídas inteiras.
+    reprocessar = {os.path.basename(path) for path in alterados}
+    anos_afetados = set()
+    for nome in reprocessar | set(removidos):
+        anos_afetados |= set(manifesto["arquivos"].get(nome, {}).get("anos", []))
+    reprocessar |= {
+        nome
+        for nome, entrada in manifesto["arquivos"].items()
+        if nome not in removidos and anos_afetados & set(entrada["anos"])
+    }
+
+    # Sem arquivos a reprocessar (só removidos, cujos anos nenhum outro arquivo
+    # tem, e sem mudança nas estatísticas de imputação), as partições desses
+    # anos são apenas apagadas
+    tipos = tipos_existentes(dataset_dir)
+    outros = [
+        nome
+        for nome in manifesto["arquivos"]
+        if nome not in reprocessar and nome not in removidos
+    ]
+    contagens_outros = carregar_contagens_arquivos(cache_path, outros)
+    if contagens_outros is None:
+        print("Cache sem as contagens de valores: executando a consolidação completa.")
+        return consolidacao_completa(progress_callback)
+    resultado = processamento_vazio(tipos, contagens_outros)
+    while True:
+        if reprocessar:
+            print(f"Reprocessando: {', '.join(sorted(reprocessar))}.")
+            notificar_progresso(
+                progress_callback, "Processando arquivos alterados", 0.2
+            )
+            resultado = processar_arquivos(
+                [
+                    os.path.join(data_processing.data_path, nome)
+                    for nome in sorted(reprocessar)
+                ],
+                contagens_outros,
+                unir_chaves(cache_path, outros),
+                tipos,
+                etapa,
+            )
+            for entrada in resultado["resumo"].values():
+                anos_afetados |= set(entrada["anos"])
+
+        # Também são reprocessados os demais arquivos com linhas nos anos
+        # afetados e os que têm nulos em colunas cuja mediana ou moda mudou
+        # (foram imputados com o valor antigo)
+        alteradas = colunas_alteradas(estatisticas, resultado["estatisticas"])
+        extras = {
+            nome
+            for nome in outros
+            if anos_afetados & set(manifesto["arquivos"][nome]["anos"])
+            or any(
+                manifesto["arquivos"][nome]["nulos_antes"].get(coluna, 0) > 0
+                for coluna in alteradas
+            )
+        }
+        if not extras:
+            break
+        reprocessar |= extras
+        outros = [nome for nome in outros if nome not in extras]
+        contagens_outros = carregar_contagens_arquivos(cache_path, outros)
+
+    df = resultado["df"]
+    if not esquema_compativel(df, tipos):
+        print("Esquema dos dados novos mudou: executando a consolidação completa.")
+        return consolidacao_completa(progress_callback)
+
+    # Substituir apenas as partições dos anos afetados
+    notificar_progresso(progress_callback, "Gravando partições", 0.7)
+    with etapa("gravacao", len(df)) as medicao:
+        substituir_particoes(ordenar_por_particao(df), dataset_dir, anos_afetados)
+
+        # Chaves vistas: as dos arquivos reprocessados e a união de todas
+        remover_chaves_arquivos(cache_path, removidos)
+        salvar_chaves_arquivos(cache_path, resultado["chaves"])
+        remover_contagens_arquivos(cache_path, removidos)
+        salvar_contagens_arquivos(cache_path, resultado["contagens"])
+        for nome in removidos:
+            del manifesto["arquivos"][nome]
+        nomes = [os.path.basename(path) for path in file_paths]
+        salvar_chaves_vistas(cache_path, unir_chaves(cache_path, nomes))
+        medicao["linhas_saida"] = len(df)
+
+    # Manifesto e metadados do cache (que passa a valer para os arquivos atuais)
+    registrar_arquivos(
+        manifesto,
+        fingerprint["arquivos"],
+        resultado["linhas_lidas"],
+        resultado["nulos_antes"],
+        resultado["nulos_depois"],
+        resultado["resumo"],
+    )
+    meta_novo = registrar_metadados(
+        sum(entrada["linhas_gravadas"] for entrada in manifesto["arquivos"].values()),
+        total_nulos(manifesto, "nulos_antes"),
+        total_nulos(manifesto, "nulos_depois"),
+        fingerprint,
+        cache_path,
+    )
+    salvar_estatisticas(
+        cache_path,
+        {
+            **resultado["estatisticas"],
+            "linhas": sum(
+                entrada["linhas_lidas"] for entrada in manifesto["arquivos"].values()
+            ),
+            "nulos": total_nulos(manifesto, "nulos_antes").to_dict(),
+        },
+    )
+
+    # Cubo: substituir só as células dos anos afetados
+    notificar_progresso(progress_callback, "Atualizando cubo de agregados", 0.9)
+    with etapa("cubo", len(df)) as medicao:
+        cubo = carregar_cubo(cache_path, meta["chave"])
+        if cubo is None:
+            cubo = construir_cubo(ler_dataset(dataset_dir))
+        else:
+            cubo = substituir_anos(cubo, construir_cubo(df), anos_afetados)
+        salvar_cubo(cubo, cache_path, meta_novo["chave"])
+        medicao["linhas_saida"] = sum(len(tabela) for tabela in cubo.values())
+
+    registrar_processamento(
+        manifesto,
+        "incremental",
+        sorted(reprocessar),
+        anos_afetados,
+        time.perf_counter() - inicio,
+    )
+    gravar_manifesto(cache_path, manifesto)
+    imprimir_resumo(medicoes)
+
+    notificar_progresso(progress_callback, "Dados atualizados", 1.0)
+    print(
+        f"Anos {sorted(anos_afetados)} atualizados em "
+        f"{time.perf_counter() - inicio:.1f} s."
+    )
+    return manifesto["processamentos"][-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Atualiza os dados consolidados reprocessando apenas os "
+        "arquivos anuais que mudaram."
+    )
+    parser.parse_args()
+
+    atualizar_incremental()
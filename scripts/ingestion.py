@@ -0,0 +1,283 @@
+import codecs
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import finalizar_medicao, iniciar_medicao, registrar_medicao
+
+# Padrão dos arquivos anuais da PRF (ex.: 2021.csv)
+padrao_arquivo = re.compile(r"^(\d{4})\.csv$")
+
+# Esquema das colunas lidas dos arquivos da PRF.
+# "texto": string, "inteiro": contagem numérica, "decimal": número com vírgula
+# decimal (ex.: "569,6"), "data": data do acidente.
+schema_colunas = {
+    "id": "inteiro",
+    "data_inversa": "data",
+    "dia_semana": "texto",
+    "horario": "texto",
+    "uf": "texto",
+    "br": "inteiro",
+    "km": "decimal",
+    "municipio": "texto",
+    "causa_acidente": "texto",
+    "tipo_acidente": "texto",
+    "classificacao_acidente": "texto",
+    "fase_dia": "texto",
+    "sentido_via": "texto",
+    "condicao_metereologica": "texto",
+    "tipo_pista": "texto",
+    "tracado_via": "texto",
+    "uso_solo": "texto",
+    "pessoas": "inteiro",
+    "mortos": "inteiro",
+    "feridos_leves": "inteiro",
+    "feridos_graves": "inteiro",
+    "ilesos": "inteiro",
+    "ignorados": "inteiro",
+    "feridos": "inteiro",
+    "veiculos": "inteiro",
+    "latitude": "decimal",
+    "longitude": "decimal",
+    "regional": "texto",
+    "delegacia": "texto",
+    "uop": "texto",
+}
+
+# Tamanho da amostra usada para detectar encoding e separador
+tamanho_amostra = 1 << 16
+
+# Verifica se o pyarrow está disponível para usar o leitor CSV multi-thread
+try:
+    import pyarrow  # noqa: F401
+
+    engine_padrao = "pyarrow"
+except ImportError:
+    engine_padrao = "c"
+
+
+# Função para descobrir os arquivos anuais (YYYY.csv) em um diretório
+
+
+def descobrir_arquivos(data_dir):
+    arquivos = []
+    for file in os.listdir(data_dir):
+        match = padrao_arquivo.match(file)
+        if match:
+            arquivos.append((int(match.group(1)), os.path.join(data_dir, file)))
+    return sorted(arquivos)
+
+
+# Função para detectar o encoding de um arquivo (utf-8 ou latin1)
+
+
+def detectar_encoding(file_path):
+    with open(file_path, "rb") as f:
+        amostra = f.read(tamanho_amostra)
+
+    if amostra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+
+    # Decodificador incremental: um caractere multibyte cortado no fim da
+    # amostra não deve ser confundido com um arquivo latin1
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(amostra, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+# Função para detectar o separador e o cabeçalho de um arquivo
+
+
+def detectar_separador(file_path, encoding):
+    with open(file_path, encoding=encoding, errors="replace") as f:
+        amostra = f.read(tamanho_amostra)
+
+    try:
+        sep = csv.Sniffer().sniff(amostra, delimiters=";,\t|").delimiter
+    except csv.Error:
+        # Sem amostra suficiente: usar o caractere mais frequente no cabeçalho
+        cabecalho = amostra.splitlines()[0] if amostra else ""
+        sep = max(";,\t|", key=cabecalho.count)
+
+    cabecalho = next(csv.reader([amostra.splitlines()[0]], delimiter=sep))
+    return sep, [coluna.strip() for coluna in cabecalho]
+
+
+# Função para converter as colunas lidas para os tipos do esquema
+
+
+def aplicar_schema(df):
+    for coluna, tipo in schema_colunas.items():
+        if coluna not in df.columns:
+            continue
+        if tipo == "texto":
+            # Texto lido como "string" (o leitor pyarrow converteria, por
+            # exemplo, 'horario' em datetime.time); volta para object com NaN
+            df[coluna] = df[coluna].astype(object).where(df[coluna].notna(), np.nan)
+        elif tipo == "inteiro":
+            df[coluna] = pd.to_numeric(df[coluna], errors="coerce")
+            # Sem nulos, manter como inteiro (mesmo tipo inferido pelo pandas)
+            if df[coluna].notnull().all():
+                df[coluna] = df[coluna].astype("int64")
+        elif tipo == "decimal":
+            df[coluna] = pd.to_numeric(
+                df[coluna].astype(str).str.replace(",", ".", regex=False),
+                errors="coerce",
+            )
+        elif tipo == "data":
+            # Anos recentes usam YYYY-MM-DD; anos antigos usam DD/MM/YYYY
+            datas = pd.to_datetime(df[coluna], format="%Y-%m-%d", errors="coerce")
+            faltantes = datas.isnull() & df[coluna].notnull()
+            if faltantes.any():
+                datas[faltantes] = pd.to_datetime(
+                    df.loc[faltantes, coluna], format="%d/%m/%Y", errors="coerce"
+                )
+            df[coluna] = datas
+    return df
+
+
+# Função para detectar encoding, separador e colunas do esquema de um arquivo
+
+
+def preparar_leitura(file_path):
+    encoding = detectar_encoding(file_path)
+    sep, cabecalho = detectar_separador(file_path, encoding)
+    usecols = [coluna for coluna in cabecalho if coluna in schema_colunas]
+    return encoding, sep, usecols
+
+
+# Função para ler um único arquivo anual com detecção de encoding e separador
+
+
+def ler_arquivo(file_path, engine=None):
+    encoding, sep, usecols = preparar_leitura(file_path)
+
+    # Contagens são lidas como float (aceitam nulos); demais colunas como texto
+    # ("string", e não str, para que valores vazios continuem nulos)
+    dtype = {
+        coluna: "float64" if schema_colunas[coluna] == "inteiro" else "string"
+        for coluna in usecols
+    }
+    engine = engine or engine_padrao
+
+    try:
+        df = pd.read_csv(
+            file_path,
+            encoding=encoding,
+            sep=sep,
+            usecols=usecols,
+            dtype=dtype,
+            engine=engine,
+            on_bad_lines="skip",
+        )
+    except Exception as e:
+        # Valores não numéricos nas contagens: ler tudo como texto e converter
+        print(f"Leitura tipada de {file_path} falhou ({e}), lendo como texto.")
+        df = pd.read_csv(
+            file_path,
+            encoding=encoding,
+            sep=sep,
+            usecols=usecols,
+            dtype="string",
+            on_bad_lines="skip",
+        )
+
+    return aplicar_schema(df)
+
+
+# Função para ler um arquivo anual medindo o tempo, as linhas e a memória da
+# leitura. A medição é devolvida junto com o DataFrame, porque a leitura pode
+# acontecer em outro processo.
+
+
+def ler_arquivo_medido(file_path):
+    medicao = iniciar_medicao(
+        "leitura_arquivo",
+        arquivo=os.path.basename(file_path),
+        bytes_arquivo=os.path.getsize(file_path),
+    )
+    df = ler_arquivo(file_path)
+    return df, finalizar_medicao(medicao, len(df), registrar=False)
+
+
+# Função para ler um arquivo anual em blocos de tamanho fixo (modo streaming).
+# Tudo é lido como texto e convertido por bloco, para que um valor inválido
+# não interrompa a leitura do arquivo inteiro.
+
+
+def ler_arquivo_em_blocos(file_path, chunksize):
+    encoding, sep, usecols = preparar_leitura(file_path)
+    for chunk in pd.read_csv(
+        file_path,
+        encoding=encoding,
+        sep=sep,
+        usecols=usecols,
+        dtype="string",
+        on_bad_lines="skip",
+        chunksize=chunksize,
+    ):
+        yield aplicar_schema(chunk)
+
+
+# Função para estimar a memória ocupada por linha de um arquivo (em bytes)
+
+
+def estimar_bytes_por_linha(file_path, nrows=1000):
+    encoding, sep, usecols = preparar_leitura(file_path)
+    amostra = pd.read_csv(
+        file_path,
+        encoding=encoding,
+        sep=sep,
+        usecols=usecols,
+        dtype="string",
+        on_bad_lines="skip",
+        nrows=nrows,
+    )
+    if amostra.empty:
+        return 0
+    amostra = aplicar_schema(amostra)
+    return amostra.memory_usage(deep=True, index=False).sum() / len(amostra)
+
+
+# Função para ler vários arquivos em paralelo (um processo por arquivo).
+# Retorna a lista de DataFrames na mesma ordem dos arquivos; a medição de cada
+# leitura é registrada pelo processo principal.
+
+
+def ler_arquivos(file_paths, max_workers=None, progress_callback=None):
+    resultados = [None] * len(file_paths)
+    if max_workers is None:
+        max_workers = min(len(file_paths), os.cpu_count() or 1)
+
+    def concluir(i, ler):
+        try:
+            df, medicao = ler()
+            registrar_medicao(medicao)
+        except Exception as e:
+            print(f"Erro ao ler o arquivo {file_paths[i]}: {e}")
+            df = pd.DataFrame()
+        resultados[i] = df
+        if progress_callback is not None:
+            concluidos = sum(r is not None for r in resultados)
+            progress_callback(file_paths[i], concluidos / len(file_paths))
+
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for i, file_path in enumerate(file_paths):
+            concluir(i, lambda: ler_arquivo_medido(file_path))
+        return resultados
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(ler_arquivo_medido, file_path): i
+            for i, file_path in enumerate(file_paths)
+        }
+        for future in as_completed(futures):
+            concluir(futures[future], future.result)
+
+    return resultados
@@ -0,0 +1,572 @@
+import argparse
+import functools
+import os
+import pathlib
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import combinations
+
+import pandas as pd
+
+from cache import ler_metadados
+from cube import carregar_cubo, consultar, medidas, medidas_espaciais
+from data_processing import cache_path, consolidate_data, obter_cubo
+from instrumentation import finalizar_medicao, iniciar_medicao, registrar_medicao
+
+# Arquivo SQLite com os insights de cada combinação de filtros, gravado junto ao
+# cache consolidado. Os dados dos gráficos não são gravados: o relatório os
+# consulta no cubo, só para a combinação escolhida.
+insights_file = "insights.sqlite"
+
+# Filtros do app; cada combinação (inclusive "Todos") tem uma linha no arquivo
+filtros_insights = ["ano", "nome_mes", "uf", "tipo_acidente"]
+
+# Valor gravado para um filtro não aplicado
+todos = "Todos"
+
+# Coluna constante usada como chave quando nenhum filtro é aplicado
+coluna_todos = "_todos"
+
+# Gráficos de onde saem os insights: cuboide consultado, dimensões, medida,
+# quantidade de categorias (None: todas) e se só entram as células com
+# coordenadas (como no mapa). As categorias ficam em ordem
+# decrescente da medida, e a primeira de cada gráfico é o insight do app.
+graficos_insights = {
+    "top_causas": {
+        "cuboide": "causa_acidente",
+        "dimensoes": ["causa_acidente"],
+        "medida": "acidentes",
+        "quantidade": 5,
+        "com_coordenadas": False,
+    },
+    "top_tipos": {
+        "cuboide": "total",
+        "dimensoes": ["tipo_acidente"],
+        "medida": "acidentes",
+        "quantidade": 5,
+        "com_coordenadas": False,
+    },
+    "condicao_meteorologica": {
+        "cuboide": "condicao_metereologica",
+        "dimensoes": ["condicao_metereologica"],
+        "medida": "mortos",
+        "quantidade": None,
+        "com_coordenadas": False,
+    },
+    "municipios": {
+        "cuboide": "municipio",
+        "dimensoes": ["uf", "municipio"],
+        "medida": "acidentes",
+        "quantidade": 10,
+        "com_coordenadas": True,
+    },
+    "estados": {
+        "cuboide": "total",
+        "dimensoes": ["uf"],
+        "medida": "ids_distintos",
+        "quantidade": None,
+        "com_coordenadas": False,
+    },
+    "feriados": {
+        "cuboide": "feriado",
+        "dimensoes": ["feriado"],
+        "medida": "ids_distintos",
+        "quantidade": None,
+        "com_coordenadas": False,
+    },
+}
+
+# Colunas do insight tiradas de cada gráfico: (gráfico, posição, nome da
+# categoria, nome do valor); posição -1 é a última categoria (a menor)
+colunas_insights = [
+    ("top_causas", 0, "causa", "causa_acidentes"),
+    ("top_tipos", 0, "tipo", "tipo_acidentes"),
+    ("condicao_meteorologica", 0, "condicao", "condicao_mortos"),
+    ("municipios", 0, "municipio", "municipio_acidentes"),
+    ("estados", 0, "uf_maior", "uf_maior_acidentes"),
+    ("estados", 1, "uf_segunda", "uf_segunda_acidentes"),
+    ("estados", -1, "uf_menor", "uf_menor_acidentes"),
+    ("feriados", 0, "feriado", "feriado_acidentes"),
+]
+
+
+# Função para listar os conjuntos de filtros aplicados (de nenhum a todos os
+# quatro); cada conjunto gera as linhas de todas as combinações dos seus valores
+
+
+def conjuntos_filtros():
+    return [
+        conjunto
+        for tamanho in range(len(filtros_insights) + 1)
+        for conjunto in combinations(filtros_insights, tamanho)
+    ]
+
+
+# Função para calcular os dados dos gráficos de todas as combinações de valores
+# das chaves. agregar(cuboide, dimensoes) deve retornar as medidas somadas por
+# chaves + dimensoes (com a coluna coluna_todos quando não há chaves).
+
+
+def calcular_graficos(agregar, chaves):
+    partes = []
+    for nome, grafico in graficos_insights.items():
+        medida = grafico["medida"]
+        agregado = agregar(grafico["cuboide"], grafico["dimensoes"])
+        if grafico["com_coordenadas"]:
+            agregado = agregado[agregado["com_coordenadas"] > 0]
+
+        # Ordem estável: em caso de empate fica a primeira categoria, como no app
+        agregado = agregado.sort_values(
+            chaves + [medida],
+            ascending=[True] * len(chaves) + [False],
+            kind="stable",
+        )
+        posicao = agregado.groupby(chaves, observed=True, sort=False).cumcount()
+
+        categoria = agregado[grafico["dimensoes"][-1]]
+        if categoria.dtype == bool:
+            categoria = categoria.map({True: "Sim", False: "Não"})
+
+        parte = pd.DataFrame(
+            {
+                **{chave: agregado[chave] for chave in chaves},
+                "grafico": nome,
+                "posicao": posicao.to_numpy(),
+                "categoria": categoria.astype(str).to_numpy(),
+                "valor": agregado[medida].to_numpy().astype("int64"),
+            }
+        )
+        if grafico["quantidade"] is not None:
+            parte = parte[parte["posicao"] < grafico["quantidade"]]
+        partes.append(parte)
+    return pd.concat(partes, ignore_index=True)
+
+
+# Função para montar os insights (uma linha por combinação das chaves) a partir
+# dos totais e dos dados dos gráficos
+
+
+def montar_insights(totais, graficos, chaves):
+    insights = totais[chaves + ["acidentes", "mortos"]].astype(
+        {"acidentes": "int64", "mortos": "int64"}
+    )
+    for nome, posicao, coluna_categoria, coluna_valor in colunas_insights:
+        linhas = graficos[graficos["grafico"] == nome]
+        if posicao < 0:
+            linhas = linhas.drop_duplicates(chaves, keep="last")
+        else:
+            linhas = linhas[linhas["posicao"] == posicao]
+        linhas = linhas[chaves + ["categoria", "valor"]].rename(
+            columns={"categoria": coluna_categoria, "valor": coluna_valor}
+        )
+        insights = insights.merge(linhas, on=chaves, how="left")
+        insights[coluna_valor] = insights[coluna_valor].astype("Int64")
+    return insights
+
+
+# Função para calcular os insights de um conjunto de filtros a partir do cubo.
+# Retorna (insights, medição).
+
+
+def calcular_conjunto(cubo, conjunto):
+    medicao = iniciar_medicao("insights", conjunto=",".join(conjunto) or coluna_todos)
+    chaves = list(conjunto) or [coluna_todos]
+
+    def agregar(nome, dimensoes):
+        tabela = cubo[nome]
+        if not conjunto:
+            tabela = tabela.assign(**{coluna_todos: 0})
+        colunas = [coluna for coluna in medidas + medidas_espaciais if coluna in tabela]
+        return (
+            tabela.groupby(
+                chaves + [d for d in dimensoes if d not in chaves], observed=True
+            )[colunas]
+            .sum()
+            .reset_index()
+        )
+
+    graficos = calcular_graficos(agregar, chaves)
+    insights = montar_insights(agregar("total", []), graficos, chaves)
+    insights = insights[insights["acidentes"] > 0].reset_index(drop=True)
+
+    # Chaves gravadas como texto, com "Todos" nos filtros não aplicados
+    for coluna in filtros_insights:
+        insights[coluna] = insights[coluna].astype(str) if coluna in conjunto else todos
+    insights = insights[
+        filtros_insights + [c for c in insights if c not in chaves + filtros_insights]
+    ]
+    return insights, finalizar_medicao(medicao, len(insights), False)
+
+
+# Cubos já carregados em cada processo de trabalho (um por chave do cache)
+cubos_processo = {}
+
+
+# Função executada nos processos de trabalho: cada processo lê o cubo gravado
+# uma única vez e calcula um conjunto de filtros
+
+
+def calcular_conjunto_gravado(cache_dir, chave, conjunto):
+    if (cache_dir, chave) not in cubos_processo:
+        cubos_processo.clear()
+        cubos_processo[(cache_dir, chave)] = carregar_cubo(cache_dir, chave)
+    return calcular_conjunto(cubos_processo[(cache_dir, chave)], conjunto)
+
+
+# Função para gravar os insights no arquivo SQLite. O arquivo é
+# gravado com outro nome e depois substituído de forma atômica, como o arquivo
+# Arrow dos dados consolidados.
+
+
+def gravar_insights(insights, cache_dir, chave):
+    caminho = os.path.join(cache_dir, insights_file)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+    conexao = sqlite3.connect(temporario)
+    try:
+        insights.to_sql("insights", conexao, index=False)
+        conexao.execute(
+            "CREATE UNIQUE INDEX insights_filtros ON insights "
+            f"({', '.join(filtros_insights)})"
+        )
+        conexao.execute("CREATE TABLE metadados (nome TEXT PRIMARY KEY, valor TEXT)")
+        conexao.executemany(
+            "INSERT INTO metadados VALUES (?, ?)",
+            [
+                ("chave", chave),
+                ("gerado_em", time.strftime("%Y-%m-%dT%H:%M:%S")),
+                ("combinacoes", str(len(insights))),
+            ],
+        )
+        conexao.commit()
+    finally:
+        conexao.close()
+    os.replace(temporario, caminho)
+    return caminho
+
+
+# Função para gerar o arquivo de insights de todas as combinações de filtros.
+# Os conjuntos de filtros são calculados em paralelo em processos separados;
+# os dados consolidados e o cubo são gerados antes, se necessário.
+
+
+def gerar_insights(cache_dir=cache_path, max_workers=None):
+    inicio = time.time()
+    df = consolidate_data()[0]
+    if df is None or obter_cubo(df) is None:
+        print("Não foi possível consolidar os dados para gerar os insights.")
+        return None
+    chave = ler_metadados(cache_dir)["chave"]
+    del df
+
+    conjuntos = conjuntos_filtros()
+    if max_workers is None:
+        max_workers = min(len(conjuntos), os.cpu_count() or 1)
+    resultados = [None] * len(conjuntos)
+
+    def concluir(i, calcular):
+        insights, medicao = calcular()
+        registrar_medicao(medicao)
+        resultados[i] = insights
+        print(
+            f"Insights por {medicao['conjunto']}: {len(insights)} combinações "
+            f"({medicao['segundos']:.2f}s)"
+        )
+
+    if max_workers <= 1:
+        for i, conjunto in enumerate(conjuntos):
+            concluir(i, lambda: calcular_conjunto_gravado(cache_dir, chave, conjunto))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(
+                    calcular_conjunto_gravado, cache_dir, chave, conjunto
+                ): i
+                for i, conjunto in enumerate(conjuntos)
+            }
+            for future in as_completed(futures):
+                concluir(futures[future], future.result)
+
+    insights = pd.concat(resultados, ignore_index=True)
+    caminho = gravar_insights(insights, cache_dir, chave)
+    print(
+        f"{len(insights)} combinações de filtros gravadas em {caminho} "
+        f"({os.path.getsize(caminho) / 1e6:.1f} MB, {time.time() - inicio:.1f}s)"
+    )
+    return caminho
+
+
+# Função para obter o caminho do arquivo de insights, se existir e tiver sido
+# gerado a partir da versão atual dos dados consolidados (chave do cache)
+
+
+def arquivo_insights(cache_dir=cache_path, chave=None):
+    caminho = os.path.join(cache_dir, insights_file)
+    if not os.path.exists(caminho):
+        return None
+    if chave is None:
+        meta = ler_metadados(cache_dir)
+        chave = meta["chave"] if meta else None
+    try:
+        conexao = conectar_insights(caminho)
+        try:
+            gravada = conexao.execute(
+                "SELECT valor FROM metadados WHERE nome = 'chave'"
+            ).fetchone()
+        finally:
+            conexao.close()
+    except sqlite3.Error as e:
+        print(f"Não foi possível abrir {caminho}: {e}")
+        return None
+    return caminho if gravada is not None and gravada[0] == chave else None
+
+
+# Função para abrir o arquivo de insights somente para leitura
+
+
+def conectar_insights(caminho):
+    uri = pathlib.Path(caminho).resolve().as_uri() + "?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+# Função para converter os filtros do app nos valores gravados no arquivo
+
+
+def chave_filtros(filtros):
+    return tuple(
+        todos if filtros.get(coluna) in (None, todos) else str(filtros[coluna])
+        for coluna in filtros_insights
+    )
+
+
+# Função para consultar o insight de uma combinação de filtros (None se a
+# combinação não tiver acidentes)
+
+
+def consultar_insights(caminho, filtros):
+    conexao = conectar_insights(caminho)
+    try:
+        conexao.row_factory = sqlite3.Row
+        linha = conexao.execute(
+            "SELECT * FROM insights WHERE "
+            + " AND ".join(f"{coluna} = ?" for coluna in filtros_insights),
+            chave_filtros(filtros),
+        ).fetchone()
+    finally:
+        conexao.close()
+    return None if linha is None else dict(linha)
+
+
+# Função para calcular os totais e os dados dos gráficos de uma única combinação
+# de filtros. consultar(cuboide, filtros, dimensoes) é a consulta de medidas
+# agregadas do app (cubo ou SQL).
+
+
+def calcular_graficos_filtros(consultar, filtros):
+    chaves = [coluna_todos]
+
+    def agregar(nome, dimensoes):
+        if not dimensoes:
+            resultado = consultar(nome, filtros, []).to_frame().T
+        else:
+            resultado = consultar(nome, filtros, list(dimensoes))
+        return resultado.assign(**{coluna_todos: 0})
+
+    return agregar("total", []), calcular_graficos(agregar, chaves)
+
+
+# Função para calcular o insight de uma única combinação de filtros, sem o
+# arquivo pré-calculado
+
+
+def calcular_insights(consultar, filtros):
+    chaves = [coluna_todos]
+    totais, graficos = calcular_graficos_filtros(consultar, filtros)
+    insight = montar_insights(totais, graficos, chaves).drop(columns=chaves)
+    insight = insight.iloc[0].to_dict()
+    if insight["acidentes"] == 0:
+        return None
+    return {
+        coluna: None if pd.isna(valor) else valor for coluna, valor in insight.items()
+    }
+
+
+# Função para montar os textos dos insights de cada seção do app. total_brasil
+# é o total de acidentes sem filtros (usado quando uma UF é escolhida).
+
+
+def textos_insights(insight, filtros, total_brasil):
+    if insight is None:
+        return {}
+    total_acidentes = insight["acidentes"]
+    uf_filtro = filtros.get("uf", todos)
+    textos = {}
+
+    if insight["causa"] is not None:
+        textos["top_causas"] = (
+            f"A causa mais comum de acidente é **{insight['causa']}**, com um total "
+            f"de **{insight['causa_acidentes']}** acidentes, representando "
+            f"**{insight['causa_acidentes'] / total_acidentes * 100:.1f}%** do total "
+            "de acidentes."
+        )
+    if insight["tipo"] is not None:
+        textos["top_tipos"] = (
+            f"O tipo mais comum de acidente é **{insight['tipo']}**, com um total de "
+            f"**{insight['tipo_acidentes']}** acidentes, representando "
+            f"**{insight['tipo_acidentes'] / total_acidentes * 100:.1f}%** do total "
+            "de acidentes."
+        )
+    if insight["condicao"] is not None and insight["mortos"] > 0:
+        textos["condicao_meteorologica"] = (
+            "A condição meteorológica com mais registros de vítimas fatais é "
+            f"**{insight['condicao']}**, com um total de "
+            f"**{insight['condicao_mortos']}** vítimas, representando "
+            f"**{insight['condicao_mortos'] / insight['mortos'] * 100:.1f}%** do "
+            "total de vítimas fatais."
+        )
+    if insight["municipio"] is not None:
+        local = "no Brasil" if uf_filtro == todos else f"no estado de **{uf_filtro}**"
+        textos["mapa"] = (
+            f"A cidade com mais registros de acidentes é **{insight['municipio']}**, "
+            f"com um total de **{insight['municipio_acidentes']}** acidentes, "
+            f"representando **{insight['municipio_acidentes'] / total_acidentes * 100:.1f}%** "
+            f"do total de acidentes {local}."
+        )
+    if insight["uf_maior"] is not None:
+        if uf_filtro == todos:
+            texto = (
+                f"O estado com mais registros de acidentes é **{insight['uf_maior']}**, "
+                f"com um total de **{insight['uf_maior_acidentes']}** acidentes, "
+                f"representando **{insight['uf_maior_acidentes'] / total_acidentes * 100:.1f}%** "
+                "do total de acidentes no Brasil"
+            )
+            if insight["uf_segunda"] is not None:
+                texto += (
+                    f", seguido de **{insight['uf_segunda']}** com "
+                    f"**{insight['uf_segunda_acidentes']}** acidentes"
+                )
+            textos["estados"] = texto + (
+                ". Por outro lado, o estado com menor registro de acidentes é "
+                f"**{insight['uf_menor']}** com **{insight['uf_menor_acidentes']}** "
+                "acidentes."
+            )
+        else:
+            textos["estados"] = (
+                f"O estado de **{uf_filtro}** registrou um total de "
+                f"**{insight['uf_maior_acidentes']}** acidentes, representando "
+                f"**{insight['uf_maior_acidentes'] / total_brasil * 100:.1f}%** do "
+                "total de acidentes no Brasil."
+            )
+    if insight["feriado"] is not None:
+        quando = (
+            "em feriados" if insight["feriado"] == "Sim" else "quando não era feriado"
+        )
+        textos["feriados"] = (
+            f"A maioria dos acidentes (**{insight['feriado_acidentes']}** - "
+            f"**{insight['feriado_acidentes'] / total_acidentes * 100:.1f}%**) "
+            f"aconteceram {quando}."
+        )
+    return textos
+
+
+# Títulos das seções e dos gráficos no relatório estático
+titulos_relatorio = {
+    "top_causas": "Top 5 Causas Mais Comuns dos Acidentes",
+    "top_tipos": "Top 5 Tipos Mais Comuns de Acidentes",
+    "condicao_meteorologica": "Vítimas Fatais por Condição Meteorológica",
+    "municipios": "Municípios com Mais Acidentes",
+    "estados": "Número de Acidentes por Estado",
+    "feriados": "Número de Acidentes em Feriados",
+}
+
+# Texto do app mostrado junto a cada gráfico do relatório
+textos_graficos = {"municipios": "mapa"}
+
+
+# Função para gerar um relatório estático em Markdown de uma combinação de
+# filtros, sem executar o app: textos dos insights lidos do arquivo de insights
+# e tabelas dos gráficos consultadas no cubo
+
+
+def exportar_relatorio(caminho, cubo, filtros, destino):
+    insight = consultar_insights(caminho, filtros)
+    total_brasil = consultar_insights(caminho, {})["acidentes"]
+    textos = textos_insights(insight, filtros, total_brasil)
+    descricao = ", ".join(
+        f"{coluna}: {valor}"
+        for coluna, valor in zip(filtros_insights, chave_filtros(filtros))
+    )
+
+    linhas = [
+        "# Análise de Acidentes de Trânsito no Brasil",
+        "",
+        f"Filtros: {descricao}",
+        "",
+    ]
+    if insight is None:
+        linhas.append("Nenhum acidente encontrado para os filtros escolhidos.")
+    else:
+        linhas += [
+            f"Total de acidentes: **{insight['acidentes']}**; vítimas fatais: "
+            f"**{insight['mortos']}**.",
+            "",
+        ]
+        graficos = calcular_graficos_filtros(
+            functools.partial(consultar, cubo), filtros
+        )[1]
+        for grafico, titulo in titulos_relatorio.items():
+            dados = graficos[graficos["grafico"] == grafico]
+            linhas += [f"## {titulo}", "", "| Categoria | Valor |", "| --- | ---: |"]
+            linhas += [
+                f"| {categoria} | {valor} |"
+                for categoria, valor in zip(dados["categoria"], dados["valor"])
+            ]
+            texto = textos.get(textos_graficos.get(grafico, grafico))
+            linhas += ["", texto, ""] if texto else [""]
+
+    with open(destino, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas))
+    print("Relatório gravado em", destino)
+    return destino
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gera os insights de todas as combinações de filtros (ano, "
+        "mês, UF e tipo de acidente)."
+    )
+    parser.add_argument("--processos", type=int, help="Processos em paralelo")
+    parser.add_argument(
+        "--relatorio",
+        help="Em vez de gerar os insights, grava o relatório em Markdown de uma "
+        "combinação de filtros neste arquivo",
+    )
+    parser.add_argument("--ano", default=todos)
+    parser.add_argument("--mes", default=todos, help="Nome do mês (ex.: janeiro)")
+    parser.add_argument("--uf", default=todos)
+    parser.add_argument("--tipo", default=todos, help="Tipo de acidente")
+    args = parser.parse_args()
+
+    if args.relatorio:
+        caminho = arquivo_insights()
+        if caminho is None:
+            parser.error(
+                "Arquivo de insights ausente ou desatualizado; gere-o com "
+                "python insights.py"
+            )
+        exportar_relatorio(
+            caminho,
+            obter_cubo(),
+            {
+                "ano": args.ano if args.ano == todos else int(args.ano),
+                "nome_mes": args.mes,
+                "uf": args.uf,
+                "tipo_acidente": args.tipo,
+            },
+            args.relatorio,
+        )
+    else:
+        gerar_insights(max_workers=args.processos)
@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import pandas as pd
+
+# Arquivo do log estruturado das medições (um JSON por linha). Pode ser
+# definido pela variável PRF_LOG_METRICAS; sem ela, a consolidação grava o log
+# junto ao cache.
+arquivo_log = os.environ.get("PRF_LOG_METRICAS")
+log_file = "metricas.jsonl"
+
+# Medir também o pico de memória alocada (tracemalloc). Desligado por padrão,
+# porque deixa as etapas com muitos objetos Python várias vezes mais lentas;
+# ligar com PRF_MEDIR_MEMORIA=1. Uma vez ligado, o tracemalloc fica ativo até o
+# fim do processo.
+medir_memoria = os.environ.get("PRF_MEDIR_MEMORIA") == "1"
+
+# Medições mais recentes do processo, consultadas pelo painel de desempenho
+max_medicoes = 2000
+medicoes = deque(maxlen=max_medicoes)
+
+# Medições abertas (aninhadas) de cada thread, para combinar os picos de
+# memória. Por thread porque cada sessão do app roda em uma thread, e uma
+# execução interrompida (rerun) deixa a sua seção aberta.
+estado_thread = threading.local()
+
+
+# Função para obter as medições abertas da thread atual
+
+
+def medicoes_abertas():
+    if not hasattr(estado_thread, "abertas"):
+        estado_thread.abertas = []
+    return estado_thread.abertas
+
+
+# Função para definir o arquivo do log (a variável PRF_LOG_METRICAS tem
+# prioridade)
+
+
+def definir_arquivo_log(caminho):
+    global arquivo_log
+    if "PRF_LOG_METRICAS" not in os.environ:
+        arquivo_log = caminho
+
+
+# Função para iniciar a medição de uma etapa. Retorna o registro, que deve ser
+# passado para finalizar_medicao.
+
+
+def iniciar_medicao(etapa, grupo="pipeline", linhas_entrada=None, **contexto):
+    aberta = {
+        "registro": {
+            "grupo": grupo,
+            "etapa": etapa,
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "linhas_entrada": linhas_entrada,
+            "linhas_saida": None,
+            **contexto,
+        },
+        "memoria": medir_memoria,
+    }
+    abertas = medicoes_abertas()
+    if aberta["memoria"]:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        atual, pico = tracemalloc.get_traced_memory()
+        # O pico até aqui pertence às medições que já estavam abertas
+        for anterior in abertas:
+            anterior["pico"] = max(anterior.get("pico", 0), pico)
+        tracemalloc.reset_peak()
+        aberta["memoria_inicial"] = atual
+        aberta["pico"] = atual
+
+    abertas.append(aberta)
+    aberta["inicio"] = time.perf_counter()
+    return aberta["registro"]
+
+
+# Função para finalizar a medição: tempo de parede, linhas de saída e pico de
+# memória alocada durante a etapa (em MB, acima da memória no início).
+# Com registrar=False, o registro só é devolvido (ex.: medição feita em outro
+# processo e registrada pelo processo principal).
+
+
+def finalizar_medicao(registro, linhas_saida=None, registrar=True):
+    fim = time.perf_counter()
+    abertas = medicoes_abertas()
+    aberta = next(a for a in abertas if a["registro"] is registro)
+    abertas.remove(aberta)
+
+    registro["segundos"] = round(fim - aberta["inicio"], 4)
+    if linhas_saida is not None:
+        registro["linhas_saida"] = linhas_saida
+    registro["pico_memoria_mb"] = None
+    if aberta["memoria"] and tracemalloc.is_tracing():
+        pico = max(aberta["pico"], tracemalloc.get_traced_memory()[1])
+        registro["pico_memoria_mb"] = round((pico - aberta["memoria_inicial"]) / 1e6, 2)
+        for anterior in abertas:
+            anterior["pico"] = max(anterior.get("pico", 0), pico)
+
+    if registrar:
+        registrar_medicao(registro)
+    return registro
+
+
+# Função para descartar as medições abertas da thread (ex.: após um erro no
+# meio do pipeline)
+
+
+def descartar_medicoes_abertas():
+    medicoes_abertas().clear()
+
+
+# Contexto para medir um bloco de código; o bloco pode preencher
+# registro["linhas_saida"]
+
+
+@contextmanager
+def medir(etapa, grupo="pipeline", linhas_entrada=None, **contexto):
+    registro = iniciar_medicao(etapa, grupo, linhas_entrada, **contexto)
+    try:
+        yield registro
+    finally:
+        finalizar_medicao(registro)
+
+
+# Função para guardar uma medição em memória e no log estruturado
+
+
+def registrar_medicao(registro):
+    medicoes.append(registro)
+    if arquivo_log is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(arquivo_log) or ".", exist_ok=True)
+        with open(arquivo_log, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+    except OSError as e:
+        print(f"Não foi possível gravar a medição em {arquivo_log}: {e}")
+
+
+# Função para obter as medições recentes (opcionalmente de um grupo) como
+# DataFrame
+
+
+def medicoes_recentes(grupo=None, execucao=None):
+    registros = [
+        registro
+        for registro in medicoes
+        if (grupo is None or registro["grupo"] == grupo)
+        and (execucao is None or registro.get("execucao") == execucao)
+    ]
+    return pd.DataFrame(registros)
+
+
+# Função para imprimir o resumo das medições de uma execução
+
+
+def imprimir_resumo(registros):
+    for registro in registros:
+        memoria = (
+            f", pico de {registro['pico_memoria_mb']:.1f} MB"
+            if registro.get("pico_memoria_mb") is not None
+            else ""
+        )
+        linhas = (
+            f", {registro['linhas_entrada']} -> {registro['linhas_saida']} linhas"
+            if registro.get("linhas_entrada") is not None
+            else ""
+        )
+        print(
+            f"Etapa {registro['etapa']}: {registro['segundos']:.3f} s{linhas}{memoria}."
+        )
@@ -0,0 +1,275 @@
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from dedup import (
+    adicionar_chaves,
+    buscar_chaves,
+    carregar_chaves_vistas,
+    chaves_vazias,
+    hash_chaves,
+    salvar_chaves_vistas,
+)
+
+# Manifesto com o que foi processado de cada arquivo de entrada (gravado junto
+# ao cache consolidado)
+manifesto_file = "manifesto.json"
+
+# Subdiretório do cache com as chaves vistas de cada arquivo de entrada
+chaves_dir = "chaves_por_arquivo"
+
+# Subdiretório do cache com as contagens de valores (antes da imputação) de cada
+# arquivo de entrada, somadas para recalcular as estatísticas de imputação
+contagens_dir = "contagens_por_arquivo"
+
+
+# Função para ler o manifesto (None se não existir)
+
+
+def ler_manifesto(cache_dir):
+    caminho = os.path.join(cache_dir, manifesto_file)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Função para gravar o manifesto de forma atômica
+
+
+def gravar_manifesto(cache_dir, manifesto):
+    os.makedirs(cache_dir, exist_ok=True)
+    caminho = os.path.join(cache_dir, manifesto_file)
+    tmp_path = caminho + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, caminho)
+    return caminho
+
+
+# Função para criar um manifesto vazio
+
+
+def novo_manifesto(pipeline_version):
+    return {"pipeline_version": pipeline_version, "arquivos": {}, "processamentos": []}
+
+
+# Função para indicar o arquivo de origem (posição na lista de arquivos) de cada
+# linha do DataFrame concatenado
+
+
+def origem_linhas(dataframes):
+    return np.repeat(np.arange(len(dataframes)), [len(df) for df in dataframes])
+
+
+# Função para contar os valores nulos de cada arquivo de origem
+
+
+def nulos_por_arquivo(df, origem, nomes):
+    nulos = df.isnull().groupby(origem).sum()
+    return {
+        nomes[i]: {coluna: int(n) for coluna, n in linha.items()}
+        for i, linha in nulos.iterrows()
+    }
+
+
+# Função para contar os valores das colunas imputáveis em cada arquivo de origem
+# ({nome: {coluna: Series valor -> contagem}}; nulos não são contados). Cada
+# coluna é fatorada uma vez e contada por (arquivo, valor) com bincount.
+
+
+def contagens_por_arquivo(df, origem, nomes, colunas):
+    contagens = {nome: {} for nome in nomes}
+    for coluna in colunas:
+        codigos, valores = pd.factorize(df[coluna])
+        validos = codigos >= 0
+        matriz = np.bincount(
+            origem[validos] * len(valores) + codigos[validos],
+            minlength=len(nomes) * len(valores),
+        ).reshape(len(nomes), len(valores))
+        for i, nome in enumerate(nomes):
+            presentes = matriz[i] > 0
+            if presentes.any():
+                contagens[nome][coluna] = pd.Series(
+                    matriz[i][presentes], index=valores[presentes]
+                )
+    return contagens
+
+
+# Função para obter os nulos que restaram em cada arquivo após a imputação: as
+# colunas imputadas ficam zeradas e as demais mantêm a contagem original
+
+
+def nulos_restantes(nulos_arquivos, null_info_after):
+    return {
+        nome: {
+            coluna: n if null_info_after.get(coluna, 0) > 0 else 0
+            for coluna, n in nulos.items()
+        }
+        for nome, nulos in nulos_arquivos.items()
+    }
+
+
+# Função para separar, por arquivo de origem, as chaves mantidas na deduplicação
+# (com o hash do conteúdo guardado no conjunto de chaves vistas)
+
+
+def chaves_por_arquivo(serie_chave, origem, nomes, vistos):
+    chaves = hash_chaves(serie_chave)
+    encontradas, conteudos = buscar_chaves(vistos, chaves)
+    return {
+        nome: adicionar_chaves(
+            chaves_vazias(),
+            chaves[encontradas & (origem == i)],
+            conteudos[encontradas & (origem == i)],
+        )
+        for i, nome in enumerate(nomes)
+    }
+
+
+# Função para resumir, por arquivo de origem, as linhas gravadas e os anos
+# (partições) em que elas ficaram
+
+
+def resumo_por_arquivo(serie_ano, origem, nomes):
+    anos = pd.Series(serie_ano.to_numpy()).groupby(origem)
+    resumo = {nome: {"anos": [], "linhas_gravadas": 0} for nome in nomes}
+    for i, grupo in anos:
+        resumo[nomes[i]] = {
+            "anos": sorted(int(ano) for ano in grupo.unique()),
+            "linhas_gravadas": int(len(grupo)),
+        }
+    return resumo
+
+
+# Função para gravar as chaves vistas de cada arquivo de origem
+
+
+def salvar_chaves_arquivos(cache_dir, chaves):
+    diretorio = os.path.join(cache_dir, chaves_dir)
+    for nome, vistos in chaves.items():
+        salvar_chaves_vistas(diretorio, vistos, nome=f"{nome}.npz")
+
+
+# Função para unir as chaves vistas de vários arquivos em um único conjunto
+
+
+def unir_chaves(cache_dir, nomes):
+    vistos = chaves_vazias()
+    diretorio = os.path.join(cache_dir, chaves_dir)
+    for nome in nomes:
+        chaves = carregar_chaves_vistas(diretorio, nome=f"{nome}.npz")
+        vistos = adicionar_chaves(vistos, chaves["chaves"], chaves["conteudos"])
+    return vistos
+
+
+# Função para remover do cache as chaves de arquivos que não existem mais
+
+
+def remover_chaves_arquivos(cache_dir, nomes):
+    for nome in nomes:
+        caminho = os.path.join(cache_dir, chaves_dir, f"{nome}.npz")
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+# Função para gravar as contagens de valores de cada arquivo de origem (JSON com
+# listas de valores e contagens, que preservam os tipos numéricos e de texto)
+
+
+def salvar_contagens_arquivos(cache_dir, contagens):
+    diretorio = os.path.join(cache_dir, contagens_dir)
+    os.makedirs(diretorio, exist_ok=True)
+    for nome, colunas in contagens.items():
+        conteudo = {
+            coluna: {"valores": vc.index.tolist(), "contagens": vc.tolist()}
+            for coluna, vc in colunas.items()
+        }
+        caminho = os.path.join(diretorio, f"{nome}.json")
+        with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(conteudo, f, ensure_ascii=False)
+        os.replace(caminho + ".tmp", caminho)
+
+
+# Função para carregar as contagens de valores de vários arquivos (None se
+# faltar a de algum deles, ex.: cache gravado por uma versão anterior)
+
+
+def carregar_contagens_arquivos(cache_dir, nomes):
+    contagens = []
+    for nome in nomes:
+        caminho = os.path.join(cache_dir, contagens_dir, f"{nome}.json")
+        if not os.path.exists(caminho):
+            return None
+        with open(caminho, encoding="utf-8") as f:
+            conteudo = json.load(f)
+        contagens.append(
+            {
+                coluna: pd.Series(valores["contagens"], index=valores["valores"])
+                for coluna, valores in conteudo.items()
+            }
+        )
+    return contagens
+
+
+# Função para remover do cache as contagens de arquivos que não existem mais
+
+
+def remover_contagens_arquivos(cache_dir, nomes):
+    for nome in nomes:
+        caminho = os.path.join(cache_dir, contagens_dir, f"{nome}.json")
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+
+# Função para atualizar as entradas do manifesto dos arquivos processados.
+# "arquivos" é a assinatura com hash de cada arquivo (cache.calcular_fingerprint)
+# e os demais dicionários são indexados pelo nome do arquivo.
+
+
+def registrar_arquivos(
+    manifesto, arquivos, linhas_lidas, nulos_antes, nulos_depois, resumo
+):
+    for arquivo in arquivos:
+        nome = os.path.basename(arquivo["path"])
+        if nome not in resumo:
+            continue
+        manifesto["arquivos"][nome] = {
+            **arquivo,
+            "linhas_lidas": int(linhas_lidas.get(nome, 0)),
+            **resumo[nome],
+            "nulos_antes": nulos_antes.get(nome, {}),
+            "nulos_depois": nulos_depois.get(nome, {}),
+            "processado_em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+    return manifesto
+
+
+# Função para registrar no histórico do manifesto uma execução da consolidação
+
+
+def registrar_processamento(manifesto, modo, nomes, anos, segundos):
+    manifesto["processamentos"].append(
+        {
+            "modo": modo,
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "arquivos": list(nomes),
+            "anos": sorted(int(ano) for ano in anos),
+            "segundos": round(segundos, 3),
+        }
+    )
+    return manifesto
+
+
+# Função para somar a contagem de nulos ("nulos_antes" ou "nulos_depois") de
+# todos os arquivos do manifesto
+
+
+def total_nulos(manifesto, campo):
+    total = pd.Series(dtype="int64")
+    for entrada in manifesto["arquivos"].values():
+        total = total.add(pd.Series(entrada[campo], dtype="int64"), fill_value=0)
+    return total.astype("int64")
@@ -0,0 +1,113 @@
+from itertools import combinations_with_replacement
+
+import numpy as np
+import pandas as pd
+
+# Variáveis numéricas da matriz de correlação
+variaveis_correlacao = [
+    "pessoas",
+    "mortos",
+    "feridos_leves",
+    "feridos_graves",
+    "ilesos",
+    "feridos",
+    "veiculos",
+]
+
+# Pares de variáveis (incluindo cada variável com ela mesma, para as somas dos
+# quadrados)
+pares_correlacao = list(combinations_with_replacement(variaveis_correlacao, 2))
+
+
+# Função para obter o nome da coluna com a soma de uma variável
+
+
+def coluna_soma(variavel):
+    return f"soma_{variavel}"
+
+
+# Função para obter o nome da coluna com a soma dos produtos de um par
+
+
+def coluna_produto(variavel_a, variavel_b):
+    return f"produto_{variavel_a}_{variavel_b}"
+
+
+# Estatísticas suficientes da correlação: contagem, somas e somas dos produtos.
+# Como são somas, as de várias células (partições, filtros) podem ser somadas.
+medidas_momentos = (
+    ["n"]
+    + [coluna_soma(variavel) for variavel in variaveis_correlacao]
+    + [coluna_produto(a, b) for a, b in pares_correlacao]
+)
+
+
+# Função para calcular as estatísticas suficientes por grupo. As somas são
+# feitas com np.bincount sobre o código de cada grupo, sem materializar uma
+# coluna por produto. As variáveis são inteiras e sem nulos após a
+# consolidação, então as somas em float64 são exatas.
+
+
+def agregar_momentos(df, dimensoes):
+    agrupado = df.groupby(dimensoes, observed=True)
+    tabela = agrupado.size().rename("n").reset_index()
+    grupos = len(tabela)
+
+    # Linhas com dimensão nula ficam fora dos grupos (código nulo)
+    codigos = agrupado.ngroup().to_numpy(dtype="float64")
+    validas = ~np.isnan(codigos)
+    codigos = codigos[validas].astype(np.int64)
+    valores = {
+        variavel: df[variavel].to_numpy(dtype="float64")[validas]
+        for variavel in variaveis_correlacao
+    }
+    for variavel in variaveis_correlacao:
+        tabela[coluna_soma(variavel)] = np.bincount(
+            codigos, weights=valores[variavel], minlength=grupos
+        )
+    for a, b in pares_correlacao:
+        tabela[coluna_produto(a, b)] = np.bincount(
+            codigos, weights=valores[a] * valores[b], minlength=grupos
+        )
+    return tabela
+
+
+# Função para calcular a matriz de correlação de Pearson a partir das
+# estatísticas suficientes somadas (Series indexada por medidas_momentos).
+# Variáveis constantes ficam com correlação nula (NaN), como no pandas.
+
+
+def correlacao_momentos(momentos):
+    n = float(momentos["n"])
+    somas = np.array([momentos[coluna_soma(v)] for v in variaveis_correlacao])
+    produtos = np.zeros((len(variaveis_correlacao), len(variaveis_correlacao)))
+    posicao = {variavel: i for i, variavel in enumerate(variaveis_correlacao)}
+    for a, b in pares_correlacao:
+        produtos[posicao[a], posicao[b]] = momentos[coluna_produto(a, b)]
+        produtos[posicao[b], posicao[a]] = momentos[coluna_produto(a, b)]
+
+    # n * cov(a, b) * n, sem dividir antes para manter a exatidão das somas
+    covariancias = n * produtos - np.outer(somas, somas)
+    desvios = np.sqrt(np.diag(covariancias))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        correlacao = covariancias / np.outer(desvios, desvios)
+    correlacao[np.outer(desvios, desvios) == 0] = np.nan
+    return pd.DataFrame(
+        np.clip(correlacao, -1, 1),
+        index=variaveis_correlacao,
+        columns=variaveis_correlacao,
+    )
+
+
+# Expressões SQL das estatísticas suficientes (backend DuckDB)
+
+
+def expressoes_momentos_sql():
+    expressoes = {"n": "count(*)"}
+    for variavel in variaveis_correlacao:
+        expressoes[coluna_soma(variavel)] = f"sum(CAST({variavel} AS DOUBLE))"
+    for a, b in pares_correlacao:
+        expressoes[coluna_produto(a, b)] = (
+            f"sum(CAST({a} AS DOUBLE) * CAST({b} AS DOUBLE))"
+        )
+    return expressoes
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+# Escala da chave (br, km) combinada em um único número: maior que qualquer km
+# de rodovia somado ao maior trecho consultado
+escala_chave = 100000.0
+
+
+# Função para combinar rodovia e km em uma chave ordenável
+
+
+def chave_trecho(br, km):
+    return np.asarray(br, dtype="float64") * escala_chave + np.asarray(
+        km, dtype="float64"
+    )
+
+
+# Função para construir o índice de trechos de rodovia: as linhas com br e km
+# válidos são ordenadas por (br, km), com a soma acumulada dos mortos para
+# contar qualquer trecho com duas buscas binárias. Rodovia e km não são imputados
+# (data_processing.colunas_sem_imputacao): acidentes sem eles na fonte ficam
+# nulos e, portanto, fora dos trechos.
+
+
+def construir_indice_rodovias(df):
+    br = df["br"].to_numpy()
+    km = df["km"].to_numpy()
+    validas = np.flatnonzero(pd.notna(br) & pd.notna(km) & (br > 0) & (km >= 0))
+
+    # km em float32: arredondar para que os limites dos trechos sejam exatos
+    chaves = chave_trecho(br[validas], np.round(km[validas].astype("float64"), 3))
+    ordem = np.argsort(chaves, kind="stable")
+    mortos = df["mortos"].to_numpy()[validas][ordem].astype(np.int64)
+    return {
+        "linhas": len(df),
+        "chaves": chaves[ordem],
+        "posicoes": validas[ordem].astype(np.int64),
+        "mortos_acumulados": np.concatenate(([0], np.cumsum(mortos))),
+        "brs": np.unique(br[validas]).astype(int).tolist(),
+    }
+
+
+# Função para obter o intervalo (nos arrays ordenados) das linhas de um trecho
+# [km_inicial, km_final] de uma rodovia
+
+
+def intervalo_trecho(indice, br, km_inicial, km_final):
+    inicio = np.searchsorted(
+        indice["chaves"], chave_trecho(br, km_inicial), side="left"
+    )
+    fim = np.searchsorted(indice["chaves"], chave_trecho(br, km_final), side="right")
+    return int(inicio), int(fim)
+
+
+# Função para contar os acidentes e mortos de um trecho de rodovia. Sem máscara
+# de filtros, a contagem é O(log n); com máscara (booleana, por linha do
+# DataFrame), só as linhas do trecho são percorridas.
+
+
+def contar_trecho(indice, br, km_inicial, km_final, mascara=None):
+    inicio, fim = intervalo_trecho(indice, br, km_inicial, km_final)
+    if mascara is None:
+        acumulados = indice["mortos_acumulados"]
+        return {
+            "acidentes": fim - inicio,
+            "mortos": int(acumulados[fim] - acumulados[inicio]),
+        }
+
+    selecionadas = mascara[indice["posicoes"][inicio:fim]]
+    mortos = np.diff(indice["mortos_acumulados"][inicio : fim + 1])
+    return {
+        "acidentes": int(selecionadas.sum()),
+        "mortos": int(mortos[selecionadas].sum()),
+    }
+
+
+# Função para obter as posições (no DataFrame) dos acidentes de um trecho
+
+
+def posicoes_trecho(indice, br, km_inicial, km_final, mascara=None):
+    inicio, fim = intervalo_trecho(indice, br, km_inicial, km_final)
+    posicoes = indice["posicoes"][inicio:fim]
+    if mascara is not None:
+        posicoes = posicoes[mascara[posicoes]]
+    return np.sort(posicoes)
+
+
+# Função para encontrar os trechos críticos: janelas deslizantes de
+# "extensao_km" que começam em cada acidente, ordenadas pela medida
+# ("acidentes" ou "mortos"). Os trechos escolhidos não se sobrepõem.
+# Sem "br", considera todas as rodovias.
+
+
+def trechos_criticos(
+    indice, extensao_km=10, quantidade=20, br=None, medida="mortos", mascara=None
+):
+    chaves = indice["chaves"]
+    mortos = np.diff(indice["mortos_acumulados"])
+    if br is not None:
+        inicio, fim = intervalo_trecho(indice, br, 0, escala_chave - extensao_km)
+        chaves, mortos = chaves[inicio:fim], mortos[inicio:fim]
+        selecionadas = slice(inicio, fim)
+    else:
+        selecionadas = slice(None)
+    if mascara is not None:
+        filtro = mascara[indice["posicoes"][selecionadas]]
+        chaves, mortos = chaves[filtro], mortos[filtro]
+
+    # Cada janela vai do acidente i até o último acidente a menos de extensao_km
+    fins = np.searchsorted(chaves, chaves + extensao_km, side="left")
+    inicios = np.arange(len(chaves))
+    acumulados = np.concatenate(([0], np.cumsum(mortos)))
+    valores = {
+        "acidentes": fins - inicios,
+        "mortos": acumulados[fins] - acumulados[inicios],
+    }
+
+    # Escolha gulosa das melhores janelas que não se sobrepõem às já escolhidas
+    ordem = np.lexsort((chaves, -valores[medida]))
+    escolhidas = []
+    for i in ordem:
+        if len(escolhidas) == quantidade or valores[medida][i] == 0:
+            break
+        if all(abs(chaves[i] - chaves[j]) >= extensao_km for j in escolhidas):
+            escolhidas.append(i)
+
+    escolhidas = np.array(escolhidas, dtype=np.int64)
+    br_trecho = np.floor(chaves[escolhidas] / escala_chave)
+    km_inicial = chaves[escolhidas] - br_trecho * escala_chave
+    return pd.DataFrame(
+        {
+            "br": br_trecho.astype("int64"),
+            "km_inicial": km_inicial.round(1),
+            "km_final": (km_inicial + extensao_km).round(1),
+            "acidentes": valores["acidentes"][escolhidas].astype("int64"),
+            "mortos": valores["mortos"][escolhidas].astype("int64"),
+        }
+    )
@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+# Ordem dos dias da semana (mesma usada no mapa de calor do app)
+dias_da_semana_ordem = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+# Nomes dos meses, na ordem do calendário (valores da coluna 'nome_mes')
+nomes_meses = [
+    "janeiro",
+    "fevereiro",
+    "março",
+    "abril",
+    "maio",
+    "junho",
+    "julho",
+    "agosto",
+    "setembro",
+    "outubro",
+    "novembro",
+    "dezembro",
+]
+
+# Esquema compacto do DataFrame consolidado.
+# "category": texto com poucos valores distintos; inteiros: menor tipo desejado
+# (promovido automaticamente se os valores não couberem); "bool": colunas Sim/Não.
+schema_consolidado = {
+    "uf": "category",
+    "municipio": "category",
+    "causa_acidente": "category",
+    "tipo_acidente": "category",
+    "classificacao_acidente": "category",
+    "fase_dia": "category",
+    "sentido_via": "category",
+    "condicao_metereologica": "category",
+    "tipo_pista": "category",
+    "tracado_via": "category",
+    "uso_solo": "category",
+    "regional": "category",
+    "delegacia": "category",
+    "uop": "category",
+    # No máximo 86400 horários distintos (na prática, poucos milhares): como
+    # categoria, a coluna fica em códigos inteiros e é compartilhada sem cópia
+    # no arquivo Arrow
+    "horario": "category",
+    "dia_semana": "category",
+    "nome_mes": "category",
+    "periodo_dia": "category",
+    "faixa_pessoas": "category",
+    "feriado": "bool",
+    "ano": "int16",
+    "mes": "int8",
+    "br": "int16",
+    "pessoas": "int16",
+    "mortos": "int8",
+    "feridos_leves": "int8",
+    "feridos_graves": "int8",
+    "ilesos": "int16",
+    "ignorados": "int8",
+    "feridos": "int16",
+    "veiculos": "int8",
+    "km": "float32",
+    "latitude": "float32",
+    "longitude": "float32",
+}
+
+# Sequência de promoção dos inteiros quando os valores não cabem no tipo desejado
+promocao_inteiros = ["int8", "int16", "int32", "int64"]
+
+
+# Função para escolher o menor tipo inteiro (a partir do desejado) que comporta a coluna
+
+
+def tipo_inteiro(serie, tipo):
+    minimo, maximo = serie.min(), serie.max()
+    for candidato in promocao_inteiros[promocao_inteiros.index(tipo) :]:
+        info = np.iinfo(candidato)
+        if info.min <= minimo and maximo <= info.max:
+            return candidato
+    return "int64"
+
+
+# Função para converter uma coluna para o tipo do esquema
+
+
+def converter_coluna(serie, tipo, coluna):
+    if tipo == "category":
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            return serie
+        if coluna == "dia_semana":
+            return pd.Categorical(serie, categories=dias_da_semana_ordem, ordered=True)
+        return serie.astype("category")
+
+    if tipo == "bool":
+        if serie.dtype == bool:
+            return serie
+        return serie.eq("Sim")
+
+    if tipo.startswith("int"):
+        # Colunas com nulos ou valores não inteiros ficam como estão
+        if serie.isnull().any() or not np.array_equal(serie, serie.round()):
+            return serie
+        return serie.astype(tipo_inteiro(serie, tipo))
+
+    return serie.astype(tipo)
+
+
+# Função para gerar o relatório de memória por coluna (bytes antes/depois)
+
+
+def relatorio_memoria(bytes_antes, df):
+    bytes_depois = df.memory_usage(deep=True, index=False)
+    relatorio = pd.DataFrame(
+        {
+            "dtype": df.dtypes.astype(str),
+            "bytes_antes": bytes_antes,
+            "bytes_depois": bytes_depois,
+        }
+    )
+    relatorio["reducao"] = 1 - relatorio["bytes_depois"] / relatorio["bytes_antes"]
+    return relatorio.sort_values("bytes_antes", ascending=False)
+
+
+# Função para aplicar o esquema compacto ao DataFrame consolidado.
+# "tipos" permite fixar o tipo de colunas específicas (ex.: no modo streaming,
+# para que todos os blocos tenham o mesmo esquema).
+# Retorna o DataFrame convertido e o relatório de memória.
+
+
+def compactar_dataframe(df, tipos=None):
+    bytes_antes = df.memory_usage(deep=True, index=False)
+
+    df = df.copy()
+    for coluna, tipo in schema_consolidado.items():
+        if coluna in df.columns:
+            tipo = (tipos or {}).get(coluna, tipo)
+            df[coluna] = converter_coluna(df[coluna], tipo, coluna)
+
+    # Meses ordenados pelo número do mês, não alfabeticamente
+    if (
+        "nome_mes" in df.columns
+        and "mes" in df.columns
+        and not df["nome_mes"].cat.ordered
+    ):
+        ordem_meses = (
+            df[["mes", "nome_mes"]]
+            .drop_duplicates()
+            .sort_values("mes")["nome_mes"]
+            .astype(str)
+            .tolist()
+        )
+        df["nome_mes"] = df["nome_mes"].cat.reorder_categories(
+            ordem_meses, ordered=True
+        )
+
+    relatorio = relatorio_memoria(bytes_antes, df)
+    return df, relatorio
@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Limite de memória (em MB) do cache de resultados das seções do app; pode ser
+# alterado pela variável PRF_LIMITE_CACHE_SECOES_MB
+limite_cache_mb = float(os.environ.get("PRF_LIMITE_CACHE_SECOES_MB", "256"))
+
+
+# Função para criar um cache LRU limitado pelo tamanho estimado dos resultados
+
+
+def novo_cache(limite_mb=None):
+    return {
+        "entradas": OrderedDict(),
+        "bytes": 0,
+        "limite": int((limite_cache_mb if limite_mb is None else limite_mb) * 1e6),
+        "lock": threading.Lock(),
+        "acertos": 0,
+        "falhas": 0,
+        "descartes": 0,
+    }
+
+
+# Função para estimar a memória ocupada por um resultado (em bytes).
+# DataFrames e arrays pelo tamanho dos dados; figuras do plotly pelo tamanho
+# do JSON enviado ao navegador; tuplas, listas e dicionários pela soma dos itens.
+
+
+def tamanho_objeto(valor):
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return int(np.sum(valor.memory_usage(deep=True)))
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(
+            tamanho_objeto(item) for item in valor.values()
+        )
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(tamanho_objeto(item) for item in valor)
+    if hasattr(valor, "to_plotly_json"):
+        return len(valor.to_json(validate=False))
+    return sys.getsizeof(valor)
+
+
+# Função para obter o resultado de uma chave, calculando-o apenas se ainda não
+# estiver no cache. Os mais antigos (menos usados) são descartados até que o
+# total caiba no limite; um resultado maior que o limite não é guardado.
+# O resultado é compartilhado entre as chamadas e não deve ser alterado.
+
+
+def memoizar(cache, chave, calcular):
+    with cache["lock"]:
+        if chave in cache["entradas"]:
+            cache["entradas"].move_to_end(chave)
+            cache["acertos"] += 1
+            return cache["entradas"][chave][0]
+        cache["falhas"] += 1
+
+    # Calculado fora do lock, para não bloquear as outras sessões
+    valor = calcular()
+    tamanho = tamanho_objeto(valor)
+    if tamanho > cache["limite"]:
+        return valor
+
+    with cache["lock"]:
+        if chave not in cache["entradas"]:
+            cache["entradas"][chave] = (valor, tamanho)
+            cache["bytes"] += tamanho
+        while cache["bytes"] > cache["limite"]:
+            _, (_, descartado) = cache["entradas"].popitem(last=False)
+            cache["bytes"] -= descartado
+            cache["descartes"] += 1
+    return valor
+
+
+# Função para esvaziar o cache
+
+
+def limpar_cache(cache):
+    with cache["lock"]:
+        cache["entradas"].clear()
+        cache["bytes"] = 0
+
+
+# Função para obter o uso do cache (entradas, memória e taxa de acertos)
+
+
+def estatisticas_cache(cache):
+    with cache["lock"]:
+        consultas = cache["acertos"] + cache["falhas"]
+        return {
+            "entradas": len(cache["entradas"]),
+            "memoria_mb": round(cache["bytes"] / 1e6, 2),
+            "limite_mb": round(cache["limite"] / 1e6, 2),
+            "acertos": cache["acertos"],
+            "falhas": cache["falhas"],
+            "descartes": cache["descartes"],
+            "taxa_acertos": (
+                round(cache["acertos"] / consultas, 3) if consultas else None
+            ),
+        }
@@ -0,0 +1,57 @@
+import os
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# Arquivo Arrow IPC (sem compressão) com o DataFrame consolidado, aberto por
+# mapeamento de memória: as páginas do arquivo ficam no cache do sistema
+# operacional e são compartilhadas por todos os processos que o abrem (sessões
+# do app em outros servidores, processos de trabalho, scripts)
+arrow_file = "dados_consolidados.arrow"
+
+# Chave do cache gravada nos metadados do arquivo, para não abrir um arquivo de
+# outra versão dos dados
+chave_metadados = b"chave"
+
+
+# Função para publicar o DataFrame consolidado como arquivo Arrow IPC. O arquivo
+# é gravado com outro nome e depois substituído de forma atômica: quem já está
+# com o arquivo anterior mapeado continua lendo a versão antiga.
+
+
+def publicar_dataset(df, cache_dir, chave):
+    caminho = os.path.join(cache_dir, arrow_file)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.replace_schema_metadata(
+        {**(tabela.schema.metadata or {}), chave_metadados: chave.encode()}
+    )
+    with pa.OSFile(temporario, "wb") as destino:
+        with ipc.new_file(destino, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+# Função para abrir o arquivo publicado sem copiar os dados (None se não existir
+# ou for de outra chave). As colunas numéricas, de data e os códigos das
+# categorias apontam para o arquivo mapeado e são somente leitura; apenas as
+# colunas bool (bits no Arrow) e de texto não categórico são copiadas.
+
+
+def abrir_dataset(cache_dir, chave=None):
+    caminho = os.path.join(cache_dir, arrow_file)
+    if not os.path.exists(caminho):
+        return None
+
+    try:
+        tabela = ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+    except (OSError, pa.ArrowInvalid) as e:
+        print(f"Não foi possível abrir {caminho}: {e}")
+        return None
+    metadados = tabela.schema.metadata or {}
+    if chave is not None and metadados.get(chave_metadados) != chave.encode():
+        return None
+
+    return tabela.to_pandas(split_blocks=True)
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+
+# Limites aproximados do território brasileiro (incluindo as ilhas oceânicas);
+# coordenadas fora deles são ignoradas no mapa
+limites_latitude = (-34.0, 6.0)
+limites_longitude = (-74.5, -28.5)
+
+# Resoluções da grade do mapa, em graus (~55 km e ~11 km no equador)
+resolucoes_grade = [0.5, 0.1]
+
+# Número máximo aproximado de células no maior lado da área exibida
+max_celulas_lado = 80
+
+
+# Função para obter o nome do cuboide da grade em uma resolução
+
+
+def nome_grade(resolucao):
+    return f"grade_{round(resolucao * 100):03d}"
+
+
+# Função para obter os nomes das colunas com a célula (latitude, longitude) de
+# cada acidente em uma resolução
+
+
+def colunas_celula(resolucao):
+    sufixo = f"{round(resolucao * 100):03d}"
+    return f"celula_lat_{sufixo}", f"celula_lon_{sufixo}"
+
+
+# Função para identificar as coordenadas válidas (dentro do território)
+
+
+def coordenadas_validas(df):
+    return (
+        df["latitude"].between(*limites_latitude)
+        & df["longitude"].between(*limites_longitude)
+    ).to_numpy()
+
+
+# Função para preparar as colunas espaciais usadas no cubo: indicador de
+# coordenada válida, latitude/longitude válidas em float64 (para as somas dos
+# centroides) e a célula de cada acidente em todas as resoluções da grade
+# (nula quando a coordenada é inválida)
+
+
+def colunas_espaciais(df):
+    validas = coordenadas_validas(df)
+    latitude = df["latitude"].astype("float64").where(validas)
+    longitude = df["longitude"].astype("float64").where(validas)
+
+    colunas = {
+        "com_coordenadas": validas.astype("int8"),
+        "latitude_valida": latitude,
+        "longitude_valida": longitude,
+    }
+    for resolucao in resolucoes_grade:
+        coluna_lat, coluna_lon = colunas_celula(resolucao)
+        colunas[coluna_lat] = np.floor(latitude / resolucao).astype("Int32")
+        colunas[coluna_lon] = np.floor(longitude / resolucao).astype("Int32")
+    return pd.DataFrame(colunas, index=df.index)
+
+
+# Expressões SQL equivalentes às colunas espaciais (backend DuckDB). As
+# coordenadas são gravadas em float32: a divisão é feita em DOUBLE, como no
+# pandas, para que as células coincidam nos dois backends.
+
+
+def expressoes_sql():
+    validas = (
+        f"latitude BETWEEN {limites_latitude[0]} AND {limites_latitude[1]} "
+        f"AND longitude BETWEEN {limites_longitude[0]} AND {limites_longitude[1]}"
+    )
+    dimensoes = {}
+    for resolucao in resolucoes_grade:
+        coluna_lat, coluna_lon = colunas_celula(resolucao)
+        dimensoes[coluna_lat] = (
+            f"CASE WHEN {validas} THEN "
+            f"CAST(floor(CAST(latitude AS DOUBLE) / {resolucao}) AS INTEGER) END"
+        )
+        dimensoes[coluna_lon] = (
+            f"CASE WHEN {validas} THEN "
+            f"CAST(floor(CAST(longitude AS DOUBLE) / {resolucao}) AS INTEGER) END"
+        )
+    medidas = {
+        "com_coordenadas": f"count(*) FILTER (WHERE {validas})",
+        "soma_latitude": f"sum(CAST(latitude AS DOUBLE)) FILTER (WHERE {validas})",
+        "soma_longitude": f"sum(CAST(longitude AS DOUBLE)) FILTER (WHERE {validas})",
+    }
+    return dimensoes, medidas
+
+
+# Função para converter o resultado agregado (por município ou por célula) em
+# pontos do mapa: cada ponto fica no centroide real dos acidentes agregados
+
+
+def pontos_mapa(agregado):
+    pontos = agregado[agregado["com_coordenadas"] > 0].copy()
+    pontos["latitude"] = pontos["soma_latitude"] / pontos["com_coordenadas"]
+    pontos["longitude"] = pontos["soma_longitude"] / pontos["com_coordenadas"]
+    return pontos.drop(columns=["soma_latitude", "soma_longitude"])
+
+
+# Função para escolher a resolução da grade a partir da extensão (em graus) da
+# área exibida: a mais fina com até max_celulas_lado células no maior lado
+
+
+def escolher_resolucao(extensao):
+    for resolucao in sorted(resolucoes_grade):
+        if extensao / resolucao <= max_celulas_lado:
+            return resolucao
+    return max(resolucoes_grade)
+
+
+# Função para calcular a extensão (maior lado, em graus) dos pontos do mapa
+
+
+def extensao_pontos(pontos):
+    if pontos.empty:
+        return 0.0
+    return max(
+        pontos["latitude"].max() - pontos["latitude"].min(),
+        pontos["longitude"].max() - pontos["longitude"].min(),
+    )
+
+
+# Função para calcular o zoom do mapa que enquadra uma extensão (em graus)
+
+
+def zoom_para_extensao(extensao):
+    if extensao <= 0:
+        return 10
+    return float(np.clip(np.log2(360 / extensao) - 0.5, 2, 12))
@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+
+from spatial import coordenadas_validas
+
+# Arquivo do índice espacial (gravado junto ao cache consolidado)
+indice_file = "indice_espacial.npz"
+
+# Tamanho das células da grade do índice, em graus (~11 km)
+resolucao_indice = 0.1
+
+# Raio médio da Terra e comprimento de um grau de latitude, em km
+raio_terra_km = 6371.0088
+km_por_grau = np.pi * raio_terra_km / 180
+
+
+# Função para calcular a distância (km) entre um ponto e vários pontos (haversine)
+
+
+def distancia_km(lat, lon, latitudes, longitudes):
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2 = np.radians(latitudes.astype("float64"))
+    lon2 = np.radians(longitudes.astype("float64"))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * raio_terra_km * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# Função para construir o índice espacial: as linhas com coordenada válida são
+# ordenadas pela célula da grade (linha de latitude, depois longitude), e cada
+# célula aponta para um trecho contínuo dos arrays ordenados. As coordenadas não
+# são imputadas (data_processing.colunas_sem_imputacao): acidentes sem
+# coordenada na fonte ficam nulos e, portanto, fora do índice.
+
+
+def construir_indice_espacial(df, resolucao=resolucao_indice):
+    validas = np.flatnonzero(coordenadas_validas(df))
+    latitudes = df["latitude"].to_numpy()[validas]
+    longitudes = df["longitude"].to_numpy()[validas]
+
+    linha = np.floor(latitudes / resolucao).astype(np.int64)
+    coluna = np.floor(longitudes / resolucao).astype(np.int64)
+    linha_min, coluna_min = (linha.min(), coluna.min()) if len(validas) else (0, 0)
+    n_colunas = (coluna.max() - coluna_min + 1) if len(validas) else 1
+    celulas = (linha - linha_min) * n_colunas + (coluna - coluna_min)
+
+    ordem = np.argsort(celulas, kind="stable")
+    celulas_unicas, inicios = np.unique(celulas[ordem], return_index=True)
+    return {
+        "resolucao": np.float64(resolucao),
+        "linhas": np.int64(len(df)),
+        "linha_min": np.int64(linha_min),
+        "coluna_min": np.int64(coluna_min),
+        "n_colunas": np.int64(n_colunas),
+        "celulas": celulas_unicas,
+        "inicios": np.append(inicios, len(ordem)),
+        "posicoes": validas[ordem].astype(np.int64),
+        "latitudes": latitudes[ordem].astype(np.float32),
+        "longitudes": longitudes[ordem].astype(np.float32),
+    }
+
+
+# Função para obter os índices (nos arrays ordenados) das linhas nas células que
+# cobrem um retângulo de latitude/longitude
+
+
+def candidatos_retangulo(indice, lat_min, lat_max, lon_min, lon_max):
+    resolucao = indice["resolucao"]
+    n_colunas = indice["n_colunas"]
+    coluna_ini = max(int(np.floor(lon_min / resolucao)) - indice["coluna_min"], 0)
+    coluna_fim = min(
+        int(np.floor(lon_max / resolucao)) - indice["coluna_min"], n_colunas - 1
+    )
+    if coluna_ini > coluna_fim:
+        return np.empty(0, dtype=np.int64)
+
+    linha_ini = max(int(np.floor(lat_min / resolucao)) - indice["linha_min"], 0)
+    linha_fim = int(np.floor(lat_max / resolucao)) - indice["linha_min"]
+    if len(indice["celulas"]):
+        linha_fim = min(linha_fim, indice["celulas"][-1] // n_colunas)
+
+    trechos = []
+    for linha in range(linha_ini, linha_fim + 1):
+        # As células de uma linha da grade são contíguas no array ordenado
+        primeira = np.searchsorted(
+            indice["celulas"], linha * n_colunas + coluna_ini, side="left"
+        )
+        ultima = np.searchsorted(
+            indice["celulas"], linha * n_colunas + coluna_fim, side="right"
+        )
+        if primeira < ultima:
+            trechos.append(
+                np.arange(indice["inicios"][primeira], indice["inicios"][ultima])
+            )
+    if not trechos:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(trechos)
+
+
+# Função para aplicar a máscara de filtros (booleana, por linha do DataFrame)
+# aos candidatos
+
+
+def aplicar_mascara(indice, candidatos, mascara):
+    if mascara is None:
+        return candidatos
+    return candidatos[mascara[indice["posicoes"][candidatos]]]
+
+
+# Função para consultar os acidentes dentro de um retângulo.
+# Retorna as posições das linhas no DataFrame.
+
+
+def consultar_retangulo(indice, lat_min, lat_max, lon_min, lon_max, mascara=None):
+    candidatos = candidatos_retangulo(indice, lat_min, lat_max, lon_min, lon_max)
+    candidatos = aplicar_mascara(indice, candidatos, mascara)
+    latitudes = indice["latitudes"][candidatos]
+    longitudes = indice["longitudes"][candidatos]
+    dentro = (
+        (latitudes >= lat_min)
+        & (latitudes <= lat_max)
+        & (longitudes >= lon_min)
+        & (longitudes <= lon_max)
+    )
+    return np.sort(indice["posicoes"][candidatos[dentro]])
+
+
+# Função para consultar os acidentes a até "raio_km" de um ponto.
+# Retorna as posições das linhas no DataFrame e as distâncias (km), ordenadas
+# da mais próxima para a mais distante.
+
+
+def consultar_raio(indice, lat, lon, raio_km, mascara=None):
+    delta_lat = raio_km / km_por_grau
+    delta_lon = raio_km / (km_por_grau * max(np.cos(np.radians(lat)), 1e-6))
+    candidatos = candidatos_retangulo(
+        indice, lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon
+    )
+    candidatos = aplicar_mascara(indice, candidatos, mascara)
+
+    distancias = distancia_km(
+        lat, lon, indice["latitudes"][candidatos], indice["longitudes"][candidatos]
+    )
+    dentro = distancias <= raio_km
+    candidatos, distancias = candidatos[dentro], distancias[dentro]
+    ordem = np.argsort(distancias, kind="stable")
+    return indice["posicoes"][candidatos[ordem]], distancias[ordem]
+
+
+# Função para consultar os "k" acidentes mais próximos de um ponto. O raio de
+# busca começa no tamanho de uma célula e dobra até conter "k" acidentes; como
+# a busca por raio é exata, os "k" mais próximos estão entre eles.
+# Retorna as posições das linhas no DataFrame e as distâncias (km).
+
+
+def vizinhos_mais_proximos(indice, lat, lon, k, mascara=None, raio_max_km=5000):
+    raio = indice["resolucao"] * km_por_grau
+    while True:
+        posicoes, distancias = consultar_raio(indice, lat, lon, raio, mascara)
+        if len(posicoes) >= k or raio >= raio_max_km:
+            return posicoes[:k], distancias[:k]
+        raio *= 2
+
+
+# Função para gravar o índice espacial, junto com a chave do cache que o gerou
+
+
+def salvar_indice_espacial(cache_dir, indice, chave):
+    os.makedirs(cache_dir, exist_ok=True)
+    caminho = os.path.join(cache_dir, indice_file)
+    tmp_path = caminho + ".tmp.npz"
+    np.savez(tmp_path, chave=np.array(chave), **indice)
+    os.replace(tmp_path, caminho)
+    return caminho
+
+
+# Função para carregar o índice espacial (None se não existir ou for de outra
+# versão do cache)
+
+
+def carregar_indice_espacial(cache_dir, chave):
+    caminho = os.path.join(cache_dir, indice_file)
+    if not os.path.exists(caminho):
+        return None
+    with np.load(caminho) as dados:
+        if str(dados["chave"]) != chave:
+            return None
+        # Arrays de dimensão zero voltam como escalares
+        return {nome: dados[nome][()] for nome in dados.files if nome != "chave"}
@@ -0,0 +1,112 @@
+import os
+
+from imputation import valor_nativo
+from moments import expressoes_momentos_sql
+from spatial import expressoes_sql
+
+# DuckDB é opcional: sem ele, o app usa apenas o backend pandas (cubo)
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Nome da view com os dados consolidados
+tabela_sql = "acidentes"
+
+# Expressões SQL das medidas (as mesmas do cubo de agregados)
+medidas_sql = {
+    "acidentes": "count(*)",
+    "ids_distintos": "count(DISTINCT id)",
+    "mortos": "sum(mortos)",
+}
+
+
+# Dimensões derivadas (células da grade do mapa) e medidas espaciais
+dimensoes_derivadas_sql, medidas_espaciais_sql = expressoes_sql()
+
+# Estatísticas suficientes da matriz de correlação
+medidas_momentos_sql = expressoes_momentos_sql()
+
+
+# Função para verificar se o backend SQL está disponível
+
+
+def backend_sql_disponivel():
+    return duckdb is not None
+
+
+# Função para abrir uma conexão DuckDB com uma view sobre o dataset Parquet
+# particionado (as consultas leem só as partições e colunas necessárias)
+
+
+def conectar(dataset_dir, threads=None):
+    if duckdb is None:
+        raise ImportError("O backend SQL requer o pacote duckdb (pip install duckdb).")
+    conexao = duckdb.connect()
+    if threads:
+        conexao.execute(f"SET threads TO {int(threads)}")
+    padrao = os.path.join(dataset_dir, "**", "*.parquet").replace("'", "''")
+    conexao.execute(
+        f"CREATE VIEW {tabela_sql} AS SELECT * FROM "
+        f"read_parquet('{padrao}', hive_partitioning = true)"
+    )
+    return conexao
+
+
+# Função para montar a cláusula WHERE a partir dos filtros ("Todos" ou None
+# ignoram o filtro; listas viram IN). Retorna o SQL e os parâmetros.
+
+
+def clausula_where(filtros):
+    condicoes, parametros = [], []
+    for coluna, valor in (filtros or {}).items():
+        if valor is None or valor == "Todos":
+            continue
+        if isinstance(valor, (list, tuple, set)):
+            valores = [valor_nativo(v) for v in valor]
+            condicoes.append(f"{coluna} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(valores)
+        else:
+            condicoes.append(f"{coluna} = ?")
+            parametros.append(valor_nativo(valor))
+    if not condicoes:
+        return "", parametros
+    return "WHERE " + " AND ".join(condicoes), parametros
+
+
+# Função para consultar as medidas agregadas em SQL, com a mesma interface de
+# cube.consultar: sem dimensões, retorna os totais como Series. Com
+# "momentos", retorna as estatísticas suficientes da matriz de correlação.
+
+
+def consultar_sql(conexao, filtros, dimensoes=(), momentos=False):
+    dimensoes = list(dimensoes)
+    where, parametros = clausula_where(filtros)
+    if momentos:
+        colunas = [
+            f"{expressao} AS {nome}" for nome, expressao in medidas_momentos_sql.items()
+        ]
+        sql = f"SELECT {', '.join(colunas)} FROM {tabela_sql} {where}"
+        resultado = conexao.cursor().execute(sql, parametros).df()
+        return resultado.iloc[0].fillna(0).astype("float64")
+
+    colunas = [
+        f"{dimensoes_derivadas_sql.get(coluna, coluna)} AS {coluna}"
+        for coluna in dimensoes
+    ]
+    medidas = dict(medidas_sql)
+    if dimensoes:
+        medidas.update(medidas_espaciais_sql)
+    colunas += [f"{expressao} AS {nome}" for nome, expressao in medidas.items()]
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela_sql} {where}"
+    if dimensoes:
+        sql += f" GROUP BY {', '.join(dimensoes)} ORDER BY {', '.join(dimensoes)}"
+
+    # Cada consulta usa o seu cursor (a conexão é compartilhada entre threads)
+    resultado = conexao.cursor().execute(sql, parametros).df()
+    resultado["mortos"] = resultado["mortos"].fillna(0).astype("int64")
+    if not dimensoes:
+        return resultado.iloc[0][list(medidas_sql)].astype("int64")
+
+    # Como no cubo, grupos com dimensão nula (ex.: coordenada inválida) são ignorados
+    return resultado.dropna(subset=dimensoes).reset_index(drop=True)
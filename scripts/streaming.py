@@ -0,0 +1,307 @@
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import data_processing
+from data_processing import (
+    adicionar_informacoes,
+    arquivos_entrada,
+    colunas_sem_imputacao,
+    notificar_progresso,
+    remover_registros_incoerentes,
+)
+from dedup import chaves_vazias, remover_duplicatas
+from imputation import estatisticas_contagens, salvar_estatisticas
+from ingestion import estimar_bytes_por_linha, ler_arquivo_em_blocos
+from schema import compactar_dataframe, schema_consolidado, tipo_inteiro
+
+# Quantas vezes a memória de um bloco é multiplicada durante o processamento
+# (cópias feitas pela imputação, validação e engenharia de atributos)
+fator_processamento = 6
+
+# Fração do orçamento de memória reservada para o bloco em processamento; o
+# restante fica para as estatísticas e as estruturas do pandas/Arrow
+fracao_bloco = 0.5
+
+# Bytes por registro do conjunto de chaves já vistas: hash da chave e hash do
+# conteúdo (16 bytes), em dobro porque incluir chaves novas copia o conjunto.
+# O conjunto chega a uma entrada por linha lida e é descontado do orçamento
+# antes de calcular os blocos da segunda passada.
+bytes_por_chave = 32
+
+# Fração máxima do orçamento que o conjunto de chaves pode ocupar
+fracao_max_chaves = 0.5
+
+# Casas decimais usadas para aproximar a mediana de colunas não inteiras
+casas_mediana = 2
+
+# Máximo de valores distintos contados por coluna na primeira passada. Acima
+# disso, colunas numéricas passam a ser contadas com uma casa decimal a menos
+# (a mediana fica aproximada pela largura da faixa) e colunas de texto mantêm
+# só os valores mais frequentes (a moda continua entre eles). Assim a memória
+# das estatísticas não cresce com o número de linhas.
+max_valores_contagem = 20_000
+
+
+# Função para calcular o tamanho dos blocos a partir do orçamento de memória (MB)
+
+
+def calcular_chunksize(file_paths, memoria_max_mb):
+    bytes_por_linha = max(estimar_bytes_por_linha(path) for path in file_paths)
+    if bytes_por_linha == 0:
+        return 1000
+    orcamento = memoria_max_mb * 1e6 * fracao_bloco
+    return max(1000, int(orcamento / (bytes_por_linha * fator_processamento)))
+
+
+# Função para preparar um bloco lido (mesmas etapas feitas antes da imputação)
+
+
+def preparar_bloco(chunk):
+    if "data_inversa" in chunk.columns:
+        chunk["ano"] = chunk["data_inversa"].dt.year
+    return chunk
+
+
+# Função para reduzir as contagens de uma coluna a no máximo
+# max_valores_contagem valores: numéricas com menos casas decimais, texto
+# apenas com os valores mais frequentes
+
+
+def limitar_contagens(contagem):
+    while len(contagem["valores"]) > max_valores_contagem:
+        vc = contagem["valores"]
+        if contagem["casas"] is None:
+            contagem["valores"] = vc.nlargest(max_valores_contagem // 2)
+        else:
+            contagem["casas"] -= 1
+            contagem["valores"] = vc.groupby(
+                vc.index.to_numpy().round(contagem["casas"])
+            ).sum()
+    return contagem
+
+
+# Função para acumular contagens de valores de um bloco (primeira passada).
+# Colunas que não são imputadas (ex.: id) não são contadas; das numéricas
+# também são guardados o mínimo e o máximo exatos, usados nos tipos inteiros.
+
+
+def acumular_contagens(contagens, extremos, chunk):
+    for coluna in chunk.select_dtypes(include=["number", "object"]).columns:
+        serie = chunk[coluna].dropna()
+        if serie.empty:
+            continue
+        numerica = pd.api.types.is_numeric_dtype(serie)
+        if numerica:
+            minimo, maximo = serie.min(), serie.max()
+            if coluna in extremos:
+                minimo = min(minimo, extremos[coluna][0])
+                maximo = max(maximo, extremos[coluna][1])
+            extremos[coluna] = (minimo, maximo)
+        if coluna in colunas_sem_imputacao:
+            continue
+
+        contagem = contagens.setdefault(
+            coluna,
+            {
+                "valores": pd.Series(dtype="int64"),
+                "casas": casas_mediana if numerica else None,
+            },
+        )
+        if contagem["casas"] is not None:
+            serie = serie.round(contagem["casas"])
+        contagem["valores"] = contagem["valores"].add(
+            serie.value_counts(), fill_value=0
+        )
+        limitar_contagens(contagem)
+    return contagens, extremos
+
+
+# Função para percorrer todos os arquivos uma vez e coletar as estatísticas de
+# imputação (contagem de nulos, contagens de valores por coluna e extremos das
+# colunas numéricas). Só as contagens das colunas com nulos são retornadas.
+
+
+def coletar_estatisticas(file_paths, chunksize, progress_callback=None):
+    nulos = pd.Series(dtype="int64")
+    contagens, extremos = {}, {}
+    linhas = 0
+    for i, file_path in enumerate(file_paths):
+        notificar_progresso(
+            progress_callback,
+            f"Coletando estatísticas de {os.path.basename(file_path)}",
+            0.4 * i / len(file_paths),
+        )
+        for chunk in ler_arquivo_em_blocos(file_path, chunksize):
+            chunk = preparar_bloco(chunk)
+            nulos = nulos.add(chunk.isnull().sum(), fill_value=0)
+            contagens, extremos = acumular_contagens(contagens, extremos, chunk)
+            linhas += len(chunk)
+    contagens = {
+        coluna: contagem["valores"]
+        for coluna, contagem in contagens.items()
+        if nulos.get(coluna, 0) > 0
+    }
+    return nulos.astype("int64"), contagens, extremos, linhas
+
+
+# Função para fixar os tipos inteiros a partir do intervalo global de cada coluna,
+# para que todos os blocos gravados tenham o mesmo esquema
+
+
+def tipos_globais(extremos):
+    tipos = {}
+    for coluna, tipo in schema_consolidado.items():
+        if tipo.startswith("int") and coluna in extremos:
+            tipos[coluna] = tipo_inteiro(pd.Series(extremos[coluna]), tipo)
+    return tipos
+
+
+# Função para converter um bloco em tabela Arrow com esquema estável entre blocos
+
+
+def tabela_arrow(chunk, schema_arrow):
+    if schema_arrow is None:
+        tabela = pa.Table.from_pandas(chunk, preserve_index=False)
+        campos = [
+            (
+                pa.field(
+                    campo.name,
+                    pa.dictionary(pa.int32(), pa.string(), campo.type.ordered),
+                )
+                if pa.types.is_dictionary(campo.type)
+                else campo
+            )
+            for campo in tabela.schema
+        ]
+        schema_arrow = pa.schema(campos, metadata=tabela.schema.metadata)
+    return (
+        pa.Table.from_pandas(chunk, schema=schema_arrow, preserve_index=False),
+        schema_arrow,
+    )
+
+
+# Função para consolidar os dados em modo streaming, com memória limitada.
+# Primeira passada: estatísticas de imputação. Segunda passada: imputação,
+# deduplicação, validação, engenharia de atributos e gravação bloco a bloco em
+# arquivos Parquet particionados por arquivo de origem.
+
+
+def consolidar_streaming(output_dir=None, memoria_max_mb=1024, progress_callback=None):
+    file_paths = arquivos_entrada()
+    if not file_paths:
+        raise FileNotFoundError(
+            f"Nenhum arquivo anual (YYYY.csv) encontrado em {data_processing.data_path}."
+        )
+    if output_dir is None:
+        output_dir = os.path.join(data_processing.data_path, "streaming")
+
+    chunksize = calcular_chunksize(file_paths, memoria_max_mb)
+    print(f"Coletando estatísticas em blocos de {chunksize} linhas.")
+
+    null_info_before, contagens, extremos, linhas_lidas = coletar_estatisticas(
+        file_paths, chunksize, progress_callback
+    )
+    estatisticas = estatisticas_contagens(contagens, null_info_before, linhas_lidas)
+    valores = {**estatisticas["medianas"], **estatisticas["modas"]}
+    tipos = tipos_globais(extremos)
+    del contagens
+
+    # Blocos da segunda passada com o orçamento que sobra para eles depois do
+    # conjunto de chaves já vistas
+    memoria_chaves_mb = linhas_lidas * bytes_por_chave / 1e6
+    if memoria_chaves_mb > memoria_max_mb * fracao_max_chaves:
+        raise ValueError(
+            f"O orçamento de {memoria_max_mb} MB não comporta as chaves já vistas "
+            f"de {linhas_lidas} linhas ({memoria_chaves_mb:.0f} MB); use ao menos "
+            f"{int(np.ceil(memoria_chaves_mb / fracao_max_chaves))} MB."
+        )
+    chunksize = calcular_chunksize(file_paths, memoria_max_mb - memoria_chaves_mb)
+    print(
+        f"Chaves já vistas: até {memoria_chaves_mb:.1f} MB; "
+        f"deduplicando em blocos de {chunksize} linhas."
+    )
+
+    # Recria o diretório de saída para não misturar com execuções anteriores
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+
+    vistos = chaves_vazias()
+    duplicatas = {"removidas": 0, "conflitantes": 0}
+    schema_arrow = None
+    linhas_gravadas = 0
+    null_info_after = pd.Series(dtype="int64")
+
+    for i, file_path in enumerate(file_paths):
+        ano_arquivo = os.path.basename(file_path).split(".")[0]
+        notificar_progresso(
+            progress_callback,
+            f"Processando dados de {ano_arquivo}",
+            0.4 + 0.6 * i / len(file_paths),
+        )
+        for parte, chunk in enumerate(ler_arquivo_em_blocos(file_path, chunksize)):
+            chunk = preparar_bloco(chunk).fillna(valores)
+            null_info_after = null_info_after.add(chunk.isnull().sum(), fill_value=0)
+
+            chunk, relatorio, vistos = remover_duplicatas(chunk, vistos=vistos)
+            for chave in duplicatas:
+                duplicatas[chave] += relatorio[chave]
+            chunk = remover_registros_incoerentes(chunk)
+            if chunk.empty:
+                continue
+            chunk = adicionar_informacoes(chunk)
+            chunk = compactar_dataframe(chunk, tipos=tipos)[0]
+
+            tabela, schema_arrow = tabela_arrow(chunk, schema_arrow)
+            pq.write_table(
+                tabela,
+                os.path.join(output_dir, f"parte-{ano_arquivo}-{parte:05d}.parquet"),
+            )
+            linhas_gravadas += len(chunk)
+
+    with open(os.path.join(output_dir, "_metadados.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "pipeline_version": data_processing.PIPELINE_VERSION,
+                "chunksize": chunksize,
+                "linhas_lidas": int(linhas_lidas),
+                "linhas_gravadas": int(linhas_gravadas),
+                "duplicatas": duplicatas,
+                "null_info_before": {k: int(v) for k, v in null_info_before.items()},
+                "null_info_after": {k: int(v) for k, v in null_info_after.items()},
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+    # Prefixo "_" para que o arquivo seja ignorado na leitura do Parquet
+    salvar_estatisticas(output_dir, estatisticas, nome="_estatisticas_imputacao.json")
+
+    notificar_progresso(progress_callback, "Dados consolidados", 1.0)
+    print(f"{linhas_gravadas} de {linhas_lidas} linhas gravadas em {output_dir}.")
+    return output_dir
+
+
+# Função para carregar a saída do modo streaming (opcionalmente só algumas colunas)
+
+
+def carregar_streaming(output_dir, columns=None):
+    return pd.read_parquet(output_dir, columns=columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Consolida os dados da PRF em modo streaming (memória limitada)."
+    )
+    parser.add_argument("--memoria-mb", type=int, default=1024)
+    parser.add_argument("--saida", default=None)
+    args = parser.parse_args()
+
+    consolidar_streaming(output_dir=args.saida, memoria_max_mb=args.memoria_mb)
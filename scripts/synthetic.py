@@ -0,0 +1,306 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from ingestion import schema_colunas
+
+# Número aproximado de acidentes por ano nos arquivos da PRF (escala 1×)
+linhas_por_ano = 70_000
+
+# Número de linhas geradas e gravadas por vez (limita a memória em escalas altas)
+linhas_por_bloco = 500_000
+
+# Formatos dos arquivos, alternados entre os anos: (encoding, separador)
+formatos_arquivo = [("latin1", ";"), ("utf-8", ";"), ("utf-8", ",")]
+
+# Anos anteriores a este usam datas no formato DD/MM/YYYY, como nos arquivos
+# antigos da PRF
+ano_formato_iso = 2020
+
+# Frações de valores nulos, linhas duplicadas e linhas inválidas
+taxa_nulos = 0.02
+taxa_duplicadas = 0.01
+taxa_invalidas = 0.005
+
+# UFs com o peso aproximado no total de acidentes e a coordenada de referência
+# (capital), usada para sortear latitude/longitude
+ufs = {
+    "AC": (0.4, -9.97, -67.81, "RIO BRANCO"),
+    "AL": (1.0, -9.67, -35.74, "MACEIO"),
+    "AP": (0.2, 0.03, -51.07, "MACAPA"),
+    "AM": (0.2, -3.12, -60.02, "MANAUS"),
+    "BA": (6.5, -12.97, -38.51, "SALVADOR"),
+    "CE": (2.5, -3.73, -38.53, "FORTALEZA"),
+    "DF": (2.0, -15.79, -47.88, "BRASILIA"),
+    "ES": (4.0, -20.32, -40.34, "VITORIA"),
+    "GO": (6.0, -16.68, -49.26, "GOIANIA"),
+    "MA": (2.0, -2.53, -44.30, "SAO LUIS"),
+    "MT": (3.5, -15.60, -56.10, "CUIABA"),
+    "MS": (2.5, -20.44, -54.65, "CAMPO GRANDE"),
+    "MG": (13.0, -19.92, -43.94, "BELO HORIZONTE"),
+    "PA": (2.0, -1.46, -48.50, "BELEM"),
+    "PB": (2.5, -7.12, -34.86, "JOAO PESSOA"),
+    "PR": (11.0, -25.43, -49.27, "CURITIBA"),
+    "PE": (4.0, -8.05, -34.88, "RECIFE"),
+    "PI": (2.0, -5.09, -42.80, "TERESINA"),
+    "RJ": (8.0, -22.91, -43.17, "RIO DE JANEIRO"),
+    "RN": (2.5, -5.79, -35.21, "NATAL"),
+    "RS": (7.0, -30.03, -51.23, "PORTO ALEGRE"),
+    "RO": (2.0, -8.76, -63.90, "PORTO VELHO"),
+    "RR": (0.3, 2.82, -60.67, "BOA VISTA"),
+    "SC": (12.0, -27.59, -48.55, "FLORIANOPOLIS"),
+    "SP": (7.0, -23.55, -46.63, "SAO PAULO"),
+    "SE": (1.0, -10.91, -37.07, "ARACAJU"),
+    "TO": (1.5, -10.18, -48.33, "PALMAS"),
+}
+
+# Valores das colunas categóricas, no formato dos arquivos da PRF
+rodovias = [101, 116, 40, 50, 153, 163, 230, 262, 277, 316, 364, 376, 381, 470]
+causas = [
+    "Reação tardia ou ineficiente do condutor",
+    "Ausência de reação do condutor",
+    "Velocidade Incompatível",
+    "Acessar a via sem observar a presença dos outros veículos",
+    "Ingestão de álcool pelo condutor",
+    "Condutor deixou de manter distância do veículo da frente",
+    "Desrespeitar a preferência no cruzamento",
+    "Manobra de mudança de faixa",
+    "Pista Escorregadia",
+    "Animais na Pista",
+    "Condutor Dormindo",
+    "Transitar na contramão",
+]
+tipos = [
+    "Colisão traseira",
+    "Saída de leito carroçável",
+    "Colisão transversal",
+    "Tombamento",
+    "Colisão lateral mesmo sentido",
+    "Colisão frontal",
+    "Queda de ocupante de veículo",
+    "Atropelamento de Pedestre",
+    "Colisão com objeto",
+    "Capotamento",
+    "Engavetamento",
+    "Atropelamento de Animal",
+]
+classificacoes = ["Com Vítimas Feridas", "Sem Vítimas", "Com Vítimas Fatais"]
+fases_dia = ["Pleno dia", "Plena Noite", "Anoitecer", "Amanhecer"]
+sentidos = ["Crescente", "Decrescente"]
+condicoes = [
+    "Céu Claro",
+    "Nublado",
+    "Chuva",
+    "Sol",
+    "Garoa/Chuvisco",
+    "Nevoeiro/Neblina",
+    "Vento",
+    "Ignorado",
+]
+tipos_pista = ["Simples", "Dupla", "Múltipla"]
+tracados = ["Reta", "Curva", "Interseção de vias", "Aclive", "Declive", "Rotatória"]
+dias_semana = [
+    "segunda-feira",
+    "terça-feira",
+    "quarta-feira",
+    "quinta-feira",
+    "sexta-feira",
+    "sábado",
+    "domingo",
+]
+
+# Peso de cada hora do dia (mais acidentes no fim da tarde)
+pesos_hora = np.array(
+    [2, 2, 2, 2, 2, 3, 4, 5, 5, 5, 5, 5, 5, 5, 6, 6, 7, 8, 8, 7, 6, 5, 4, 3],
+    dtype="float64",
+)
+
+
+# Função para sortear valores de uma lista (com pesos opcionais)
+
+
+def sortear(rng, valores, n, pesos=None):
+    if pesos is not None:
+        pesos = np.asarray(pesos, dtype="float64") / np.sum(pesos)
+    return np.asarray(valores, dtype=object)[rng.choice(len(valores), n, p=pesos)]
+
+
+# Função para gerar um bloco de acidentes válidos de um ano, com as colunas e
+# os formatos dos arquivos da PRF. "primeiro_id" é o id do primeiro acidente.
+
+
+def gerar_bloco(rng, ano, n, primeiro_id):
+    inicio_ano = np.datetime64(f"{ano}-01-01", "D")
+    dias_ano = (np.datetime64(f"{ano + 1}-01-01", "D") - inicio_ano).astype("int64")
+    datas = pd.DatetimeIndex(inicio_ano + rng.integers(0, dias_ano, n))
+    formato = "%Y-%m-%d" if ano >= ano_formato_iso else "%d/%m/%Y"
+    hora = rng.choice(24, n, p=pesos_hora / pesos_hora.sum())
+    segundos = hora * 3600 + rng.integers(0, 3600, n)
+
+    siglas = list(ufs)
+    uf = sortear(rng, siglas, n, [ufs[sigla][0] for sigla in siglas])
+    latitude_uf = np.array([ufs[sigla][1] for sigla in uf])
+    longitude_uf = np.array([ufs[sigla][2] for sigla in uf])
+    capital = np.array([ufs[sigla][3] for sigla in uf], dtype=object)
+    numero_municipio = rng.integers(1, 60, n)
+    municipio = np.where(
+        rng.random(n) < 0.3,
+        capital,
+        pd.Series(uf)
+        .radd("MUNICIPIO ")
+        .str.cat(pd.Series(numero_municipio).astype(str).str.zfill(2), sep=" "),
+    )
+    delegacia = rng.integers(1, 8, n)
+
+    ilesos = rng.poisson(1.3, n)
+    feridos_leves = rng.poisson(0.8, n)
+    feridos_graves = rng.poisson(0.2, n)
+    mortos = rng.poisson(0.07, n)
+    ignorados = rng.poisson(0.05, n)
+
+    return pd.DataFrame(
+        {
+            "id": np.arange(primeiro_id, primeiro_id + n),
+            "data_inversa": datas.strftime(formato),
+            "dia_semana": np.array(dias_semana, dtype=object)[datas.dayofweek],
+            "horario": pd.to_datetime(segundos, unit="s").strftime("%H:%M:%S"),
+            "uf": uf,
+            "br": pd.array(sortear(rng, rodovias, n), dtype="Int64"),
+            "km": rng.uniform(0, 900, n).round(1),
+            "municipio": municipio,
+            "causa_acidente": sortear(rng, causas, n),
+            "tipo_acidente": sortear(rng, tipos, n, np.linspace(3, 1, len(tipos))),
+            "classificacao_acidente": np.where(
+                mortos > 0,
+                classificacoes[2],
+                np.where(feridos_leves + feridos_graves > 0, *classificacoes[:2]),
+            ),
+            "fase_dia": sortear(rng, fases_dia, n, [5, 3, 1, 1]),
+            "sentido_via": sortear(rng, sentidos, n),
+            "condicao_metereologica": sortear(
+                rng, condicoes, n, [8, 3, 2, 2, 1, 1, 0.5, 0.5]
+            ),
+            "tipo_pista": sortear(rng, tipos_pista, n, [5, 4, 1]),
+            "tracado_via": sortear(rng, tracados, n, [8, 3, 1, 1, 1, 0.5]),
+            "uso_solo": sortear(rng, ["Sim", "Não"], n),
+            "pessoas": ilesos + feridos_leves + feridos_graves + mortos + ignorados,
+            "mortos": mortos,
+            "feridos_leves": feridos_leves,
+            "feridos_graves": feridos_graves,
+            "ilesos": ilesos,
+            "ignorados": ignorados,
+            "feridos": feridos_leves + feridos_graves,
+            "veiculos": 1 + rng.poisson(0.8, n),
+            "latitude": (latitude_uf + rng.normal(0, 1.5, n)).round(6),
+            "longitude": (longitude_uf + rng.normal(0, 1.5, n)).round(6),
+            "regional": pd.Series(uf).radd("SPRF-").to_numpy(),
+            "delegacia": (
+                pd.Series(delegacia).astype(str).str.zfill(2).radd("DEL")
+                + pd.Series(uf).radd("-")
+            ).to_numpy(),
+            "uop": (
+                pd.Series(rng.integers(1, 5, n)).astype(str).str.zfill(2).radd("UOP")
+                + pd.Series(delegacia).astype(str).str.zfill(2).radd("-DEL")
+                + pd.Series(uf).radd("-")
+            ).to_numpy(),
+        },
+        columns=list(schema_colunas),
+    )
+
+
+# Função para inserir as imperfeições dos arquivos reais: valores nulos,
+# linhas inválidas (rejeitadas pela validação) e linhas duplicadas (mesmo id)
+
+
+def inserir_imperfeicoes(rng, df):
+    n = len(df)
+
+    # Nulos nas colunas de texto e na localização (rodovia, km e coordenadas)
+    colunas_nulas = [
+        coluna for coluna, tipo in schema_colunas.items() if tipo == "texto"
+    ] + ["br", "km", "latitude", "longitude"]
+    for coluna in colunas_nulas:
+        nulos = rng.random(n) < taxa_nulos
+        if nulos.any():
+            df.loc[nulos, coluna] = None
+
+    # Linhas inválidas: cada uma quebra uma das regras de validação
+    invalidas = np.flatnonzero(rng.random(n) < taxa_invalidas)
+    regra = rng.integers(0, 4, len(invalidas))
+    df.loc[df.index[invalidas[regra == 0]], "km"] = -1.0
+    df.loc[df.index[invalidas[regra == 1]], "uf"] = "XX"
+    df.loc[df.index[invalidas[regra == 2]], "mortos"] = (
+        df.loc[df.index[invalidas[regra == 2]], "pessoas"] + 1
+    )
+    df.loc[df.index[invalidas[regra == 3]], "feridos"] = (
+        df.loc[df.index[invalidas[regra == 3]], "feridos"] + 1
+    )
+
+    # Duplicatas: cópias de linhas sorteadas, em posições aleatórias
+    duplicadas = df.iloc[rng.integers(0, n, int(n * taxa_duplicadas))]
+    df = pd.concat([df, duplicadas], ignore_index=True)
+    return df.iloc[rng.permutation(len(df))]
+
+
+# Função para gravar um arquivo anual sintético (YYYY.csv) com o encoding, o
+# separador e a vírgula decimal dos arquivos da PRF. Retorna o número de linhas.
+
+
+def gerar_arquivo(destino, ano, linhas, encoding, sep, seed=0):
+    rng = np.random.default_rng([seed, ano])
+    caminho = os.path.join(destino, f"{ano}.csv")
+    primeiro_id = (ano - 2000) * 10_000_000
+    gravadas = 0
+    with open(caminho, "w", encoding=encoding, errors="replace", newline="") as f:
+        for inicio in range(0, linhas, linhas_por_bloco):
+            n = min(linhas_por_bloco, linhas - inicio)
+            df = inserir_imperfeicoes(
+                rng, gerar_bloco(rng, ano, n, primeiro_id + inicio)
+            )
+            df.to_csv(f, sep=sep, decimal=",", index=False, header=inicio == 0)
+            gravadas += len(df)
+    return gravadas
+
+
+# Função para gerar os arquivos anuais sintéticos em uma escala (1× = um ano
+# típico da PRF). Retorna o caminho, o formato e as linhas de cada arquivo.
+
+
+def gerar_dados_sinteticos(destino, anos, escala=1, seed=0):
+    os.makedirs(destino, exist_ok=True)
+    arquivos = []
+    for i, ano in enumerate(sorted(anos)):
+        encoding, sep = formatos_arquivo[i % len(formatos_arquivo)]
+        linhas = gerar_arquivo(
+            destino, ano, int(linhas_por_ano * escala), encoding, sep, seed
+        )
+        arquivos.append(
+            {
+                "path": os.path.join(destino, f"{ano}.csv"),
+                "encoding": encoding,
+                "sep": sep,
+                "linhas": linhas,
+            }
+        )
+        print(f"{ano}.csv: {linhas} linhas ({encoding}, '{sep}').")
+    return arquivos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Gera arquivos anuais sintéticos no formato da PRF."
+    )
+    parser.add_argument("destino", help="Diretório dos arquivos YYYY.csv")
+    parser.add_argument("--anos", type=int, nargs="+", default=[2021, 2022, 2023, 2024])
+    parser.add_argument(
+        "--escala",
+        type=float,
+        default=1,
+        help="Múltiplo de um ano típico (70 mil linhas)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    gerar_dados_sinteticos(args.destino, args.anos, args.escala, args.seed)
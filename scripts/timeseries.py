@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from schema import nomes_meses
+
+# Periodicidades da análise temporal: rótulo -> unidade do numpy datetime64
+periodos = {"Dia": "D", "Mês": "M", "Ano": "Y"}
+
+# Janelas (em dias) das médias móveis da série diária
+janelas_media_movel = [7, 30, 90]
+
+
+# Função para montar a série diária (dias sem acidentes com zero) a partir do
+# resultado agregado por data (ex.: cuboide "dia" do cubo). Com um mês filtrado,
+# o calendário só tem os dias desse mês em cada ano: os demais meses ficam fora
+# da série, em vez de entrarem como dias sem acidentes.
+
+
+def serie_diaria(agregado, medida="ids_distintos", filtros=None):
+    if agregado.empty:
+        return pd.Series(dtype="int64", index=pd.DatetimeIndex([], name="data"))
+    serie = agregado.groupby("data_inversa")[medida].sum()
+    dias = pd.date_range(serie.index.min(), serie.index.max(), freq="D", name="data")
+    nome_mes = (filtros or {}).get("nome_mes")
+    if nome_mes is not None and nome_mes != "Todos":
+        dias = dias[dias.month == nomes_meses.index(nome_mes) + 1]
+    return serie.reindex(dias, fill_value=0).astype("int64")
+
+
+# Função para agregar a série diária por dia, mês ou ano. O início de cada
+# período vem do truncamento das datas (datetime64), sem to_period.
+
+
+def agregar_periodo(serie, periodo):
+    inicios = serie.index.to_numpy().astype(f"datetime64[{periodo}]")
+    agregada = serie.groupby(inicios.astype("datetime64[ns]")).sum()
+    agregada.index.name = "data"
+    return agregada
+
+
+# Função para calcular a média móvel de uma série diária. A janela é de dias do
+# calendário, não de posições: numa série com meses fora do filtro, a média de
+# um dia não inclui dias de outro bloco (ex.: janeiro do ano anterior).
+
+
+def media_movel(serie, janela):
+    return serie.rolling(f"{janela}D", min_periods=1).mean()
+
+
+# Função para comparar os anos da série: uma coluna por ano, indexada pelo mês
+# ("M") ou pelo dia do ano ("D"), e a variação percentual de cada ano em
+# relação ao anterior no mesmo período
+
+
+def comparacao_anual(serie, periodo="M"):
+    datas = serie.index
+    posicao = datas.month if periodo == "M" else datas.dayofyear
+    tabela = (
+        serie.groupby([posicao, datas.year])
+        .sum()
+        .unstack()
+        .rename_axis(index="mes" if periodo == "M" else "dia_do_ano", columns="ano")
+    )
+    anteriores = tabela.shift(1, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variacao = (tabela - anteriores) / anteriores.where(anteriores != 0) * 100
+    return tabela, variacao.iloc[:, 1:]
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# Os módulos do projeto ficam em scripts/ e são importados pelo nome, como
+# quando executados de dentro da pasta
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+import data_processing  # noqa: E402
+from synthetic import gerar_dados_sinteticos  # noqa: E402
+
+# Anos e escala dos dados sintéticos dos testes (~1.400 acidentes por ano)
+anos_teste = [2021, 2022, 2023]
+escala_teste = 0.02
+
+
+# Diretórios de dados e de cache temporários, com os arquivos anuais sintéticos
+
+
+@pytest.fixture
+def dados_sinteticos(tmp_path, monkeypatch):
+    data_dir = str(tmp_path / "data")
+    arquivos = gerar_dados_sinteticos(data_dir, anos_teste, escala_teste)
+    monkeypatch.setattr(data_processing, "data_path", data_dir)
+    monkeypatch.setattr(data_processing, "cache_path", str(tmp_path / "cache"))
+    return {arquivo["path"]: arquivo for arquivo in arquivos}
+
+
+# Ids dos acidentes com algum valor em branco nas colunas informadas, lidos dos
+# arquivos anuais originais (antes de qualquer tratamento)
+
+
+@pytest.fixture
+def ids_em_branco(dados_sinteticos):
+    def ids(colunas):
+        encontrados = set()
+        for arquivo in dados_sinteticos.values():
+            bruto = pd.read_csv(
+                arquivo["path"],
+                sep=arquivo["sep"],
+                encoding=arquivo["encoding"],
+                dtype=str,
+                keep_default_na=False,
+            )
+            vazias = (bruto[colunas] == "").any(axis=1)
+            encontrados |= set(bruto.loc[vazias, "id"].astype("int64"))
+        return encontrados
+
+    return ids
@@ -0,0 +1,84 @@
+import pandas as pd
+
+import data_processing
+from cube import (
+    cobre_filtros,
+    construir_cubo,
+    consultar,
+    consultar_linhas,
+    cuboide_momentos,
+    cuboides,
+    substituir_anos,
+)
+from filter_index import construir_indice, filtrar
+
+# Combinações de filtros testadas, incluindo mês sem ano (obtido da data no
+# cuboide por dia) e filtros que alguns cuboides não guardam
+
+
+def combinacoes_teste(df):
+    tipo = df["tipo_acidente"].value_counts().index[0]
+    return [
+        {},
+        {"ano": 2022},
+        {"ano": 2022, "uf": "SP"},
+        {"nome_mes": "janeiro"},
+        {"ano": 2023, "nome_mes": "março", "tipo_acidente": tipo},
+        {"uf": "MG", "tipo_acidente": tipo},
+    ]
+
+
+def test_cubo_coincide_com_as_linhas_filtradas(dados_sinteticos):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    cubo = construir_cubo(df)
+    indice = construir_indice(df)
+
+    for filtros in combinacoes_teste(df):
+        linhas = filtrar(df, indice, filtros)
+        for nome in list(cuboides) + [cuboide_momentos]:
+            if not cobre_filtros(nome, filtros):
+                continue
+            dimensoes = cuboides.get(nome, [])
+            obtido = consultar(cubo, nome, filtros, dimensoes)
+            esperado = consultar_linhas(linhas, nome, dimensoes)
+            if not dimensoes:
+                pd.testing.assert_series_equal(
+                    obtido.astype("float64"), esperado.astype("float64")
+                )
+                continue
+            obtido = obtido.sort_values(dimensoes).reset_index(drop=True)
+            esperado = esperado.sort_values(dimensoes).reset_index(drop=True)
+            pd.testing.assert_frame_equal(
+                obtido, esperado, check_dtype=False, check_categorical=False
+            )
+
+
+def test_cuboide_por_dia_sem_ano_e_mes(dados_sinteticos):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    cubo = construir_cubo(df)
+
+    assert not {"ano", "mes", "nome_mes"} & set(cubo["dia"].columns)
+    assert cobre_filtros("dia", {"ano": 2022, "nome_mes": "janeiro"})
+    assert not cobre_filtros(cuboide_momentos, {"nome_mes": "janeiro"})
+
+
+def test_substituir_anos_mantem_os_tipos(dados_sinteticos):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    cubo = construir_cubo(df)
+
+    # Um dos anos reconstruído à parte, só com as linhas dele (categorias
+    # diferentes das do cubo completo)
+    de_2022 = df[df["ano"] == 2022].copy()
+    for coluna in de_2022.select_dtypes("category"):
+        de_2022[coluna] = de_2022[coluna].cat.remove_unused_categories()
+    substituido = substituir_anos(cubo, construir_cubo(de_2022), [2022])
+
+    for nome, tabela in cubo.items():
+        obtido = substituido[nome]
+        assert obtido.dtypes.to_dict() == tabela.dtypes.to_dict()
+        ordem = [coluna for coluna in tabela if tabela[coluna].dtype != float]
+        pd.testing.assert_frame_equal(
+            obtido.sort_values(ordem).reset_index(drop=True),
+            tabela.sort_values(ordem).reset_index(drop=True),
+            check_categorical=False,
+        )
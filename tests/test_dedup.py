@@ -0,0 +1,56 @@
+import pandas as pd
+
+from dedup import chaves_vazias, remover_duplicatas
+
+
+def acidentes(ids, mortos):
+    return pd.DataFrame({"id": ids, "mortos": mortos, "uf": "SP"})
+
+
+def test_duplicatas_no_mesmo_dataframe():
+    df, relatorio, _ = remover_duplicatas(acidentes([1, 2, 1, 3], [0, 1, 0, 0]))
+
+    assert df["id"].tolist() == [1, 2, 3]
+    assert relatorio == {"removidas": 1, "ja_existentes": 0, "conflitantes": 0}
+
+
+def test_duplicata_com_conteudo_conflitante_mantem_a_primeira():
+    df, relatorio, _ = remover_duplicatas(acidentes([1, 2, 1], [0, 1, 2]))
+
+    assert df["id"].tolist() == [1, 2]
+    assert df["mortos"].tolist() == [0, 1]
+    assert relatorio == {"removidas": 1, "ja_existentes": 0, "conflitantes": 1}
+
+
+def test_chaves_vistas_em_outros_arquivos():
+    _, _, vistos = remover_duplicatas(acidentes([1, 2, 3], [0, 1, 0]))
+
+    # O id 2 repete o registro já ingerido; o id 3 chega com outro conteúdo
+    df, relatorio, vistos = remover_duplicatas(
+        acidentes([2, 3, 4], [1, 5, 0]), vistos=vistos
+    )
+
+    assert df["id"].tolist() == [4]
+    assert relatorio == {"removidas": 2, "ja_existentes": 2, "conflitantes": 1}
+    assert len(vistos["chaves"]) == 4
+
+
+def test_chaves_vistas_acumuladas_em_blocos():
+    vistos = chaves_vazias()
+    mantidos = []
+    for bloco in [[5, 1, 9], [1, 7, 3], [9, 2, 5, 8]]:
+        df, _, vistos = remover_duplicatas(
+            acidentes(bloco, [0] * len(bloco)), vistos=vistos
+        )
+        mantidos += df["id"].tolist()
+
+    assert mantidos == [5, 1, 9, 7, 3, 2, 8]
+    assert (vistos["chaves"][1:] >= vistos["chaves"][:-1]).all()
+
+
+def test_chave_nula_nunca_e_duplicada():
+    df, relatorio, vistos = remover_duplicatas(acidentes([None, None, 1.0], [0, 0, 0]))
+
+    assert len(df) == 3
+    assert relatorio["removidas"] == 0
+    assert len(vistos["chaves"]) == 1
@@ -0,0 +1,183 @@
+import json
+import os
+
+import pandas as pd
+
+import data_processing
+from cache import cache_file, ler_metadados
+from dataset import ler_dataset
+from imputation import carregar_estatisticas
+from incremental import atualizar_incremental
+from instrumentation import log_file
+from synthetic import gerar_arquivo
+
+# Funções auxiliares para ler e gravar os arquivos anuais mantendo os valores
+# como texto (vírgula decimal, datas e horários exatamente como no arquivo)
+
+
+def ler_csv(arquivo):
+    return pd.read_csv(
+        arquivo["path"],
+        sep=arquivo["sep"],
+        encoding=arquivo["encoding"],
+        dtype=str,
+        keep_default_na=False,
+    )
+
+
+def gravar_csv(df, caminho):
+    df.to_csv(caminho, sep=";", encoding="utf-8", index=False)
+
+
+def arquivo_do_ano(dados_sinteticos, ano):
+    return dados_sinteticos[os.path.join(data_processing.data_path, f"{ano}.csv")]
+
+
+# Dataset e estatísticas de imputação gravados pela carga incremental,
+# comparados com os de uma consolidação completa (sem cache) dos mesmos arquivos:
+# mesmas linhas e mesmos valores em todas as colunas, inclusive as imputadas
+
+
+def comparar_com_consolidacao_completa(tmp_path, monkeypatch):
+    dataset_dir = os.path.join(data_processing.cache_path, cache_file)
+    dataset = ler_dataset(dataset_dir).sort_values("id", ignore_index=True)
+    linhas = ler_metadados(data_processing.cache_path)["linhas"]
+    estatisticas = carregar_estatisticas(data_processing.cache_path)
+
+    monkeypatch.setattr(data_processing, "cache_path", str(tmp_path / "referencia"))
+    referencia = data_processing.consolidate_data(use_cache=False)[0]
+    referencia = referencia.sort_values("id", ignore_index=True)
+    esperadas = carregar_estatisticas(data_processing.cache_path)
+
+    assert linhas == len(dataset) == len(referencia)
+    pd.testing.assert_frame_equal(
+        dataset[referencia.columns],
+        referencia,
+        check_dtype=False,
+        check_categorical=False,
+    )
+    for campo in ["linhas", "nulos", "medianas", "modas"]:
+        assert estatisticas[campo] == esperadas[campo]
+
+
+def test_primeira_carga_faz_a_consolidacao_completa(
+    dados_sinteticos, tmp_path, monkeypatch
+):
+    assert atualizar_incremental()["modo"] == "completo"
+    assert atualizar_incremental() is None
+
+    comparar_com_consolidacao_completa(tmp_path, monkeypatch)
+
+
+def test_arquivo_de_um_ano_alterado(dados_sinteticos, tmp_path, monkeypatch):
+    atualizar_incremental()
+
+    # O arquivo de 2022 é republicado no mesmo formato, com menos acidentes e
+    # outro conteúdo nos mesmos ids
+    arquivo = arquivo_do_ano(dados_sinteticos, 2022)
+    gerar_arquivo(
+        data_processing.data_path,
+        2022,
+        1_000,
+        arquivo["encoding"],
+        arquivo["sep"],
+        seed=1,
+    )
+    processamento = atualizar_incremental()
+
+    # Os demais arquivos só são reprocessados se a mudança alterou a mediana ou
+    # a moda de alguma coluna em que eles têm nulos
+    assert processamento["modo"] == "incremental"
+    assert "2022.csv" in processamento["arquivos"]
+    assert 2022 in processamento["anos"]
+
+    # As etapas da carga incremental são gravadas no log de métricas
+    with open(os.path.join(data_processing.cache_path, log_file)) as f:
+        registros = [json.loads(linha) for linha in f]
+    etapas = {r["etapa"] for r in registros if r.get("modo") == "incremental"}
+    assert {"leitura", "imputacao", "deduplicacao", "gravacao", "cubo"} <= etapas
+    comparar_com_consolidacao_completa(tmp_path, monkeypatch)
+
+
+def test_arquivo_removido(dados_sinteticos, tmp_path, monkeypatch):
+    atualizar_incremental()
+
+    os.remove(arquivo_do_ano(dados_sinteticos, 2021)["path"])
+    processamento = atualizar_incremental()
+
+    assert processamento["modo"] == "incremental"
+    assert 2021 in processamento["anos"]
+    dataset_dir = os.path.join(data_processing.cache_path, cache_file)
+    assert not (ler_dataset(dataset_dir, colunas=["ano"])["ano"] == 2021).any()
+    comparar_com_consolidacao_completa(tmp_path, monkeypatch)
+
+
+def test_arquivo_com_linhas_de_dois_anos(dados_sinteticos, tmp_path, monkeypatch):
+    atualizar_incremental()
+
+    # Arquivo novo de 2024 com acidentes de dezembro de 2023 (ids que não
+    # existem no arquivo de 2023): a partição de 2023 também é reescrita, e o
+    # arquivo de 2023 precisa ser reprocessado junto
+    gerar_arquivo(str(tmp_path), 2024, 500, "utf-8", ";")
+    novo = ler_csv(
+        {"path": str(tmp_path / "2024.csv"), "sep": ";", "encoding": "utf-8"}
+    )
+    de_2023 = ler_csv(arquivo_do_ano(dados_sinteticos, 2023)).head(200)
+    de_2023 = de_2023.assign(
+        id=(de_2023["id"].astype("int64") + 5_000_000).astype(str),
+    )
+    gravar_csv(
+        pd.concat([novo, de_2023], ignore_index=True),
+        os.path.join(data_processing.data_path, "2024.csv"),
+    )
+    processamento = atualizar_incremental()
+
+    assert processamento["modo"] == "incremental"
+    assert {"2023.csv", "2024.csv"} <= set(processamento["arquivos"])
+    assert {2023, 2024} <= set(processamento["anos"])
+    comparar_com_consolidacao_completa(tmp_path, monkeypatch)
+
+
+def test_chaves_ja_vistas_em_outros_arquivos(dados_sinteticos, tmp_path, monkeypatch):
+    atualizar_incremental()
+
+    # Arquivo novo que repete acidentes do arquivo de 2023: metade idênticos e
+    # metade com conteúdo conflitante. Nos dois casos vale o registro do arquivo
+    # processado primeiro, como na consolidação completa.
+    gerar_arquivo(str(tmp_path), 2024, 500, "utf-8", ";")
+    novo = ler_csv(
+        {"path": str(tmp_path / "2024.csv"), "sep": ";", "encoding": "utf-8"}
+    )
+    repetidos = ler_csv(arquivo_do_ano(dados_sinteticos, 2023)).head(100)
+    conflitantes = repetidos.tail(50).assign(condicao_metereologica="Neve")
+    gravar_csv(
+        pd.concat([novo, repetidos.head(50), conflitantes], ignore_index=True),
+        os.path.join(data_processing.data_path, "2024.csv"),
+    )
+    processamento = atualizar_incremental()
+
+    assert processamento["modo"] == "incremental"
+    assert 2024 in processamento["anos"]
+    comparar_com_consolidacao_completa(tmp_path, monkeypatch)
+
+
+def test_estatisticas_inalteradas_reprocessam_so_o_arquivo(
+    dados_sinteticos, tmp_path, monkeypatch
+):
+    atualizar_incremental()
+    modas = carregar_estatisticas(data_processing.cache_path)["modas"]
+
+    # Arquivo novo de 2024 com as modas atuais em todas as colunas de texto: a
+    # moda das colunas em que os arquivos já processados têm nulos não muda, e
+    # os valores imputados neles continuam válidos
+    gerar_arquivo(str(tmp_path), 2024, 50, "utf-8", ";")
+    novo = ler_csv(
+        {"path": str(tmp_path / "2024.csv"), "sep": ";", "encoding": "utf-8"}
+    )
+    novo = novo.assign(**{c: v for c, v in modas.items() if c in novo.columns})
+    gravar_csv(novo, os.path.join(data_processing.data_path, "2024.csv"))
+    processamento = atualizar_incremental()
+
+    assert processamento["arquivos"] == ["2024.csv"]
+    assert processamento["anos"] == [2024]
+    comparar_com_consolidacao_completa(tmp_path, monkeypatch)
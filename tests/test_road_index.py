@@ -0,0 +1,18 @@
+import data_processing
+from road_index import construir_indice_rodovias, trechos_criticos
+
+
+def test_trechos_so_com_rodovia_e_km_da_fonte(ids_em_branco):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    indice = construir_indice_rodovias(df)
+
+    # Acidentes sem rodovia ou km no arquivo continuam no DataFrame, mas fora
+    # dos trechos
+    sem_trecho = ids_em_branco(["br", "km"])
+    indexados = set(df["id"].to_numpy()[indice["posicoes"]].tolist())
+    assert sem_trecho & set(df["id"].tolist())
+    assert not indexados & sem_trecho
+
+    trechos = trechos_criticos(indice, medida="acidentes")
+    assert trechos["acidentes"].sum() <= len(indice["posicoes"])
+    assert set(trechos["br"]) <= set(indice["brs"])
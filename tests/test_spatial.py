@@ -0,0 +1,98 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_processing
+from cache import cache_file
+from cube import construir_cubo, consultar
+from spatial import (
+    colunas_celula,
+    colunas_espaciais,
+    coordenadas_validas,
+    expressoes_sql,
+    nome_grade,
+    resolucoes_grade,
+)
+from spatial_index import construir_indice_espacial
+
+duckdb = pytest.importorskip("duckdb")
+
+from sql_backend import conectar, consultar_sql  # noqa: E402
+
+# Células da grade calculadas pelo DuckDB sobre um DataFrame
+
+
+def celulas_sql(df):
+    dimensoes = expressoes_sql()[0]
+    colunas = ", ".join(
+        f"{expressao} AS {nome}" for nome, expressao in dimensoes.items()
+    )
+    conexao = duckdb.connect()
+    conexao.register("coordenadas", df)
+    return conexao.execute(f"SELECT {colunas} FROM coordenadas").df()
+
+
+def test_celulas_nos_limites_coincidem_com_o_pandas():
+    # Coordenadas múltiplas da resolução, que em float32 ficam logo acima ou
+    # abaixo do limite da célula (ex.: -29.1 / 0.1 vira -291 ou -292)
+    valores = np.round(np.arange(-33.5, 5.5, 0.1), 1)
+    df = pd.DataFrame(
+        {
+            "latitude": valores.astype("float32"),
+            "longitude": np.resize(
+                np.round(np.arange(-74.0, -29.0, 0.1), 1), len(valores)
+            ).astype("float32"),
+        }
+    )
+
+    esperado = colunas_espaciais(df)
+    obtido = celulas_sql(df)
+    for resolucao in resolucoes_grade:
+        for coluna in colunas_celula(resolucao):
+            assert obtido[coluna].tolist() == esperado[coluna].astype("int64").tolist()
+
+
+def test_acidentes_sem_coordenadas_ficam_fora_do_mapa(dados_sinteticos):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    cubo = construir_cubo(df)
+
+    # Coordenadas ausentes não são imputadas (nem a rodovia e o km)
+    sem_coordenadas = df["latitude"].isnull() | df["longitude"].isnull()
+    assert sem_coordenadas.any()
+    assert df[["br", "km"]].isnull().any().all()
+    assert not coordenadas_validas(df)[sem_coordenadas.to_numpy()].any()
+
+    totais = consultar(cubo, "municipio", {})
+    assert totais["com_coordenadas"] == coordenadas_validas(df).sum()
+    assert totais["com_coordenadas"] < totais["acidentes"]
+
+
+def test_indice_espacial_so_com_coordenadas_da_fonte(ids_em_branco):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    indice = construir_indice_espacial(df)
+
+    sem_coordenadas = ids_em_branco(["latitude", "longitude"])
+    indexados = set(df["id"].to_numpy()[indice["posicoes"]].tolist())
+    assert sem_coordenadas & set(df["id"].tolist())
+    assert not indexados & sem_coordenadas
+
+
+def test_grade_do_cubo_coincide_com_o_duckdb(dados_sinteticos):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    cubo = construir_cubo(df)
+    conexao = conectar(os.path.join(data_processing.cache_path, cache_file))
+
+    for filtros in [{}, {"ano": 2022, "uf": "SP"}]:
+        for resolucao in resolucoes_grade:
+            dimensoes = list(colunas_celula(resolucao))
+            colunas = dimensoes + ["acidentes", "mortos", "com_coordenadas"]
+            pandas = consultar(cubo, nome_grade(resolucao), filtros, dimensoes)
+            sql = consultar_sql(conexao, filtros, dimensoes)
+
+            pandas = pandas[colunas].astype("int64").sort_values(dimensoes)
+            sql = sql[colunas].astype("int64").sort_values(dimensoes)
+            pd.testing.assert_frame_equal(
+                pandas.reset_index(drop=True), sql.reset_index(drop=True)
+            )
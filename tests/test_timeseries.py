@@ -0,0 +1,45 @@
+import pandas as pd
+
+import data_processing
+from cube import construir_cubo, consultar
+from timeseries import comparacao_anual, media_movel, serie_diaria
+
+# Acidentes por dia em janeiro de 2021 e de 2022, como o cuboide "dia" retorna
+# com o filtro de mês e sem filtro de ano
+
+
+def agregado_janeiros():
+    dias = pd.date_range("2021-01-01", "2021-01-31").append(
+        pd.date_range("2022-01-01", "2022-01-31")
+    )
+    acidentes = [38] * 31 + [40] * 31
+    return pd.DataFrame({"data_inversa": dias, "ids_distintos": acidentes})
+
+
+def test_mes_filtrado_sem_ano_nao_completa_os_outros_meses():
+    serie = serie_diaria(agregado_janeiros(), filtros={"nome_mes": "janeiro"})
+
+    assert len(serie) == 62
+    assert (serie.index.month == 1).all()
+    assert (serie > 0).all()
+
+    # A média móvel de 30 dias em 15/01/2022 só usa os dias de janeiro de 2022
+    assert media_movel(serie, 30)["2022-01-15"] == 40
+
+    tabela, variacao = comparacao_anual(serie, "M")
+    assert tabela.index.tolist() == [1]
+    assert tabela.loc[1].tolist() == [38 * 31, 40 * 31]
+    assert round(variacao.loc[1, 2022], 2) == round((40 - 38) / 38 * 100, 2)
+
+
+def test_serie_do_cubo_com_mes_filtrado(dados_sinteticos):
+    df = data_processing.consolidate_data(use_cache=False)[0]
+    filtros = {"nome_mes": "março"}
+    agregado = consultar(construir_cubo(df), "dia", filtros, ["data_inversa"])
+    serie = serie_diaria(agregado, filtros=filtros)
+
+    # Todos os dias de março de cada ano, e só eles
+    anos = sorted(df["ano"].unique())
+    assert (serie.index.month == 3).all()
+    assert len(serie) == 31 * len(anos)
+    assert serie.sum() == df.loc[df["mes"] == 3, "id"].nunique()